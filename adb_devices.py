@@ -0,0 +1,41 @@
+import hashlib
+import subprocess
+
+def adb_command(adb_path, serial, *args):
+    if serial:
+        return [adb_path, "-s", serial, *args]
+    return [adb_path, *args]
+
+def list_devices(adb_path, include_unready=False):
+    result = subprocess.run([adb_path, "devices"], capture_output=True, text=True)
+    devices = []
+    for line in result.stdout.splitlines()[1:]:
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        serial, state = parts[0], parts[1]
+        if state == "device" or include_unready:
+            devices.append((serial, state) if include_unready else serial)
+    return devices
+
+def list_remote_tree(adb_path, remote_dir, serial=None):
+    # Every file under remote_dir with size and mtime, from one adb shell round trip
+    result = subprocess.run(
+        adb_command(adb_path, serial, "shell", f"find '{remote_dir}' -type f -exec stat -c '%n|%s|%Y' {{}} +"),
+        capture_output=True, text=True
+    )
+    files = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().rsplit("|", 2)
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            continue
+        files.append({"path": parts[0], "name": parts[0].rsplit("/", 1)[-1],
+                      "size": int(parts[1]), "mtime": int(parts[2])})
+    return files
+
+def listing_signature(files):
+    # Changes whenever a file is added, removed, resized or touched
+    h = hashlib.blake2b(digest_size=16)
+    for f in sorted(files, key=lambda f: f["path"]):
+        h.update(f"{f['path']}|{f['size']}|{f['mtime']}\n".encode("utf-8"))
+    return h.hexdigest()
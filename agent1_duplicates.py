@@ -1,419 +1,151 @@
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-import io
-import os
-import sys
+import re
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
+from pipeline import Pipeline, Stage, ItemFailed, progress_range
+from agent_events import RunRecorder, log, log_error
+from drive_auth import get_drive_service
+from drive_records import list_records
+from drive_executor import DRIVE_EXECUTOR, DRIVE_WORKERS, execute, call
+
+DUPLICATES_FOLDER_ID = '13vyykE9UmncD1SLdNDazpFDkkpy6CFsG'
+THUMBNAIL_SIZE = 128
 
 def authenticate():
-    flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-    creds = flow.run_local_server(port=0, open_browser=True)  # 👈 opens browser silently
-    service = build('drive', 'v3', credentials=creds)
-    return service
+    # Cached token + bundled discovery document; the browser only opens on first login
+    return get_drive_service()
 
 def list_image_files(service, folder_id):
     query = f"'{folder_id}' in parents and mimeType contains 'image/' and trashed = false"
-    results = service.files().list(
-        q=query,
-        fields="files(id, name, mimeType, size, md5Checksum)"
-    ).execute()
-    return results.get('files', [])
+    return list(list_records(service, query, "id, name, mimeType, size, md5Checksum"))
 
-def find_duplicates(files):
+def find_duplicate_pairs(files):
+    # [(duplicate, the first file seen with the same content)]
     seen_hashes = {}
-    duplicates = []
+    pairs = []
 
     for file in files:
-        hash_val = file.get('md5Checksum')
+        hash_val = file.md5
         if not hash_val:
             continue
         if hash_val in seen_hashes:
-            duplicates.append(file)
+            pairs.append((file, seen_hashes[hash_val]))
         else:
             seen_hashes[hash_val] = file
-    return duplicates
+    return pairs
+
+def find_duplicates(files):
+    return [duplicate for duplicate, _ in find_duplicate_pairs(files)]
+
+def fetch_thumbnail(file_id, size=THUMBNAIL_SIZE):
+    # Drive renders thumbnails itself; the =s<N> suffix asks for N px on the long side
+    request = authenticate().files().get(fileId=file_id, fields="thumbnailLink")
+    link = execute(request).get("thumbnailLink")
+    if not link:
+        return None
+    resp, content = call(request.http.request, re.sub(r"=s\d+$", f"=s{size}", link))
+    return content if resp.status == 200 else None
+
+def delete_file(service, file):
+    try:
+        execute(service.files().delete(fileId=file.id))
+    except Exception as e:
+        log(f"⚠️ Failed to delete {file.name}: {e}")
+        raise ItemFailed(file.id)
+    log(f"🗑 Deleted duplicate: {file.name}")
+    return file
 
 def delete_files(service, duplicates):
     deleted = 0
     failed = 0
     for file in duplicates:
         try:
-            service.files().delete(fileId=file['id']).execute()
-            print(f"🗑 Deleted duplicate: {file['name']}")
+            delete_file(service, file)
             deleted += 1
-        except Exception as e:
-            print(f"⚠️ Failed to delete {file['name']}: {e}")
+        except Exception:
             failed += 1
     return deleted, failed
 
-def main():
-    print("🔐 Signing into Google Drive...")
-    service = authenticate()
-
-    folder_id = '13vyykE9UmncD1SLdNDazpFDkkpy6CFsG'
-    print("🔍 Scanning for images...")
-
-    files = list_image_files(service, folder_id)
-    total = len(files)
-    print(f"📸 Total images found: {total}")
+def delete_stage():
+    # Each delete worker uses its own thread's Drive client; the shared executor
+    # decides how many of their calls are in flight at once
+    return Stage("delete", lambda f: delete_file(authenticate(), f), concurrency=DRIVE_WORKERS, weight=3)
 
-    duplicates = find_duplicates(files)
-    dup_count = len(duplicates)
-    print(f"♻️ Duplicate images found: {dup_count}")
-
-    if dup_count > 0:
-        print("🚀 Removing duplicates...")
-        deleted, failed = delete_files(service, duplicates)
-        print(f"✅ Cleanup complete. {deleted} files deleted. {failed} failed.")
+def report_deletions(pipeline, window):
+    stats = pipeline.stats()["delete"]
+    if stats["received"]:
+        log(f"✅ Cleanup complete. {stats['completed']} files deleted. {stats['failed']} failed.")
     else:
-        print("✅ No duplicates found. Drive is clean!")
-
-def run_agent1():
-    log_capture = io.StringIO()
-    sys.stdout = log_capture
-    try:
-        main()
-    except Exception as e:
-        print(f"❌ Error: {e}")
-    sys.stdout = sys.__stdout__
-    return log_capture.getvalue()
-
-if __name__ == '__main__':
-    main()
-import os
-import io
-import sys
-import datetime
-import shutil
-from PIL import Image
-from pillow_heif import register_heif_opener
-import imagehash
-
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-
-# 📦 CONFIG
-SCOPES = ['https://www.googleapis.com/auth/drive']
-PROCESSED_DIR = "downloaded_images"
-UPLOAD_FOLDER_ID = '1Ogap-F4W2ebontg7pHDAh_Ky7QBYkOgz'
-HASHES = set()
-
-register_heif_opener()
-
-def authenticate():
-    flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-    creds = flow.run_local_server(port=0, open_browser=True)
-    return build("drive", "v3", credentials=creds)
-
-def find_images_in_drive(service):
-    query = "mimeType contains 'image/' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    return results.get('files', [])
-
-def find_large_files_in_drive(service, min_size=15 * 1024 * 1024):
-    query = "mimeType != 'application/vnd.google-apps.folder' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    files = results.get('files', [])
-    return [f for f in files if int(f.get('size', 0)) > min_size]
-
-def download_file(service, file_id, filename, target_folder):
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    with open(os.path.join(target_folder, filename), 'wb') as f:
-        f.write(fh.read())
+        log("✅ No duplicates found. Drive is clean!")
+    DRIVE_EXECUTOR.log_stats(window)
 
-def compress_image(image, path, quality=85, max_width=1920):
-    if image.width > max_width:
-        ratio = max_width / float(image.width)
-        new_height = int(image.height * ratio)
-        image = image.resize((max_width, new_height), Image.LANCZOS)
-    image.save(path, "JPEG", quality=quality, optimize=True)
-
-def deduplicate_and_compress_images(usb_dir):
-    images_resized, images_skipped = 0, 0
-    for filename in os.listdir(PROCESSED_DIR):
-        src_path = os.path.join(PROCESSED_DIR, filename)
-        try:
-            img = Image.open(src_path)
-
-            if filename.lower().endswith(".heic"):
-                filename = os.path.splitext(filename)[0] + ".jpg"
-                new_path = os.path.join(PROCESSED_DIR, filename)
-                img.save(new_path, "JPEG")
-                os.remove(src_path)
-                src_path = new_path
-                img = Image.open(src_path)
-
-            shutil.copy2(src_path, os.path.join(usb_dir, filename))
-
-            h = imagehash.average_hash(img)
-            if h in HASHES:
-                os.remove(src_path)
-                continue
-            HASHES.add(h)
-
-            compress_image(img, src_path)
-            images_resized += 1
-
-        except:
-            images_skipped += 1
-
-    print(f"\n✅ Resized {images_resized} images.")
-    print(f"✅ Skipped {images_skipped} images.\n")
-
-def delete_large_files_from_drive(service, files):
-    deleted, failed = 0, 0
-    for f in files:
+def main(progress_callback=None, status_callback=None):
+    log("🔐 Signing into Google Drive...")
+    if status_callback: status_callback("🔐 Signing into Google Drive...")
+    service = authenticate()
+    window = DRIVE_EXECUTOR.start_window()
+
+    folder_id = DUPLICATES_FOLDER_ID
+    log("🔍 Scanning for images...")
+    if status_callback: status_callback("🔍 Scanning for duplicate images...")
+
+    def scan():
+        files = list_image_files(service, folder_id)
+        log(f"📸 Total images found: {len(files)}")
+        return files
+
+    def hash_stage(files):
+        duplicates = find_duplicates(files)
+        log(f"♻️ Duplicate images found: {len(duplicates)}")
+        if duplicates:
+            log("🚀 Removing duplicates...")
+        return duplicates
+
+    pipeline = Pipeline("agent1", [
+        Stage("list", scan, source=True),
+        Stage("hash", hash_stage, collect=True),
+        delete_stage(),
+    ])
+    pipeline.run_sync(progress_range(progress_callback, 10, 100))
+    report_deletions(pipeline, window)
+
+def run_agent1(progress_callback=None, status_callback=None, on_event=None, profile_dir=None):
+    with RunRecorder("agent1", [on_event], profile_dir=profile_dir) as run:
         try:
-            service.files().delete(fileId=f['id']).execute()
-            print(f"🗑 Deleted from Drive: {f['name']}")
-            deleted += 1
+            main(progress_callback, status_callback)
         except Exception as e:
-            print(f"⚠ Failed to delete {f['name']}: {e}")
-            failed += 1
-    return deleted, failed
-
-def upload_resized_images(service, folder_id):
-    existing_files = {}
-    results = service.files().list(q=f"'{folder_id}' in parents and trashed = false",
-                                   fields="files(id, name)").execute()
-    for f in results.get('files', []):
-        existing_files[f['name']] = f['id']
-
-    uploaded, updated = 0, 0
-    for file in os.listdir(PROCESSED_DIR):
-        file_path = os.path.join(PROCESSED_DIR, file)
-        media = MediaFileUpload(file_path, resumable=True)
-
-        if file in existing_files:
-            service.files().update(fileId=existing_files[file], media_body=media).execute()
-            print(f"🔄 Updated in Drive: {file}")
-            updated += 1
-        else:
-            service.files().create(body={'name': file, 'parents': [folder_id]}, media_body=media).execute()
-            print(f"☁ Uploaded new: {file}")
-            uploaded += 1
-    return uploaded, updated
-
-def run_agent2(usb_root):
-    log_capture = io.StringIO()
-    sys.stdout = log_capture
-
-    try:
-        if not os.path.exists(usb_root):
-            raise FileNotFoundError(f"The path '{usb_root}' does not exist.")
-
-        today = datetime.date.today().isoformat()
-        usb_dir = os.path.join(usb_root, f"backup_{today}")
-        os.makedirs(usb_dir, exist_ok=True)
-
-        if not os.path.exists(PROCESSED_DIR):
-            os.makedirs(PROCESSED_DIR)
-
-        print("🔐 Signing into Google Drive...")
-        service = authenticate()
-
-        print("\n🔍 Searching your entire Drive for images...")
-        images = find_images_in_drive(service)
-        print(f"📸 Found {len(images)} images.")
-
-        for f in images:
-            download_file(service, f['id'], f['name'], PROCESSED_DIR)
+            log_error(e)
+    return run.log_text()
 
-        deduplicate_and_compress_images(usb_dir)
-
-        print("🔍 Searching your entire Drive for large files...")
-        large_files = find_large_files_in_drive(service)
-        print(f"📦 Found {len(large_files)} large files (>15MB).")
-
-        for f in large_files:
-            download_file(service, f['id'], f['name'], usb_dir)
-
-        deleted, failed = delete_large_files_from_drive(service, large_files)
-        print(f"🗑 Deleted {deleted} large files. ⚠ {failed} failed to delete.")
-
-        uploaded, updated = upload_resized_images(service, UPLOAD_FOLDER_ID)
-        print(f"☁ Uploaded {uploaded} new images. 🔄 Updated {updated} images.")
-
-        print(f"\n✅ Backup Complete!\n🗂 Originals saved to → {usb_dir}\n🖼 Compressed images in → {PROCESSED_DIR}")
-
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
-
-    sys.stdout = sys.__stdout__
-    return log_capture.getvalue()
-import os
-import io
-import sys
-import datetime
-import shutil
-from PIL import Image
-from pillow_heif import register_heif_opener
-import imagehash
-
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-
-# 📦 CONFIG
-SCOPES = ['https://www.googleapis.com/auth/drive']
-PROCESSED_DIR = "downloaded_images"
-UPLOAD_FOLDER_ID = '1Ogap-F4W2ebontg7pHDAh_Ky7QBYkOgz'
-HASHES = set()
-
-register_heif_opener()
-
-def authenticate():
-    flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-    creds = flow.run_local_server(port=0, open_browser=True)
-    return build("drive", "v3", credentials=creds)
-
-def find_images_in_drive(service):
-    query = "mimeType contains 'image/' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    return results.get('files', [])
-
-def find_large_files_in_drive(service, min_size=15 * 1024 * 1024):
-    query = "mimeType != 'application/vnd.google-apps.folder' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    files = results.get('files', [])
-    return [f for f in files if int(f.get('size', 0)) > min_size]
-
-def download_file(service, file_id, filename, target_folder):
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    with open(os.path.join(target_folder, filename), 'wb') as f:
-        f.write(fh.read())
-
-def compress_image(image, path, quality=85, max_width=1920):
-    if image.width > max_width:
-        ratio = max_width / float(image.width)
-        new_height = int(image.height * ratio)
-        image = image.resize((max_width, new_height), Image.LANCZOS)
-    image.save(path, "JPEG", quality=quality, optimize=True)
-
-def deduplicate_and_compress_images(usb_dir):
-    images_resized, images_skipped = 0, 0
-    for filename in os.listdir(PROCESSED_DIR):
-        src_path = os.path.join(PROCESSED_DIR, filename)
+def scan_duplicates(progress_callback=None, status_callback=None, on_event=None, on_result=None, profile_dir=None):
+    # For the review screen: finds duplicates without deleting them; on_result gets [(duplicate, original)]
+    with RunRecorder("agent1", [on_event], profile_dir=profile_dir) as run:
         try:
-            img = Image.open(src_path)
-
-            if filename.lower().endswith(".heic"):
-                filename = os.path.splitext(filename)[0] + ".jpg"
-                new_path = os.path.join(PROCESSED_DIR, filename)
-                img.save(new_path, "JPEG")
-                os.remove(src_path)
-                src_path = new_path
-                img = Image.open(src_path)
-
-            shutil.copy2(src_path, os.path.join(usb_dir, filename))
-
-            h = imagehash.average_hash(img)
-            if h in HASHES:
-                os.remove(src_path)
-                continue
-            HASHES.add(h)
-
-            compress_image(img, src_path)
-            images_resized += 1
-
-        except:
-            images_skipped += 1
-
-    print(f"\n✅ Resized {images_resized} images.")
-    print(f"✅ Skipped {images_skipped} images.\n")
+            if status_callback: status_callback("🔐 Signing into Google Drive...")
+            service = authenticate()
+            if progress_callback: progress_callback(10)
+            if status_callback: status_callback("🔍 Scanning for duplicate images...")
+            files = list_image_files(service, DUPLICATES_FOLDER_ID)
+            log(f"📸 Total images found: {len(files)}")
+            pairs = find_duplicate_pairs(files)
+            log(f"♻️ Duplicate images found: {len(pairs)}")
+            if on_result: on_result(pairs)
+            if progress_callback: progress_callback(100)
+        except Exception as e:
+            log_error(e)
+    return run.log_text()
 
-def delete_large_files_from_drive(service, files):
-    deleted, failed = 0, 0
-    for f in files:
+def delete_reviewed(files, progress_callback=None, status_callback=None, on_event=None, profile_dir=None):
+    # The files picked on the review screen, through the same batch delete stage as a full run
+    with RunRecorder("agent1", [on_event], profile_dir=profile_dir) as run:
         try:
-            service.files().delete(fileId=f['id']).execute()
-            print(f"🗑 Deleted from Drive: {f['name']}")
-            deleted += 1
+            if status_callback: status_callback("🚀 Removing selected duplicates...")
+            authenticate()
+            window = DRIVE_EXECUTOR.start_window()
+            pipeline = Pipeline("agent1", [Stage("list", lambda: files, source=True), delete_stage()])
+            pipeline.run_sync(progress_callback)
+            report_deletions(pipeline, window)
         except Exception as e:
-            print(f"⚠ Failed to delete {f['name']}: {e}")
-            failed += 1
-    return deleted, failed
-
-def upload_resized_images(service, folder_id):
-    existing_files = {}
-    results = service.files().list(q=f"'{folder_id}' in parents and trashed = false",
-                                   fields="files(id, name)").execute()
-    for f in results.get('files', []):
-        existing_files[f['name']] = f['id']
-
-    uploaded, updated = 0, 0
-    for file in os.listdir(PROCESSED_DIR):
-        file_path = os.path.join(PROCESSED_DIR, file)
-        media = MediaFileUpload(file_path, resumable=True)
-
-        if file in existing_files:
-            service.files().update(fileId=existing_files[file], media_body=media).execute()
-            print(f"🔄 Updated in Drive: {file}")
-            updated += 1
-        else:
-            service.files().create(body={'name': file, 'parents': [folder_id]}, media_body=media).execute()
-            print(f"☁ Uploaded new: {file}")
-            uploaded += 1
-    return uploaded, updated
-
-def run_agent2(usb_root):
-    log_capture = io.StringIO()
-    sys.stdout = log_capture
-
-    try:
-        if not os.path.exists(usb_root):
-            raise FileNotFoundError(f"The path '{usb_root}' does not exist.")
-
-        today = datetime.date.today().isoformat()
-        usb_dir = os.path.join(usb_root, f"backup_{today}")
-        os.makedirs(usb_dir, exist_ok=True)
-
-        if not os.path.exists(PROCESSED_DIR):
-            os.makedirs(PROCESSED_DIR)
-
-        print("🔐 Signing into Google Drive...")
-        service = authenticate()
+            log_error(e)
+    return run.log_text()
 
-        print("\n🔍 Searching your entire Drive for images...")
-        images = find_images_in_drive(service)
-        print(f"📸 Found {len(images)} images.")
-
-        for f in images:
-            download_file(service, f['id'], f['name'], PROCESSED_DIR)
-
-        deduplicate_and_compress_images(usb_dir)
-
-        print("🔍 Searching your entire Drive for large files...")
-        large_files = find_large_files_in_drive(service)
-        print(f"📦 Found {len(large_files)} large files (>15MB).")
-
-        for f in large_files:
-            download_file(service, f['id'], f['name'], usb_dir)
-
-        deleted, failed = delete_large_files_from_drive(service, large_files)
-        print(f"🗑 Deleted {deleted} large files. ⚠ {failed} failed to delete.")
-
-        uploaded, updated = upload_resized_images(service, UPLOAD_FOLDER_ID)
-        print(f"☁ Uploaded {uploaded} new images. 🔄 Updated {updated} images.")
-
-        print(f"\n✅ Backup Complete!\n🗂 Originals saved to → {usb_dir}\n🖼 Compressed images in → {PROCESSED_DIR}")
-
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
-
-    sys.stdout = sys.__stdout__
-    return log_capture.getvalue()
+if __name__ == '__main__':
+    main()
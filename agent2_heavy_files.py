@@ -1,50 +1,115 @@
 import os
-import io
-import sys
+import json
+import time
 import datetime
 import shutil
+import hashlib
+import threading
 from PIL import Image
-from pillow_heif import register_heif_opener
-import imagehash
 
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
 
+from pipeline import Pipeline, Stage, ItemFailed, progress_range
+from agent_events import RunRecorder, log, log_error
+from job_journal import JobJournal, atomic_write
+from drive_auth import get_drive_service
+from drive_records import FileRecord, list_records
+from drive_executor import DRIVE_EXECUTOR, DRIVE_WORKERS, execute, call
+from zstd_archive import Archive, available as zstd_available
+from batch_hash import hash_batch, load_gray
+
 # 📦 CONFIG
-SCOPES = ['https://www.googleapis.com/auth/drive']
 PROCESSED_DIR = "downloaded_images"
 UPLOAD_FOLDER_ID = '1Ogap-F4W2ebontg7pHDAh_Ky7QBYkOgz'
-HASHES = set()
-
-register_heif_opener()
+HASHES = set()             # aHashes (64-bit ints) of the images processed so far
+HASHES_LOCK = threading.Lock()
+HASH_BATCH = 256
+IMAGE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+LARGE_FILE_BYTES = 15 * 1024 * 1024
+HEIF_EXTS = (".heic", ".heif")
+DOWNLOAD_CHUNK_BYTES = 16 * 1024 * 1024
+VERIFY_ATTEMPTS = 3        # downloads of a large file before giving up on a checksum mismatch
+# A run journals every finished download, compression, deletion and upload in its
+# USB folder; the pointer file says which folder an unfinished run was using
+JOURNAL_NAME = ".agent2_journal.jsonl"
+RESUME_PATH = "agent2_resume.json"
+ARCHIVE_DIR = "heavy_files"  # zstd archive of large files inside the run's USB folder
+# Wide Drive videos: "copy" keeps them as they are, "shrink" transcodes them onto
+# the USB stick (drive_transcode.py) and "replace" also uploads the smaller file
+# over the original instead of deleting it
+VIDEO_MODES = ("copy", "shrink", "replace")
+
+_heif_registered = False
+_heif_lock = threading.Lock()
+
+def ensure_heif_opener():
+    # Registering the HEIF plugin loads libheif; only pay for it once a HEIC file shows up
+    global _heif_registered
+    with _heif_lock:
+        if not _heif_registered:
+            from pillow_heif import register_heif_opener
+            register_heif_opener()
+            _heif_registered = True
 
 def authenticate():
-    flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-    creds = flow.run_local_server(port=0, open_browser=True)
-    return build("drive", "v3", credentials=creds)
+    return get_drive_service()
 
 def find_images_in_drive(service):
     query = "mimeType contains 'image/' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    return results.get('files', [])
+    return list_records(service, query, "id, name, mimeType, size")
 
-def find_large_files_in_drive(service, min_size=15 * 1024 * 1024):
+def find_large_files_in_drive(service, min_size=LARGE_FILE_BYTES):
     query = "mimeType != 'application/vnd.google-apps.folder' and trashed = false"
-    results = service.files().list(q=query, pageSize=1000, fields="files(id, name, size)").execute()
-    files = results.get('files', [])
-    return [f for f in files if int(f.get('size', 0)) > min_size]
-
-def download_file(service, file_id, filename, target_folder):
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
+    # The video width decides whether the shrink/replace modes transcode a file
+    fields = "id, name, mimeType, size, md5Checksum, videoMediaMetadata(width)"
+    return (f for f in list_records(service, query, fields) if f.size > min_size)
+
+class ChecksumMismatch(Exception):
+    pass
+
+class HashingWriter:
+    # Sink for MediaIoBaseDownload: each chunk is hashed as it is written, so the
+    # copy is verified without reading it back from the USB stick
+    def __init__(self, fh):
+        self.fh = fh
+        self.md5 = hashlib.md5()
+
+    def write(self, data):
+        self.md5.update(data)
+        return self.fh.write(data)
+
+def download_to(service, file_id, sink):
+    # Streams the file into sink (anything with write()) and returns its MD5
+    writer = HashingWriter(sink)
+    downloader = MediaIoBaseDownload(writer, service.files().get_media(fileId=file_id), chunksize=DOWNLOAD_CHUNK_BYTES)
     done = False
     while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    with open(os.path.join(target_folder, filename), 'wb') as f:
-        f.write(fh.read())
+        status, done = call(downloader.next_chunk)
+    return writer.md5.hexdigest()
+
+def download_file(service, file_id, filename, target_folder, expected_md5=None):
+    # Given Drive's md5Checksum, a copy that does not match is removed and ChecksumMismatch raised
+    path = os.path.join(target_folder, filename)
+    with open(path, 'wb') as f:
+        digest = download_to(service, file_id, f)
+    if expected_md5 and digest != expected_md5:
+        os.remove(path)
+        raise ChecksumMismatch(f"{filename}: copy has MD5 {digest}, Drive has {expected_md5}")
+    return digest
+
+def archive_file(service, f, archive):
+    # Like download_file, but compressed into the archive as the chunks arrive
+    entry = archive.open_entry(f.name, owner=f.id)
+    try:
+        digest = download_to(service, f.id, entry)
+    except BaseException:
+        entry.abort()
+        raise
+    if f.md5_hex and digest != f.md5_hex:
+        entry.abort()
+        raise ChecksumMismatch(f"{f.name}: copy has MD5 {digest}, Drive has {f.md5_hex}")
+    entry.commit(md5=digest)
+    return digest
 
 def compress_image(image, path, quality=85, max_width=1920):
     if image.width > max_width:
@@ -53,84 +118,184 @@ def compress_image(image, path, quality=85, max_width=1920):
         image = image.resize((max_width, new_height), Image.LANCZOS)
     image.save(path, "JPEG", quality=quality, optimize=True)
 
-def deduplicate_and_compress_images(usb_dir):
-    images_resized, images_skipped = 0, 0
-    for filename in os.listdir(PROCESSED_DIR):
-        src_path = os.path.join(PROCESSED_DIR, filename)
+def image_hash(path):
+    # Same decode as hash_images (load_gray on the downloaded file), so an image
+    # gets the same aHash whichever of the two hashed it
+    return int(hash_batch(load_gray(path)[None], kinds=("ahash",))["ahash"][0])
+
+def process_image(filename, usb_dir, journal=None, key=None, h=None):
+    # h: the image's aHash when hash_images already computed it
+    src_path = os.path.join(PROCESSED_DIR, filename)
+    if filename.lower().endswith(HEIF_EXTS):
+        ensure_heif_opener()
+    if h is None:
+        h = image_hash(src_path)  # before a HEIC is converted, as hash_images sees it
+    img = Image.open(src_path)
+
+    if filename.lower().endswith(HEIF_EXTS):
+        filename = os.path.splitext(filename)[0] + ".jpg"
+        new_path = os.path.join(PROCESSED_DIR, filename)
+        img.save(new_path, "JPEG")
+        os.remove(src_path)
+        src_path = new_path
+        img = Image.open(src_path)
+
+    shutil.copy2(src_path, os.path.join(usb_dir, filename))
+
+    with HASHES_LOCK:
+        duplicate = h in HASHES
+        HASHES.add(h)
+    if duplicate:
+        os.remove(src_path)
+        if journal: journal.record(key, "processed", outcome="duplicate", hash=format(h, "016x"), name=filename)
+        return "duplicate"
+
+    compress_image(img, src_path)
+    if journal: journal.record(key, "processed", outcome="resized", hash=format(h, "016x"), name=filename)
+    return "resized"
+
+def hash_images(filenames):
+    # aHashes for a batch of downloaded images, from small grayscale thumbnails hashed
+    # in one call; None where an image would not decode (process_image reports it)
+    if any(name.lower().endswith(HEIF_EXTS) for name in filenames):
+        ensure_heif_opener()
+    hashes, grays = [None] * len(filenames), []
+    for i, name in enumerate(filenames):
         try:
-            img = Image.open(src_path)
-
-            if filename.lower().endswith(".heic"):
-                filename = os.path.splitext(filename)[0] + ".jpg"
-                new_path = os.path.join(PROCESSED_DIR, filename)
-                img.save(new_path, "JPEG")
-                os.remove(src_path)
-                src_path = new_path
-                img = Image.open(src_path)
-
-            shutil.copy2(src_path, os.path.join(usb_dir, filename))
-
-            h = imagehash.average_hash(img)
-            if h in HASHES:
-                os.remove(src_path)
-                continue
-            HASHES.add(h)
-
-            compress_image(img, src_path)
-            images_resized += 1
-
-        except:
-            images_skipped += 1
-
-    print(f"\n✅ Resized {images_resized} images.")
-    print(f"✅ Skipped {images_skipped} images.\n")
+            grays.append((i, load_gray(os.path.join(PROCESSED_DIR, name))))
+        except Exception:
+            continue
+    if grays:
+        batch = hash_batch([gray for _, gray in grays], kinds=("ahash",))["ahash"]
+        for (i, _), h in zip(grays, batch):
+            hashes[i] = int(h)
+    return hashes
+
+def delete_large_file(service, f):
+    try:
+        execute(service.files().delete(fileId=f.id))
+    except Exception as e:
+        log(f"⚠ Failed to delete {f.name}: {e}")
+        raise ItemFailed(f.id)
+    log(f"🗑 Deleted from Drive: {f.name}")
+    return f
 
-def delete_large_files_from_drive(service, files):
+def delete_large_files_from_drive(service, files, verified_ids):
+    # Only files whose USB copy passed the checksum check are deleted
     deleted, failed = 0, 0
     for f in files:
+        if f.id not in verified_ids:
+            continue
         try:
-            service.files().delete(fileId=f['id']).execute()
-            print(f"🗑 Deleted from Drive: {f['name']}")
+            delete_large_file(service, f)
             deleted += 1
-        except Exception as e:
-            print(f"⚠ Failed to delete {f['name']}: {e}")
+        except ItemFailed:
             failed += 1
     return deleted, failed
 
-def upload_resized_images(service, folder_id):
-    existing_files = {}
-    results = service.files().list(q=f"'{folder_id}' in parents and trashed = false",
-                                   fields="files(id, name)").execute()
-    for f in results.get('files', []):
-        existing_files[f['name']] = f['id']
-
-    uploaded, updated = 0, 0
-    for file in os.listdir(PROCESSED_DIR):
-        file_path = os.path.join(PROCESSED_DIR, file)
-        media = MediaFileUpload(file_path, resumable=True)
-
-        if file in existing_files:
-            service.files().update(fileId=existing_files[file], media_body=media).execute()
-            print(f"🔄 Updated in Drive: {file}")
-            updated += 1
-        else:
-            service.files().create(body={'name': file, 'parents': [folder_id]}, media_body=media).execute()
-            print(f"☁ Uploaded new: {file}")
-            uploaded += 1
-    return uploaded, updated
+def list_upload_jobs(service, folder_id):
+    existing_files = {f.name: f.id for f in list_records(service, f"'{folder_id}' in parents and trashed = false",
+                                                          "id, name, mimeType")}
+    return [(file, existing_files.get(file)) for file in os.listdir(PROCESSED_DIR)]
 
-def run_agent2(usb_root, progress_callback=None, status_callback=None):
-    log_capture = io.StringIO()
-    sys.stdout = log_capture
+def upload_file(service, folder_id, file, existing_id=None):
+    file_path = os.path.join(PROCESSED_DIR, file)
+    media = MediaFileUpload(file_path, resumable=True)
 
+    if existing_id:
+        execute(service.files().update(fileId=existing_id, media_body=media))
+        log(f"🔄 Updated in Drive: {file}")
+        return "updated"
+    execute(service.files().create(body={'name': file, 'parents': [folder_id]}, media_body=media))
+    log(f"☁ Uploaded new: {file}")
+    return "uploaded"
+
+def upload_resized_images(service, folder_id):
+    outcomes = [upload_file(service, folder_id, file, existing_id)
+                for file, existing_id in list_upload_jobs(service, folder_id)]
+    return outcomes.count("uploaded"), outcomes.count("updated")
+
+def load_resume_pointer(path=RESUME_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_resume_pointer(pointer, path=RESUME_PATH):
+    atomic_write(path, json.dumps({**pointer, "updated": time.time()}, indent=2), mode="w")
+
+def run_is_complete(usb_dir):
+    journal_path = os.path.join(usb_dir, JOURNAL_NAME)
+    if not os.path.exists(journal_path):
+        return False
+    journal = JobJournal(journal_path)
+    complete = journal.state("run") == "complete"
+    journal.close()
+    return complete
+
+def find_resumable_run(usb_root=None):
+    # The unfinished run named by the pointer file (only if it was for this USB root)
+    pointer = load_resume_pointer()
+    if not pointer or not os.path.isdir(pointer.get("usb_dir", "")):
+        return None
+    if usb_root and os.path.abspath(pointer["usb_root"]) != os.path.abspath(usb_root):
+        return None
+    return None if run_is_complete(pointer["usb_dir"]) else pointer
+
+def run_agent2(usb_root, progress_callback=None, status_callback=None, on_event=None, video_mode="copy",
+               profile_dir=None):
+    with RunRecorder("agent2", [on_event], profile_dir=profile_dir) as run:
+        _run_agent2(usb_root, progress_callback, status_callback, video_mode)
+    return run.log_text()
+
+def resume_agent2(progress_callback=None, status_callback=None, on_event=None, profile_dir=None):
+    # Continues the last unfinished run, whichever USB folder it was writing to
+    with RunRecorder("agent2", [on_event], profile_dir=profile_dir) as run:
+        pointer = find_resumable_run()
+        if pointer:
+            _run_agent2(pointer["usb_root"], progress_callback, status_callback, pointer.get("video_mode", "copy"))
+        else:
+            log("ℹ No unfinished Agent 2 run to resume.")
+            if status_callback: status_callback("ℹ Nothing to resume.")
+            if progress_callback: progress_callback(100)
+    return run.log_text()
+
+def _run_agent2(usb_root, progress_callback=None, status_callback=None, video_mode="copy"):
+    journal = None
+    archive = None
+    pointer = None
+    last = {"id": None}
     try:
         if not os.path.exists(usb_root):
             raise FileNotFoundError(f"The path '{usb_root}' does not exist.")
+        if video_mode not in VIDEO_MODES:
+            raise ValueError(f"Unknown video mode {video_mode!r}; expected one of {', '.join(VIDEO_MODES)}")
 
-        today = datetime.date.today().isoformat()
-        usb_dir = os.path.join(usb_root, f"backup_{today}")
+        pointer = find_resumable_run(usb_root)
+        if pointer:
+            usb_dir = pointer["usb_dir"]
+            log(f"🔁 Resuming unfinished run: {usb_dir} (stopped in {pointer['phase']}, last file {pointer['last_id']})")
+        else:
+            today = datetime.date.today().isoformat()
+            usb_dir = os.path.join(usb_root, f"backup_{today}")
+            pointer = {"usb_root": usb_root, "usb_dir": usb_dir, "phase": "images", "last_id": None,
+                       "video_mode": video_mode}
         os.makedirs(usb_dir, exist_ok=True)
 
+        journal_path = os.path.join(usb_dir, JOURNAL_NAME)
+        if run_is_complete(usb_dir):
+            os.remove(journal_path)  # finished run from earlier today → start over
+        journal = JobJournal(journal_path)
+        save_resume_pointer(pointer)
+        # Images processed before the restart still count when spotting duplicates
+        with HASHES_LOCK:
+            HASHES.update(int(r["hash"], 16) for r in journal.entries.values() if r.get("hash"))
+
+        def checkpoint(phase):
+            pointer.update(phase=phase, last_id=last["id"])
+            save_resume_pointer(pointer)
+
         if not os.path.exists(PROCESSED_DIR):
             os.makedirs(PROCESSED_DIR)
 
@@ -138,49 +303,230 @@ def run_agent2(usb_root, progress_callback=None, status_callback=None):
         if progress_callback: progress_callback(5)
 
         service = authenticate()
-
-        if status_callback: status_callback("🔍 Scanning Drive for images…")
-        images = find_images_in_drive(service)
-        print(f"📸 Found {len(images)} images.")
-        if progress_callback: progress_callback(15)
-
-        for idx, f in enumerate(images):
-            if status_callback: status_callback(f"⬇ Downloading: {f['name']}")
-            download_file(service, f['id'], f['name'], PROCESSED_DIR)
-            if progress_callback: progress_callback(15 + int(10 * (idx + 1) / max(1, len(images))))
-
-        if status_callback: status_callback("🛠 Compressing and de-duplicating images…")
-        deduplicate_and_compress_images(usb_dir)
-        if progress_callback: progress_callback(40)
-
-        if status_callback: status_callback("🔍 Scanning Drive for large files…")
-        large_files = find_large_files_in_drive(service)
-        print(f"📦 Found {len(large_files)} large files.")
-        if progress_callback: progress_callback(55)
-
-        for idx, f in enumerate(large_files):
-            if status_callback: status_callback(f"⬇ Downloading: {f['name']}")
-            download_file(service, f['id'], f['name'], usb_dir)
-            if progress_callback: progress_callback(55 + int(10 * (idx + 1) / max(1, len(large_files))))
-
-        if status_callback: status_callback("🗑 Deleting large files from Drive…")
-        deleted, failed = delete_large_files_from_drive(service, large_files)
-        print(f"🗑 Deleted {deleted}, Failed: {failed}")
-        if progress_callback: progress_callback(75)
-
-        if status_callback: status_callback("☁ Uploading compressed images back to Drive…")
-        uploaded, updated = upload_resized_images(service, UPLOAD_FOLDER_ID)
-        print(f"☁ Uploaded: {uploaded}, Updated: {updated}")
-        if progress_callback: progress_callback(95)
+        window = DRIVE_EXECUTOR.start_window()
+
+        # Listings are streamed: downloads start while later pages are still being fetched
+        def scan_images():
+            if status_callback: status_callback("🔍 Scanning Drive for images…")
+            count = 0
+            for record in find_images_in_drive(service):
+                count += 1
+                yield record
+            log(f"📸 Found {count} images.")
+
+        def download_image(f):
+            key = f"img:{f.id}"
+            state = journal.state(key)
+            if state == "processed" or (state == "downloaded" and os.path.exists(os.path.join(PROCESSED_DIR, f.name))):
+                return f
+            if status_callback: status_callback(f"⬇ Downloading: {f.name}")
+            download_file(authenticate(), f.id, f.name, PROCESSED_DIR)
+            journal.record(key, "downloaded", name=f.name)
+            return f
+
+        def hash_downloaded(files):
+            # Up to HASH_BATCH downloaded images per call; processed ones need no hash
+            todo = [f for f in files if journal.state(f"img:{f.id}") != "processed"]
+            hashes = dict(zip((f.id for f in todo), hash_images([f.name for f in todo])))
+            return [(f, hashes.get(f.id)) for f in files]
+
+        def transform_image(item):
+            f, h = item
+            key = f"img:{f.id}"
+            record = journal.get(key)
+            if record and record["state"] == "processed":
+                outcome = record["outcome"]
+            else:
+                outcome = process_image(f.name, usb_dir, journal, key, h)
+            last["id"] = f.id
+            return outcome
+
+        done = journal.get("phase:images")
+        if done:
+            log("⏭ Images already processed in this run.")
+        else:
+            # Drive workers each use their own thread's client (authenticate() is per thread);
+            # the shared executor throttles how many calls are in flight
+            image_pipeline = Pipeline("agent2-images", [
+                Stage("list", scan_images, source=True),
+                Stage("download", download_image, concurrency=DRIVE_WORKERS, weight=2, measure=lambda f: f.size),
+                Stage("hash", hash_downloaded, batch=HASH_BATCH, queue_size=HASH_BATCH),
+                Stage("transform", transform_image, concurrency=IMAGE_WORKERS, weight=2),
+            ])
+            outcomes = image_pipeline.run_sync(progress_range(progress_callback, 5, 40))
+            done = journal.record("phase:images", "done", resized=outcomes.count("resized"),
+                                  skipped=image_pipeline.stats()["transform"]["failed"])
+            checkpoint("large")
+        log(f"\n✅ Resized {done['resized']} images.")
+        log(f"✅ Skipped {done['skipped']} images.\n")
+
+        # Files deleted before the restart are gone from the listing; they are
+        # replayed from the journal so the totals come out the same
+        already_deleted = {key[len("large:"):]: r for key, r in journal.entries.items()
+                           if key.startswith("large:") and r["state"] in ("deleted", "replaced")}
+
+        def scan_large_files():
+            if status_callback: status_callback("🔍 Scanning Drive for large files…")
+            count = 0
+            for record in find_large_files_in_drive(service):
+                already_deleted.pop(record.id, None)
+                count += 1
+                yield record
+            for file_id, r in already_deleted.items():
+                count += 1
+                yield FileRecord(file_id, r["name"], "", r["size"])
+            log(f"📦 Found {count} large files.")
+
+        if zstd_available():
+            archive = Archive(os.path.join(usb_dir, ARCHIVE_DIR))
+        else:
+            log("ℹ zstandard is not installed: large files are copied to USB uncompressed.")
+        transcoder = None
+        if video_mode != "copy":
+            import drive_transcode as transcoder  # ffmpeg is only loaded when videos are shrunk
+        kept, replaced = [], []
+
+        def copy_large_file(f):
+            # Returns the transcoded copy's path, or None when the bytes were copied as they are
+            if transcoder and transcoder.should_transcode(f):
+                path = os.path.join(usb_dir, transcoder.transcoded_name(f))
+                try:
+                    digest = transcoder.transcode_from_drive(authenticate(), f, path)
+                except transcoder.TranscodeError as e:
+                    log(f"⚠ Could not transcode, copying as is: {e}")
+                else:
+                    if f.md5_hex and digest != f.md5_hex:
+                        os.remove(path)
+                        raise ChecksumMismatch(f"{f.name}: stream had MD5 {digest}, Drive has {f.md5_hex}")
+                    log(f"🎞 Transcoded: {f.name} ({f.size / 1e6:.1f} MB → {os.path.getsize(path) / 1e6:.1f} MB)")
+                    return path
+            if archive:
+                archive_file(authenticate(), f, archive)
+            else:
+                download_file(authenticate(), f.id, f.name, usb_dir, f.md5_hex)
+            return None
+
+        def is_copied(f, record):
+            if record.get("transcoded"):
+                return os.path.exists(record["transcoded"])
+            return archive.name_for(f.name, f.id) in archive if archive else os.path.exists(os.path.join(usb_dir, f.name))
+
+        def download_large_file(f):
+            # Returns the file only once its copy matches Drive's MD5; anything else stays in Drive
+            key = f"large:{f.id}"
+            record = journal.get(key) or {}
+            state = record.get("state")
+            if state in ("deleted", "replaced") or (state == "verified" and is_copied(f, record)):
+                return f
+            if state == "downloaded" and is_copied(f, record):
+                kept.append(f.id)
+                return None
+            for attempt in range(1, VERIFY_ATTEMPTS + 1):
+                if status_callback: status_callback(f"⬇ Downloading: {f.name}")
+                try:
+                    transcoded = copy_large_file(f)
+                    break
+                except ChecksumMismatch as e:
+                    log(f"⚠ Checksum mismatch, downloading again ({attempt}/{VERIFY_ATTEMPTS}): {e}")
+            else:
+                log(f"❌ {f.name} never matched its Drive checksum; kept in Drive.")
+                raise ItemFailed(f.id)
+            if not f.md5:
+                # Nothing to verify against (Drive only stores MD5s for some files)
+                journal.record(key, "downloaded", name=f.name, size=f.size, transcoded=transcoded)
+                kept.append(f.id)
+                return None
+            journal.record(key, "verified", name=f.name, size=f.size, md5=f.md5_hex, transcoded=transcoded)
+            return f
+
+        def delete_downloaded_file(f):
+            key = f"large:{f.id}"
+            record = journal.get(key) or {}
+            if record.get("state") not in ("verified", "deleted", "replaced"):
+                raise ItemFailed(f.id)
+            if record["state"] == "replaced":
+                replaced.append(f.id)
+            elif record["state"] == "verified" and video_mode == "replace" and record.get("transcoded"):
+                transcoder.replace_in_drive(authenticate(), f, record["transcoded"])
+                journal.record(key, "replaced", name=f.name, size=f.size, transcoded=record["transcoded"])
+                log(f"🔁 Replaced in Drive with the transcoded copy: {f.name}")
+                replaced.append(f.id)
+            elif record["state"] == "verified":
+                delete_large_file(authenticate(), f)
+                journal.record(key, "deleted", name=f.name, size=f.size)
+            last["id"] = f.id
+            return f
+
+        done = journal.get("phase:large")
+        if done:
+            log("⏭ Large files already moved in this run.")
+        else:
+            # A file is only deleted from Drive once its copy is verified
+            large_pipeline = Pipeline("agent2-large", [
+                Stage("list", scan_large_files, source=True),
+                Stage("download", download_large_file, concurrency=DRIVE_WORKERS, weight=3, measure=lambda f: f.size),
+                Stage("delete", delete_downloaded_file, concurrency=DRIVE_WORKERS),
+            ])
+            large_pipeline.run_sync(progress_range(progress_callback, 40, 75))
+            delete_stats = large_pipeline.stats()["delete"]
+            done = journal.record("phase:large", "done", deleted=delete_stats["completed"] - len(replaced),
+                                  failed=delete_stats["failed"], kept=len(kept), replaced=len(replaced))
+            checkpoint("upload")
+        log(f"🗑 Deleted {done['deleted']}, Failed: {done['failed']}")
+        if done.get("replaced"):
+            log(f"🔁 Replaced {done['replaced']} videos in Drive with their transcoded copies.")
+        if done.get("kept"):
+            log(f"🔒 Kept {done['kept']} copied files in Drive: no checksum to verify them against.")
+        if archive:
+            t = archive.totals()
+            log(f"🗜 Archive: {t['size'] / 1e6:.1f} MB → {t['length'] / 1e6:.1f} MB "
+                f"({t['compressed']} of {t['files']} files compressed) in {os.path.join(usb_dir, ARCHIVE_DIR)}")
+
+        def upload_job(job):
+            name, existing_id = job
+            record = journal.get(f"upload:{name}")
+            if record:
+                # Re-uploading would turn this run's "uploaded" into "updated"
+                return record["outcome"]
+            outcome = upload_file(authenticate(), UPLOAD_FOLDER_ID, name, existing_id)
+            journal.record(f"upload:{name}", "uploaded", outcome=outcome)
+            last["id"] = name
+            return outcome
+
+        done = journal.get("phase:upload")
+        if done:
+            log("⏭ Images already uploaded in this run.")
+        else:
+            if status_callback: status_callback("☁ Uploading compressed images back to Drive…")
+            upload_pipeline = Pipeline("agent2-upload", [
+                Stage("list", lambda: list_upload_jobs(service, UPLOAD_FOLDER_ID), source=True),
+                Stage("upload", upload_job, concurrency=DRIVE_WORKERS, weight=3,
+                      measure=lambda job: os.path.getsize(os.path.join(PROCESSED_DIR, job[0]))),
+            ])
+            outcomes = upload_pipeline.run_sync(progress_range(progress_callback, 75, 95))
+            done = journal.record("phase:upload", "done", uploaded=outcomes.count("uploaded"),
+                                  updated=outcomes.count("updated"))
+        log(f"☁ Uploaded: {done['uploaded']}, Updated: {done['updated']}")
+        DRIVE_EXECUTOR.log_stats(window)
+
+        journal.record("run", "complete")
+        if os.path.exists(RESUME_PATH):
+            os.remove(RESUME_PATH)
 
         if status_callback: status_callback("✅ Backup Complete!")
         if progress_callback: progress_callback(100)
 
-        print(f"\n✅ Backup done.\nFiles saved to: {usb_dir}\nImages: {PROCESSED_DIR}")
+        log(f"\n✅ Backup done.\nFiles saved to: {usb_dir}\nImages: {PROCESSED_DIR}")
 
     except Exception as e:
-        print(f"❌ Error: {e}")
+        log_error(e)
         if status_callback: status_callback(f"❌ Error: {e}")
-
-    sys.stdout = sys.__stdout__
-    return log_capture.getvalue()
+        if journal:
+            pointer.update(last_id=last["id"])
+            save_resume_pointer(pointer)
+            log("⏯ Progress saved: use Resume Agent 2 to continue.")
+
+    if archive:
+        archive.close()
+    if journal:
+        journal.close()
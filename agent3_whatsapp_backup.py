@@ -1,46 +1,108 @@
-import sys
 import os
-import io
 import subprocess
+import contextvars
 import shutil
-from datetime import datetime, timedelta
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from PIL import Image
 import ffmpeg
 
+from job_journal import JobJournal
+from adb_devices import adb_command, list_devices
+from db_retention import pull_databases, DEFAULT_POLICY
+from media_dedup import dedupe_media, link_duplicate
+from video_fingerprint import dedupe_videos
+from pipeline import Pipeline, Stage, ItemFailed, progress_range
+from agent_events import RunRecorder, log, log_error, log_fields
+from video_encoding import encode_video, plan_for_deadline, DEFAULT_PRESET, DEFAULT_CRF
+
 RESIZE_WIDTH = 720
 IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
 VIDEO_EXTS = {".mp4", ".3gp", ".avi"}
+BACKUP_ROOT_PREFIX = "updated_whatsapp_"
+JOURNAL_NAME = ".agent3_journal.jsonl"
+MEDIA_FOLDERS = [
+    "WhatsApp Images", "WhatsApp Video", "WhatsApp Documents",
+    "WhatsApp Stickers", "WhatsApp Audio", "WallPaper", "WhatsApp Profile Photos"
+]
+KEEP_FOLDERS = {"WhatsApp Images", "WhatsApp Video"}
+PULL_WORKERS = 2
+VIDEO_NEAR_DUP_ACTION = "report"  # "report" or "remove" re-encoded copies of the same clip
+BACKUP_ROOT_PATTERN = re.compile(r"^updated_whatsapp_(\d{4}-\d{2}-\d{2})(?:_(.+))?$")
 
-def resize_image(path):
-    try:
-        with Image.open(path) as img:
-            original_width, _ = img.size
-            if original_width <= RESIZE_WIDTH:
-                return False
-            img.thumbnail((RESIZE_WIDTH, RESIZE_WIDTH))
-            img.save(path)
-            return True
-    except Exception:
-        return False
+# One transcode pool for the whole process, shared by every device being backed up
+CPU_COUNT = os.cpu_count() or 2
+TRANSCODE_WORKERS = max(1, CPU_COUNT // 2)
+FFMPEG_THREADS = max(1, CPU_COUNT // TRANSCODE_WORKERS)
+TRANSCODE_POOL = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="transcode")
+
+def temp_path_for(path):
+    if path.lower().endswith(tuple(VIDEO_EXTS)):
+        return path + ".tmp.mp4"
+    root, ext = os.path.splitext(path)
+    return root + ".tmp" + ext
+
+def is_temp_file(name):
+    return os.path.splitext(os.path.splitext(name)[0])[1].lower() == ".tmp"
+
+def probe_image(path):
+    with Image.open(path) as img:
+        return img.size[0]
+
+def transcode_image(path, temp_path):
+    with Image.open(path) as img:
+        img.thumbnail((RESIZE_WIDTH, RESIZE_WIDTH))
+        img.save(temp_path)
+
+def probe_video(path):
+    streams = ffmpeg.probe(path).get("streams", [])
+    return max((int(s.get("width", 0)) for s in streams if s.get("codec_type") == "video"), default=0)
+
+def transcode_video(path, temp_path, preset=DEFAULT_PRESET, crf=DEFAULT_CRF):
+    encode_video(path, temp_path, RESIZE_WIDTH, preset, crf, threads=FFMPEG_THREADS)
+
+def resize_file(path, probe, transcode, journal=None):
+    key = journal.key_for(path) if journal else None
+    record = journal.get(key) if journal else None
+    state = record["state"] if record else None
+    temp_path = temp_path_for(path)
+
+    if state in ("replaced", "skipped"):
+        return state == "replaced"
 
-def resize_video(path):
     try:
-        temp_path = path + ".tmp.mp4"
-        (
-            ffmpeg
-            .input(path)
-            .filter('scale', f'{RESIZE_WIDTH}:-2')
-            .output(temp_path, vcodec='libx264', acodec='aac', strict='experimental')
-            .overwrite_output()
-            .run(quiet=True)
-        )
+        if state != "transcoded" or not os.path.exists(temp_path):
+            if state == "probed":
+                width = record["width"]
+            else:
+                width = probe(path)
+                if journal: journal.record(key, "probed", width=width)
+            if width <= RESIZE_WIDTH:
+                if journal: journal.record(key, "skipped", width=width)
+                return False
+            transcode(path, temp_path)
+            if journal: journal.record(key, "transcoded", width=width)
         os.replace(temp_path, path)
+        if journal: journal.record(key, "replaced", size=os.path.getsize(path))
         return True
     except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         return False
 
-def resize_media(media_root, status_callback=None):
-    images_resized = videos_resized = images_skipped = videos_skipped = 0
+def resize_image(path, journal=None):
+    return resize_file(path, probe_image, transcode_image, journal)
+
+def resize_video(path, journal=None, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, probe=probe_video):
+    transcode = lambda src, dst: transcode_video(src, dst, preset, crf)
+    return resize_file(path, probe, transcode, journal)
+
+def folder_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def collect_media(media_root):
+    images, videos = [], []
     for folder in ["WhatsApp Images", "WhatsApp Video"]:
         folder_path = os.path.join(media_root, folder)
         if not os.path.exists(folder_path):
@@ -49,96 +111,267 @@ def resize_media(media_root, status_callback=None):
 
         for root, _, files in os.walk(folder_path):
             for file in files:
+                if is_temp_file(file):
+                    continue
                 ext = os.path.splitext(file)[1].lower()
                 full_path = os.path.join(root, file)
-
                 if ext in IMAGE_EXTS:
-                    if resize_image(full_path):
-                        images_resized += 1
-                    else:
-                        images_skipped += 1
+                    images.append(full_path)
                 elif ext in VIDEO_EXTS:
-                    if resize_video(full_path):
-                        videos_resized += 1
-                    else:
-                        videos_skipped += 1
+                    videos.append(full_path)
+    return images, videos
+
+def group_hardlinks(paths, journal=None):
+    # Returns {leader: [followers]}; followers share the leader's content and are
+    # re-linked to it once it has been resized instead of being transcoded again.
+    groups, by_inode = {}, {}
+    known = {os.path.abspath(p): p for p in paths}
+    for path in paths:
+        record = journal.get(journal.key_for(path)) if journal else None
+        if record and record["state"] == "linked":
+            primary = known.get(os.path.abspath(os.path.join(journal.root, record["primary"])))
+            if primary:
+                groups.setdefault(primary, []).append(path)
+                continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        leader = by_inode.setdefault((st.st_dev, st.st_ino), path)
+        if leader == path:
+            groups.setdefault(path, [])
+        else:
+            groups[leader].append(path)
+    return groups
+
+def relink_followers(leader, followers, journal=None):
+    for follower in followers:
+        if journal and journal.state(journal.key_for(follower)) == "replaced":
+            continue
+        try:
+            if not os.path.samefile(leader, follower):
+                link_duplicate(leader, follower)
+            if journal: journal.record(journal.key_for(follower), "replaced", linked_to=journal.key_for(leader))
+        except OSError:
+            continue
+
+def plan_media_jobs(media_root, status_callback=None, journal=None, deadline_minutes=None, crf=DEFAULT_CRF,
+                    encoders=TRANSCODE_WORKERS):
+    # encoders: this backup's share of TRANSCODE_POOL, which runs the encodes side by side
+    images, videos = collect_media(media_root)
+    image_groups = group_hardlinks(images, journal)
+    video_groups = group_hardlinks(videos, journal)
+
+    presets, infos = {}, {}
+    if deadline_minutes:
+        pending = [v for v in video_groups if not journal or journal.state(journal.key_for(v)) not in ("replaced", "skipped")]
+        if status_callback: status_callback("📐 Planning video encodes for the deadline...")
+        presets, infos = plan_for_deadline(pending, deadline_minutes * 60, RESIZE_WIDTH, crf,
+                                           workers=encoders, threads=FFMPEG_THREADS)
+
+    jobs = [{"kind": "image", "path": p, "followers": f, "size": os.path.getsize(p)} for p, f in image_groups.items()]
+    for path, followers in video_groups.items():
+        jobs.append({"kind": "video", "path": path, "followers": followers, "size": os.path.getsize(path),
+                     "preset": presets.get(path, DEFAULT_PRESET), "width": infos.get(path, {}).get("width")})
+    return jobs
+
+def run_media_job(job, journal=None, crf=DEFAULT_CRF):
+    if job["kind"] == "image":
+        resized = resize_image(job["path"], journal)
+    else:
+        width = job.get("width")
+        probe = (lambda p: width) if width is not None else probe_video
+        resized = resize_video(job["path"], journal, job["preset"], crf, probe)
+    relink_followers(job["path"], job["followers"], journal)
+    return {"kind": job["kind"], "resized": resized, "linked": len(job["followers"])}
 
-    print(f"\n✅ Resized {images_resized} images, {videos_resized} videos.")
-    print(f"✅ Skipped {images_skipped} images, {videos_skipped} videos.\n")
+def report_resize_results(results):
+    count = lambda kind, resized: sum(1 for r in results if r["kind"] == kind and r["resized"] == resized)
+    log(f"\n✅ Resized {count('image', True)} images, {count('video', True)} videos.")
+    log(f"✅ Skipped {count('image', False)} images, {count('video', False)} videos.")
+    log(f"♻️ Reused {sum(r['linked'] for r in results)} hardlinked duplicates without re-encoding.\n")
 
 def delete_folders(media_root, folders_to_delete, status_callback=None):
     for folder in folders_to_delete:
         path = os.path.join(media_root, folder)
         if os.path.exists(path):
             shutil.rmtree(path, ignore_errors=True)
-            print(f"🗑 Deleted folder: {folder}")
+            log(f"🗑 Deleted folder: {folder}")
 
-def pull_whatsapp_backup(adb_path, db_path, media_path, status_callback=None, progress_callback=None):
-    log_capture = io.StringIO()
-    sys.stdout = log_capture
+def backup_root_name(serial=None):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return f"{BACKUP_ROOT_PREFIX}{today}_{serial}" if serial else f"{BACKUP_ROOT_PREFIX}{today}"
 
+def find_resumable_backup_root(base_dir=".", serial=None):
+    roots = []
+    for d in os.listdir(base_dir):
+        match = BACKUP_ROOT_PATTERN.match(d)
+        if match and match.group(2) == serial and os.path.isdir(os.path.join(base_dir, d)):
+            roots.append((match.group(1), d))
+    for _, root in sorted(roots, reverse=True):
+        journal_path = os.path.join(base_dir, root, JOURNAL_NAME)
+        if not os.path.exists(journal_path):
+            continue
+        journal = JobJournal(journal_path)
+        complete = journal.state("run") == "complete"
+        journal.close()
+        if not complete:
+            return os.path.join(base_dir, root)
+    return None
+
+def pull_folder(adb_path, remote_path, local_path, journal, key, serial=None):
+    if journal.state(key) == "pulled":
+        log(f"⏭ Already pulled: {os.path.basename(local_path)}")
+        return True
+    # A partial pull from a crashed run would make adb nest the folder
+    if os.path.isdir(local_path):
+        shutil.rmtree(local_path, ignore_errors=True)
+    result = subprocess.run(adb_command(adb_path, serial, "pull", remote_path, local_path),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if result.returncode == 0:
+        journal.record(key, "pulled")
+        return True
+    return False
+
+def backup_device(adb_path, db_path, media_path, status_callback=None, progress_callback=None, deadline_minutes=None,
+                  retention_policy=None, serial=None, encoders=TRANSCODE_WORKERS):
+    journal = None
     try:
-        today = datetime.now().strftime("%Y-%m-%d")
-        local_backup_root = f"updated_whatsapp_{today}"
+        local_backup_root = find_resumable_backup_root(serial=serial)
+        resuming = local_backup_root is not None
+        if resuming:
+            log(f"🔁 Resuming unfinished backup: {local_backup_root}")
+        else:
+            local_backup_root = backup_root_name(serial)
         backups_folder = os.path.join(local_backup_root, "Backups", "Databases")
         media_folder = os.path.join(local_backup_root, "Media")
 
         os.makedirs(backups_folder, exist_ok=True)
         os.makedirs(media_folder, exist_ok=True)
+        journal_path = os.path.join(local_backup_root, JOURNAL_NAME)
+        if not resuming and os.path.exists(journal_path):
+            os.remove(journal_path)  # finished run from earlier today → start over
+        journal = JobJournal(journal_path)
+
+        if status_callback: status_callback("📥 Pulling Backups...")
+        failed_dbs = []
+
+        def pull(name):
+            if status_callback: status_callback(f"📥 Pulling {name}...")
+            if name == "Databases":
+                result = pull_databases(adb_path, db_path, backups_folder, retention_policy or DEFAULT_POLICY,
+                                        journal, serial)
+                if result["failed"]:
+                    failed_dbs.extend(result["failed"])
+                    raise ItemFailed(name)  # pull_databases logged each one
+            else:
+                pull_folder(adb_path, f"{media_path}/{name}", os.path.join(media_folder, name),
+                            journal, f"pull:{name}", serial)
+            return name
+
+        def pulled_bytes(name):
+            return folder_bytes(backups_folder if name == "Databases" else os.path.join(media_folder, name))
+
+        def hash_stage(pulled):
+            folders_in_media = [f for f in os.listdir(media_folder) if os.path.isdir(os.path.join(media_folder, f))]
+            for folder in folders_in_media:
+                total = sum(len(files) for _, _, files in os.walk(os.path.join(media_folder, folder)))
+                log(f"🔍 Found {total} files in {folder}")
+
+            if status_callback: status_callback("♻️ Finding Duplicate Media...")
+            dedupe_media(media_folder, journal=journal)
+            if status_callback: status_callback("🎞 Fingerprinting Videos...")
+            dedupe_videos(os.path.join(media_folder, "WhatsApp Video"), VIDEO_NEAR_DUP_ACTION, journal)
+
+            if status_callback: status_callback("🔧 Resizing Media...")
+            return plan_media_jobs(media_folder, status_callback, journal, deadline_minutes, encoders=encoders)
+
+        def delete_stage(results):
+            report_resize_results(results)
+            folders_in_media = [f for f in os.listdir(media_folder) if os.path.isdir(os.path.join(media_folder, f))]
+            if status_callback: status_callback("🧹 Deleting Unwanted Folders...")
+            delete_folders(media_folder, {f for f in folders_in_media if f not in KEEP_FOLDERS}, status_callback)
+            return []
+
+        Pipeline("agent3", [
+            Stage("list", lambda: ["Databases"] + MEDIA_FOLDERS, source=True),
+            Stage("download", pull, concurrency=PULL_WORKERS, weight=3, measure=pulled_bytes),
+            Stage("hash", hash_stage, collect=True),
+            Stage("transform", lambda job: run_media_job(job, journal),
+                  executor=TRANSCODE_POOL, concurrency=TRANSCODE_WORKERS, weight=4, measure=lambda job: job["size"]),
+            Stage("delete", delete_stage, collect=True),
+        ]).run_sync(progress_range(progress_callback, 5, 100))
 
-        if status_callback: status_callback("📥 Pulling Databases...")
-        if progress_callback: progress_callback(10)
-        subprocess.run([adb_path, "pull", db_path, backups_folder], stdout=subprocess.DEVNULL)
-
-        cutoff = datetime.now() - timedelta(days=60)
-        for file in os.listdir(backups_folder):
-            if file.endswith(".crypt14"):
-                path = os.path.join(backups_folder, file)
-                mod_time = datetime.fromtimestamp(os.path.getmtime(path))
-                if mod_time < cutoff:
-                    os.remove(path)
-                    print(f"❌ Removed old DB: {file}")
-
-        if status_callback: status_callback("📥 Pulling Media...")
-        if progress_callback: progress_callback(30)
-
-        folders_to_pull = [
-            "WhatsApp Images", "WhatsApp Video", "WhatsApp Documents",
-            "WhatsApp Stickers", "WhatsApp Audio", "WallPaper", "WhatsApp Profile Photos"
-        ]
-
-        for folder_name in folders_to_pull:
-            subprocess.run([
-                adb_path, "pull",
-                f"{media_path}/{folder_name}",
-                os.path.join(media_folder, folder_name)
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        folders_in_media = [f for f in os.listdir(media_folder) if os.path.isdir(os.path.join(media_folder, f))]
-        for folder in folders_in_media:
-            total = sum(len(files) for _, _, files in os.walk(os.path.join(media_folder, folder)))
-            print(f"🔍 Found {total} files in {folder}")
-
-        if status_callback: status_callback("🔧 Resizing Media...")
-        if progress_callback: progress_callback(60)
-        resize_media(media_folder, status_callback)
-
-        folders_to_delete = {f for f in folders_in_media if f not in {"WhatsApp Images", "WhatsApp Video"}}
-
-        if status_callback: status_callback("🧹 Deleting Unwanted Folders...")
-        delete_folders(media_folder, folders_to_delete, status_callback)
-        if progress_callback: progress_callback(90)
-
-        print(f"\n✅ Backup completed: {local_backup_root}")
+        if failed_dbs:
+            # Not recorded as complete, so the next run resumes here and retries them
+            raise RuntimeError(f"Backup incomplete: {len(failed_dbs)} database files could not be pulled "
+                               f"({', '.join(failed_dbs)})")
+        journal.record("run", "complete")
+        log(f"\n✅ Backup completed: {local_backup_root}")
         if status_callback: status_callback("✅ Backup Complete!")
         if progress_callback: progress_callback(100)
 
     except Exception as e:
-        print(f"❌ Error: {e}")
+        log_error(e)
         if status_callback: status_callback(f"❌ Error: {e}")
 
-    sys.stdout = sys.__stdout__
-    return log_capture.getvalue()
+    if journal:
+        journal.close()
 
-def run_agent3(adb_path, db_path, media_path, progress_callback=None, status_callback=None):
-    return pull_whatsapp_backup(adb_path, db_path, media_path, status_callback, progress_callback)
+def pull_whatsapp_backup(adb_path, db_path, media_path, status_callback=None, progress_callback=None, deadline_minutes=None,
+                         retention_policy=None, serial=None, on_event=None, profile_dir=None):
+    with RunRecorder("agent3", [on_event], profile_dir=profile_dir) as run:
+        backup_device(adb_path, db_path, media_path, status_callback, progress_callback, deadline_minutes,
+                      retention_policy, serial)
+    return run.log_text()
+
+def run_agent3(adb_path, db_path, media_path, progress_callback=None, status_callback=None, deadline_minutes=None,
+               retention_policy=None, on_event=None, profile_dir=None):
+    return pull_whatsapp_backup(adb_path, db_path, media_path, status_callback, progress_callback, deadline_minutes,
+                                retention_policy, on_event=on_event, profile_dir=profile_dir)
+
+def run_agent3_all_devices(adb_path, db_path, media_path, progress_callback=None, status_callback=None,
+                           device_callback=None, deadline_minutes=None, retention_policy=None, on_event=None,
+                           profile_dir=None):
+    # device_callback(serial, percent, status) reports each phone separately
+    with RunRecorder("agent3", [on_event], profile_dir=profile_dir) as run:
+        _run_all_devices(adb_path, db_path, media_path, progress_callback, status_callback,
+                         device_callback, deadline_minutes, retention_policy)
+    return run.log_text()
+
+def _run_all_devices(adb_path, db_path, media_path, progress_callback, status_callback,
+                     device_callback, deadline_minutes, retention_policy):
+    try:
+        serials = list_devices(adb_path)
+        log(f"📱 Found {len(serials)} connected devices: {', '.join(serials) or 'none'}")
+        if status_callback: status_callback(f"📱 Backing up {len(serials)} devices...")
+        percents = {serial: 0 for serial in serials}
+        # Devices back up at the same time against the same deadline, sharing the transcode pool
+        encoders = TRANSCODE_WORKERS / max(1, len(serials))
+
+        def run_one(serial):
+            def on_progress(value):
+                percents[serial] = value
+                if device_callback: device_callback(serial, value, "")
+                if progress_callback: progress_callback(sum(percents.values()) // max(1, len(percents)))
+
+            def on_status(text):
+                if device_callback: device_callback(serial, percents[serial], text)
+
+            with log_fields(device=serial):
+                backup_device(adb_path, db_path, media_path, on_status, on_progress, deadline_minutes,
+                              retention_policy, serial, encoders)
+
+        if serials:
+            # Each device thread carries the run context so its log lines reach this run
+            with ThreadPoolExecutor(max_workers=len(serials), thread_name_prefix="device") as pool:
+                futures = [pool.submit(contextvars.copy_context().run, run_one, serial) for serial in serials]
+                for future in futures:
+                    future.result()
+
+        if status_callback: status_callback("✅ All Devices Backed Up!")
+        if progress_callback: progress_callback(100)
+
+    except Exception as e:
+        log_error(e)
+        if status_callback: status_callback(f"❌ Error: {e}")
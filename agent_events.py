@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Structured events for an agent run. Each run_agent* opens a RunRecorder; code
+# running inside it calls log() instead of print(), and pipelines publish
+# per-stage metrics. Subscribers (the Qt UI, exporters) get every event as a dict.
+#
+#   {"ts": ..., "run": "agent2-1729350000000", "agent": "agent2", "type": "log", "message": "..."}
+#   {"type": "stage", "pipeline": "agent2-large", "stage": "download", "items_per_s": 3.1, ...}
+
+METRICS_LOG = "agent_metrics.jsonl"
+LOG_TAIL_LINES = 5000  # returned by run_agent*; the full stream goes to subscribers
+# Set AGENT_EVENTS_DIR to export every event of every run as <run id>.jsonl
+EVENTS_DIR = os.environ.get("AGENT_EVENTS_DIR")
+# Set AGENT_PROFILE_DIR (or pass profile_dir) to profile every stage; see agent_profiler
+PROFILE_DIR = os.environ.get("AGENT_PROFILE_DIR")
+
+_current_run = contextvars.ContextVar("agent_run", default=None)
+_log_fields = contextvars.ContextVar("agent_log_fields", default={})
+
+class RunRecorder:
+    def __init__(self, agent, subscribers=(), export_path=None, summary_path=METRICS_LOG, profile_dir=None):
+        self.agent = agent
+        self.run_id = f"{agent}-{int(time.time() * 1000)}"
+        self.subscribers = [s for s in subscribers if s]
+        self.lines = deque(maxlen=LOG_TAIL_LINES)
+        self.summaries = []
+        if export_path is None and EVENTS_DIR:
+            export_path = os.path.join(EVENTS_DIR, f"{self.run_id}.jsonl")
+        self.export_path = export_path
+        self.summary_path = summary_path
+        self.profile_dir = profile_dir or PROFILE_DIR
+        self.profiler = None
+        self._lock = threading.Lock()
+        self._export = None
+        self._token = None
+        self.failed = False
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def emit(self, event_type, **data):
+        event = {"ts": time.time(), "run": self.run_id, "agent": self.agent, "type": event_type}
+        event.update(_log_fields.get())
+        event.update(data)
+        if self._export:
+            with self._lock:
+                self._export.write(json.dumps(event) + "\n")
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception:
+                pass
+        return event
+
+    def log(self, message):
+        device = _log_fields.get().get("device")
+        with self._lock:
+            self.lines.append(f"[{device}] {message}" if device else message)
+        self.emit("log", message=message)
+
+    def stage(self, metrics, final=False):
+        event = self.emit("stage", final=final, **metrics)
+        if final:
+            with self._lock:
+                self.summaries.append(event)
+
+    def log_text(self):
+        with self._lock:
+            return "\n".join(self.lines) + "\n"
+
+    def __enter__(self):
+        if self.export_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.export_path)), exist_ok=True)
+            self._export = open(self.export_path, "a", encoding="utf-8")
+        self._token = _current_run.set(self)
+        self.emit("run_start")
+        if self.profile_dir:
+            from agent_profiler import RunProfiler
+            self.profiler = RunProfiler(os.path.join(self.profile_dir, self.run_id))
+            self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler:
+            self.profiler.stop()
+            self.log(f"🔬 Profile written to {self.profiler.directory}")
+        self.emit("run_end", ok=exc_type is None and not self.failed)
+        _current_run.reset(self._token)
+        if self._export:
+            self._export.close()
+            self._export = None
+        if self.summary_path and self.summaries:
+            try:
+                with open(self.summary_path, "a", encoding="utf-8") as f:
+                    for event in self.summaries:
+                        f.write(json.dumps(event) + "\n")
+            except OSError:
+                pass
+        return False
+
+
+def current_run():
+    return _current_run.get()
+
+def log(message=""):
+    run = _current_run.get()
+    if run:
+        run.log(str(message))
+    else:
+        print(message)
+
+def log_error(error):
+    # The agents catch their own errors; this marks the run as failed in its run_end event
+    run = _current_run.get()
+    if run:
+        run.failed = True
+    log(f"❌ Error: {error}")
+
+@contextmanager
+def log_fields(**fields):
+    token = _log_fields.set({**_log_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_fields.reset(token)
+
+def read_stage_summaries(path=METRICS_LOG, agent=None):
+    summaries = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if agent is None or event.get("agent") == agent:
+                    summaries.append(event)
+    except OSError:
+        pass
+    return summaries
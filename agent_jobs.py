@@ -0,0 +1,120 @@
+import time
+import itertools
+import threading
+from collections import deque
+
+from agent_events import LOG_TAIL_LINES
+
+# Agents as background jobs for front ends that redraw on their own schedule
+# (main.py, the Streamlit page): start() runs an agent on a daemon thread and
+# returns at once; the page reads progress, status, the log tail and stage
+# metrics from the Job whenever it redraws. One JobManager lives per process.
+# Jobs are keyed by agent: a second start() of a running key returns the running
+# job, since each agent keeps process-wide state (agent2: its download folder,
+# image hashes and resume pointer) that two runs would trample.
+#
+#   job = manager.start("agent2", "📤 Agent 2 → E:/", run_agent2, "E:/", video_mode="shrink")
+#   job.progress, job.status, job.log_text(), job.state   # "running", "done" or "failed"
+
+FINISHED_JOBS_KEPT = 20
+
+class Job:
+    def __init__(self, job_id, key, title):
+        self.id = job_id
+        self.key = key
+        self.title = title
+        self.state = "running"
+        self.progress = 0
+        self.status = "⏳ Starting..."
+        self.stages = {}
+        self.started = time.time()
+        self.ended = None
+        self.error = None
+        self._lines = deque(maxlen=LOG_TAIL_LINES)
+        self._lock = threading.Lock()
+        self._ok = None
+
+    @property
+    def running(self):
+        return self.state == "running"
+
+    def elapsed(self):
+        return (self.ended or time.time()) - self.started
+
+    def log_text(self, last=None):
+        with self._lock:
+            lines = list(self._lines)
+        return "\n".join(lines[-last:] if last else lines)
+
+    def set_progress(self, value):
+        self.progress = max(0, min(100, int(value)))
+
+    def set_status(self, text):
+        self.status = text
+
+    def on_event(self, event):
+        if event["type"] == "log":
+            device = event.get("device")
+            with self._lock:
+                self._lines.append(f"[{device}] {event['message']}" if device else event["message"])
+        elif event["type"] == "stage":
+            self.stages[(event["pipeline"], event["stage"])] = event
+        elif event["type"] == "run_end":
+            # Agents catch their own errors; run_end tells whether the run went through
+            self._ok = event["ok"] if self._ok is None else self._ok and event["ok"]
+
+    def _run(self, function, args, kwargs):
+        try:
+            function(*args, progress_callback=self.set_progress, status_callback=self.set_status,
+                     on_event=self.on_event, **kwargs)
+        except Exception as e:
+            self.error = e
+            self.on_event({"type": "log", "message": f"❌ Error: {e}"})
+        self.ended = time.time()
+        self.state = "done" if self.error is None and self._ok is not False else "failed"
+        if self.state == "done":
+            self.progress = 100
+
+class JobManager:
+    def __init__(self):
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def running_job(self, key):
+        with self._lock:
+            return next((job for job in self._jobs.values() if job.key == key and job.running), None)
+
+    def start(self, key, title, function, *args, **kwargs):
+        # A job already running under key is returned instead of starting a second one,
+        # so a double click or a rerun of the page never runs the same work twice
+        with self._lock:
+            for job in self._jobs.values():
+                if job.key == key and job.running:
+                    return job
+            job = Job(next(self._ids), key, title)
+            self._jobs[job.id] = job
+            self._forget_old()
+        threading.Thread(target=job._run, args=(function, args, kwargs), name=f"job-{job.id}-{key}",
+                         daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        # Newest first
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.id, reverse=True)
+
+    def running(self):
+        return [job for job in self.jobs() if job.running]
+
+    def clear_finished(self):
+        with self._lock:
+            self._jobs = {i: job for i, job in self._jobs.items() if job.running}
+
+    def _forget_old(self):
+        finished = sorted((job for job in self._jobs.values() if not job.running), key=lambda j: j.id)
+        for job in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job.id]
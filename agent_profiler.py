@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+
+# Opt-in profiling of an agent run: RunRecorder(..., profile_dir=DIR) attaches a
+# RunProfiler, and only then does any of this run. Pipelines tag the threads
+# working on a stage, a sampling thread records every thread's Python stack each
+# SAMPLE_INTERVAL, and tracemalloc snapshots bracket each stage.
+#
+#   DIR/<run id>/agent2-large.download.collapsed   "frame;frame;frame count" lines,
+#                                                  for flamegraph.pl or speedscope
+#   DIR/<run id>/agent2-large.download.alloc.txt   top allocations while the stage ran
+#   DIR/<run id>/run.collapsed                     every thread, rooted at its name
+#   DIR/<run id>/summary.txt                       samples and hottest functions per stage
+
+SAMPLE_INTERVAL = 0.005
+# Reports group by line, so one frame is enough; every extra frame makes
+# allocation-heavy pure-Python code (already several times slower under
+# tracemalloc) slower still. Stages in C (PIL, hashlib, I/O) barely notice.
+TRACEMALLOC_FRAMES = 1
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 15
+
+# Profiled runs can overlap (background jobs); tracemalloc is process-wide, so
+# the profilers that started it share it and the last one to finish stops it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+def acquire_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            return False  # someone else's tracing (python -X tracemalloc); leave it alone
+        if _tracemalloc_users == 0:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+        return True
+
+def release_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class RunProfiler:
+    def __init__(self, directory):
+        self.directory = directory
+        self.stacks = defaultdict(Counter)
+        self.samples = 0
+        self._labels = {}          # thread id → "pipeline.stage" it is working on
+        self._snapshots = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._owns_tracemalloc = False
+        self._ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._owns_tracemalloc = acquire_tracemalloc()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        for label in list(self._snapshots):
+            self.stage_ended(label)
+        if self._owns_tracemalloc:
+            self._owns_tracemalloc = False
+            release_tracemalloc()
+        self.write()
+
+    def wrap(self, label, func):
+        # Samples taken while func runs on this thread are counted for label
+        def profiled(*args):
+            ident = threading.get_ident()
+            previous = self._labels.get(ident)
+            self._labels[ident] = label
+            try:
+                return func(*args)
+            finally:
+                if previous is None:
+                    self._labels.pop(ident, None)
+                else:
+                    self._labels[ident] = previous
+        return profiled
+
+    def stage_started(self, label):
+        if tracemalloc.is_tracing():
+            self._snapshots[label] = tracemalloc.take_snapshot().filter_traces(self._ignore)
+
+    def stage_ended(self, label):
+        start = self._snapshots.pop(label, None)
+        if start is None or not tracemalloc.is_tracing():
+            return
+        end = tracemalloc.take_snapshot().filter_traces(self._ignore)
+        lines = [f"Top {TOP_ALLOCATIONS} allocation changes during {label} (size, count, location)"]
+        for stat in end.compare_to(start, "lineno")[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        with open(os.path.join(self.directory, f"{label}.alloc.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            labels = dict(self._labels)
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = collapse(frame)
+                label = labels.get(ident)
+                if label:
+                    self.stacks[label][stack] += 1
+                self.stacks["run"][f"{names.get(ident, ident)};{stack}"] += 1
+            self.samples += 1
+
+    def write(self):
+        summary = [f"{self.samples} samples every {SAMPLE_INTERVAL * 1000:g} ms", ""]
+        for label, stacks in sorted(self.stacks.items()):
+            with open(os.path.join(self.directory, f"{label}.collapsed"), "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            if label == "run":
+                continue
+            leaves = Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(stacks.values())
+            summary.append(f"{label}: {total} samples (≈{total * SAMPLE_INTERVAL:.1f} thread-seconds)")
+            for name, count in leaves.most_common(TOP_FUNCTIONS):
+                summary.append(f"  {count / total:6.1%}  {name}")
+            summary.append("")
+        with open(os.path.join(self.directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(summary))
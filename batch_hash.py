@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import functools
+import numpy as np
+
+# Perceptual hashes for a whole stack of images per call. Input is an (n, 32, 32)
+# array of grayscale thumbnails (gray_array / load_gray make them); aHash, dHash
+# and pHash are computed together with array ops, the shrinking and the pHash DCT
+# as batched matrix products, and each comes back as an (n,) uint64 array whose
+# bits follow imagehash's order. Given the same thumbnail, format(h, "016x") equals
+# str(imagehash.average_hash / dhash / phash(...)), short of a perfectly flat image,
+# whose pHash is decided by rounding noise in either; `python batch_hash.py --check
+# [folder]` verifies that against imagehash.
+#
+#   stack = np.stack([load_gray(p) for p in paths])
+#   hashes = hash_batch(stack)            # {"ahash": uint64[n], "dhash": ..., "phash": ...}
+
+INPUT_SIZE = 32
+HASH_SIZE = 8
+HASH_KINDS = ("ahash", "dhash", "phash")
+PRECISION_BITS = 22       # Pillow's fixed-point resampling precision for 8-bit images
+LANCZOS_SUPPORT = 3.0
+
+@functools.lru_cache(maxsize=None)
+def lanczos_matrix(out_size, in_size):
+    # Pillow's LANCZOS weights for shrinking in_size → out_size pixels, rounded to its
+    # fixed point the way it does for 8-bit images, so results match Image.resize exactly
+    scale = in_size / out_size
+    support = LANCZOS_SUPPORT * max(scale, 1.0)
+    m = np.zeros((out_size, in_size), dtype=np.int64)
+    for i in range(out_size):
+        center = (i + 0.5) * scale
+        first, last = max(int(center - support + 0.5), 0), min(int(center + support + 0.5), in_size)
+        x = (np.arange(first, last) - center + 0.5) / max(scale, 1.0)
+        w = np.where(np.abs(x) < LANCZOS_SUPPORT, np.sinc(x) * np.sinc(x / LANCZOS_SUPPORT), 0.0)
+        w = w / w.sum() * (1 << PRECISION_BITS)
+        m[i, first:last] = np.where(w < 0, w - 0.5, w + 0.5).astype(np.int64)
+    return m
+
+@functools.lru_cache(maxsize=None)
+def dct_matrix(size=INPUT_SIZE, keep=HASH_SIZE):
+    # First `keep` rows of the unnormalised DCT-II (scipy's default, which imagehash uses)
+    k = np.arange(keep)[:, None]
+    n = np.arange(size)[None, :]
+    return 2 * np.cos(np.pi * k * (2 * n + 1) / (2 * size))
+
+def resize(stack, height, width):
+    # (n, H, W) uint8 → (n, height, width) uint8 as two integer matrix products,
+    # rows first and rounded in between as Pillow does
+    half = 1 << (PRECISION_BITS - 1)
+    rows = np.clip((stack.astype(np.int64) @ lanczos_matrix(width, stack.shape[2]).T + half) >> PRECISION_BITS, 0, 255)
+    return np.clip((lanczos_matrix(height, stack.shape[1]) @ rows + half) >> PRECISION_BITS, 0, 255)
+
+def pack(bits):
+    # (n, 8, 8) bools → (n,) uint64, first pixel in the most significant bit
+    flat = bits.reshape(bits.shape[0], bits.shape[1] * bits.shape[2])
+    return np.packbits(flat, axis=1).view(">u8").ravel().astype(np.uint64)
+
+def hash_batch(stack, kinds=HASH_KINDS):
+    stack = np.asarray(stack, dtype=np.uint8)
+    if stack.ndim != 3 or stack.shape[1:] != (INPUT_SIZE, INPUT_SIZE):
+        raise ValueError(f"expected an (n, {INPUT_SIZE}, {INPUT_SIZE}) stack, got {stack.shape}")
+    if not len(stack):
+        return {kind: np.zeros(0, dtype=np.uint64) for kind in kinds}
+    out = {}
+    if "ahash" in kinds:
+        small = resize(stack, HASH_SIZE, HASH_SIZE)
+        out["ahash"] = pack(small > small.mean(axis=(1, 2), keepdims=True))
+    if "dhash" in kinds:
+        small = resize(stack, HASH_SIZE, HASH_SIZE + 1)
+        out["dhash"] = pack(small[:, :, 1:] > small[:, :, :-1])
+    if "phash" in kinds:
+        dct = dct_matrix()
+        low = dct @ stack.astype(np.float64) @ dct.T
+        out["phash"] = pack(low > np.median(low.reshape(len(low), -1), axis=1)[:, None, None])
+    return out
+
+def hamming(hashes, h):
+    # Bits differing between each of hashes and h
+    x = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(h))
+    return np.unpackbits(x.view(np.uint8).reshape(len(x), 8), axis=1).sum(axis=1)
+
+def gray_array(img, size=INPUT_SIZE):
+    # An already opened PIL image → (size, size) uint8
+    from PIL import Image
+    return np.asarray(img.convert("L").resize((size, size), Image.BOX), dtype=np.uint8)
+
+def load_gray(path, size=INPUT_SIZE):
+    # draft() lets the JPEG decoder skip straight to 1/2, 1/4 or 1/8 scale
+    from PIL import Image
+    with Image.open(path) as img:
+        img.draft("L", (size * 2, size * 2))
+        return gray_array(img, size)
+
+def imagehash_parity(stack):
+    # {kind: bits differing from imagehash per image} for the same (n, 32, 32) thumbnails,
+    # plus "packing": bit differences when both pack the same random bit matrices
+    import imagehash
+    from PIL import Image
+    stack = np.asarray(stack, dtype=np.uint8)
+    ours = hash_batch(stack)
+    reference = {"ahash": imagehash.average_hash, "dhash": imagehash.dhash, "phash": imagehash.phash}
+    out = {kind: np.array([bin(int(str(reference[kind](Image.fromarray(gray))), 16) ^ int(h)).count("1")
+                           for gray, h in zip(stack, ours[kind])], dtype=int)
+           for kind in HASH_KINDS}
+    bits = np.random.default_rng(0).random((64, HASH_SIZE, HASH_SIZE)) > 0.5
+    out["packing"] = np.array([bin(int(str(imagehash.ImageHash(b)), 16) ^ int(h)).count("1")
+                               for b, h in zip(bits, pack(bits))], dtype=int)
+    return out
+
+def check_parity(grays):
+    ok = True
+    for kind, diffs in imagehash_parity(grays).items():
+        same = int((diffs == 0).sum())
+        ok = ok and same == len(diffs)
+        print(f"{'✅' if same == len(diffs) else '❌'} {kind}: {same}/{len(diffs)} identical to imagehash"
+              + (f", up to {diffs.max()} bits off" if same < len(diffs) else ""))
+    return ok
+
+def synthetic_grays(count=200, seed=0):
+    # Smooth random thumbnails for --check when the folder has no images
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    return np.stack([gray_array(Image.fromarray((rng.random((6, 8)) * 255).astype(np.uint8))
+                                .resize((640, 480), Image.BICUBIC)) for _ in range(count)])
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--check"]
+    folder = args[0] if args else "."
+    paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+             if os.path.splitext(f)[1].lower() in {".jpg", ".jpeg", ".png"}]
+    start = time.perf_counter()
+    grays = np.stack([load_gray(p) for p in paths]) if paths else np.zeros((0, INPUT_SIZE, INPUT_SIZE))
+    decoded = time.perf_counter()
+    hashes = hash_batch(grays)
+    done = time.perf_counter()
+    print(f"{len(paths)} images: decode {decoded - start:.3f}s, hash {done - decoded:.4f}s "
+          f"({len(paths) / max(done - start, 1e-9):.0f} images/s)")
+    if "--check" in sys.argv:
+        sys.exit(0 if check_parity(grays if paths else synthetic_grays()) else 1)
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import contextlib
+import tracemalloc
+
+from fake_drive import FakeDrive
+from agent_events import RunRecorder
+from drive_records import FileRecord, list_records, RECORD_FIELDS
+
+# Scale benchmarks for the Drive side of agent1/agent2, run against FakeDrive so
+# they need no account and are repeatable. Each scenario runs the agents' own
+# functions on a synthetic corpus and reports items/s; results are compared with
+# a saved baseline and the run fails when a scenario got slower than the tolerance.
+#
+#   python bench_drive.py                        # 10k and 100k files
+#   python bench_drive.py --sizes 1000000        # 1M (a few minutes, ~1 GB RAM)
+#   python bench_drive.py --save-baseline        # accept the current numbers
+#
+# list/dedup/memory scale with the corpus; download/compress/upload/delete use a sample of it.
+
+SIZES = [10_000, 100_000]
+SAMPLE = 200
+COMPRESS_SAMPLE = 40
+BASELINE_PATH = "bench_drive_baseline.json"
+RESULTS_PATH = "bench_drive_results.json"
+TOLERANCE = 0.2   # fail when items/s drops by more than this fraction
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def metrics(items, seconds, drive=None, **extra):
+    out = {"items": items, "seconds": round(seconds, 4), "items_per_s": round(items / seconds, 1) if seconds else 0.0}
+    if drive is not None:
+        out["requests"] = sum(drive.requests.values())
+    out.update(extra)
+    return out
+
+@contextlib.contextmanager
+def quiet():
+    # Agent functions log per file; keep that out of the benchmark output
+    with RunRecorder("bench", summary_path=None):
+        yield
+
+@contextlib.contextmanager
+def working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def bench_list(drive, folder):
+    query = f"'{folder}' in parents and mimeType contains 'image/' and trashed = false"
+    drive.requests.clear()
+    files, seconds = timed(lambda: list(list_records(drive, query, "id, name, mimeType, size, md5Checksum")))
+    return files, metrics(len(files), seconds, drive)
+
+def bench_memory(drive, folder):
+    # Raw API dicts vs FileRecords for the same listing, measured with tracemalloc
+    pages, token = [], None
+    while True:
+        response = drive.files().list(q=f"'{folder}' in parents", pageSize=1000, pageToken=token,
+                                      fields=f"nextPageToken, files({RECORD_FIELDS})").execute()
+        pages.append(response)
+        token = response.get("nextPageToken")
+        if not token:
+            break
+    # Copied so both sides are measured as fresh allocations
+    payload = json.dumps([p["files"] for p in pages])
+    del pages
+
+    tracemalloc.start()
+    raw = [f for page in json.loads(payload) for f in page]
+    raw_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del raw
+    tracemalloc.start()
+    parsed = json.loads(payload)
+    start = time.perf_counter()
+    records = [FileRecord.from_api(f) for page in parsed for f in page]
+    seconds = time.perf_counter() - start
+    del parsed  # what stays alive is the records and the strings they kept
+    record_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return metrics(len(records), seconds, dict_bytes_per_file=round(raw_bytes / max(len(records), 1)),
+                   record_bytes_per_file=round(record_bytes / max(len(records), 1)),
+                   reduction=round(1 - record_bytes / max(raw_bytes, 1), 3))
+
+def bench_dedup(files):
+    from agent1_duplicates import find_duplicates
+    duplicates, seconds = timed(lambda: find_duplicates(files))
+    return duplicates, metrics(len(files), seconds, duplicates=len(duplicates))
+
+def bench_download(drive, files, target):
+    from agent2_heavy_files import download_file
+    drive.requests.clear()
+    start = time.perf_counter()
+    for f in files:
+        download_file(drive, f.id, f.name, target, f.md5_hex)
+    size = sum(f.size for f in files)
+    return metrics(len(files), time.perf_counter() - start, drive, bytes=size,
+                   mb_per_s=round(size / max(time.perf_counter() - start, 1e-9) / 1e6, 1))
+
+def bench_video_selection(drive):
+    # shrink/replace only transcode what this selects; without widths in the listing
+    # every video would be copied unchanged
+    from agent2_heavy_files import find_large_files_in_drive
+    from drive_transcode import should_transcode, TRANSCODE_WIDTH
+    files, seconds = timed(lambda: list(find_large_files_in_drive(drive)))
+    selected = sum(should_transcode(f) for f in files)
+    expected = sum(f.mime_type.startswith("video/") and (drive._files[f.id].width or 0) > TRANSCODE_WIDTH
+                   for f in files)
+    return metrics(len(files), seconds, drive, selected=selected, expected=expected)
+
+def make_images(folder, count, seed=0):
+    from PIL import Image
+    rand = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for i in range(count):
+        width, height = rand.choice([(4032, 3024), (3024, 4032), (1600, 1200)])
+        image = Image.effect_noise((width // 4, height // 4), 40).convert("RGB").resize((width, height))
+        name = f"bench_{i:04d}.jpg"
+        image.save(os.path.join(folder, name), "JPEG", quality=92)
+        names.append(name)
+    return names
+
+def bench_compress(workdir, count):
+    import agent2_heavy_files as agent2
+    with working_dir(workdir):
+        names = make_images(agent2.PROCESSED_DIR, count)
+        usb_dir = os.path.join(workdir, "usb")
+        os.makedirs(usb_dir, exist_ok=True)
+        agent2.HASHES.clear()
+        start = time.perf_counter()
+        outcomes = [agent2.process_image(name, usb_dir) for name in names]
+        return metrics(len(names), time.perf_counter() - start, resized=outcomes.count("resized"))
+
+def bench_upload(drive, workdir, folder):
+    import agent2_heavy_files as agent2
+    with working_dir(workdir):
+        drive.requests.clear()
+        start = time.perf_counter()
+        jobs = agent2.list_upload_jobs(drive, folder)
+        for name, existing_id in jobs:
+            agent2.upload_file(drive, folder, name, existing_id)
+        return metrics(len(jobs), time.perf_counter() - start, drive)
+
+def bench_delete(drive, duplicates):
+    from agent1_duplicates import delete_file
+    drive.requests.clear()
+    start = time.perf_counter()
+    for f in duplicates:
+        delete_file(drive, f)
+    return metrics(len(duplicates), time.perf_counter() - start, drive)
+
+def run_scale(size, args):
+    results = {}
+    drive = FakeDrive(latency=args.latency, bandwidth=args.bandwidth, error_rate=args.error_rate, seed=size)
+    folder = drive.add_folder("bench")
+    _, seconds = timed(lambda: drive.populate(size, parent=folder, duplicate_ratio=0.1, seed=size))
+    drive.precompute_checksums()  # the real API has them stored; keep hashing out of the list timings
+    print(f"\n📦 {size:,} files (corpus built in {seconds:.1f}s)")
+
+    def run(name, func):
+        try:
+            with quiet():
+                results[f"{name}@{size}"] = func()
+            m = results[f"{name}@{size}"]
+            print(f"  {name:<9} {m['items']:>9,} items  {m['seconds']:>8.3f}s  {m['items_per_s']:>12,.1f} items/s"
+                  + (f"  {m['dict_bytes_per_file']} → {m['record_bytes_per_file']} B/file ({m['reduction']:.0%} less)"
+                     if "reduction" in m else ""))
+        except ImportError as e:
+            print(f"  {name:<9} skipped ({e})")
+
+    files = []
+    def listing():
+        found, m = bench_list(drive, folder)
+        files.extend(found)
+        return m
+    run("list", listing)
+    duplicates = []
+    def dedup():
+        duplicates_found, m = bench_dedup(files)
+        duplicates.extend(duplicates_found)
+        return m
+    run("dedup", dedup)
+    run("memory", lambda: bench_memory(drive, folder))
+    run("videos", lambda: bench_video_selection(drive))
+
+    sample = random.Random(size).sample(files, min(args.sample, len(files)))
+    with tempfile.TemporaryDirectory() as workdir:
+        run("download", lambda: bench_download(drive, sample, workdir))
+        if size == args.sizes[0]:
+            # Local CPU work: independent of the corpus size, so measured once
+            run("compress", lambda: bench_compress(workdir, args.compress_sample))
+            run("upload", lambda: bench_upload(drive, workdir, folder))
+    run("delete", lambda: bench_delete(drive, duplicates[:args.sample]))
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, m in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base or not base.get("items_per_s"):
+            continue
+        change = m["items_per_s"] / base["items_per_s"] - 1
+        m["vs_baseline"] = round(change, 3)
+        if change < -tolerance:
+            regressions.append(f"{key}: {m['items_per_s']:,.1f} items/s vs baseline {base['items_per_s']:,.1f} "
+                               f"({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent1/agent2 Drive work against FakeDrive.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--sample", type=int, default=SAMPLE, help="files to download / delete per size")
+    parser.add_argument("--compress-sample", type=int, default=COMPRESS_SAMPLE)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--bandwidth", type=float, help="bytes/s for each media transfer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls failing with 429/403/5xx")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results.update(run_scale(size, args))
+
+    report = {"created": time.time(), "python": platform.python_version(), "machine": platform.node(),
+              "settings": {"latency": args.latency, "bandwidth": args.bandwidth, "error_rate": args.error_rate},
+              "results": results}
+    regressions = [f"{key}: {m['selected']} videos selected for transcoding, {m['expected']} are wider than that"
+                   for key, m in results.items() if "expected" in m and m["selected"] != m["expected"]]
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions += compare(results, json.load(f), args.tolerance)
+    with open(args.save_baseline and args.baseline or args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    for regression in regressions:
+        print(f"❌ Regression: {regression}")
+    if args.save_baseline:
+        print(f"💾 Baseline saved to {args.baseline}")
+    elif not regressions:
+        print("✅ No regressions." if os.path.exists(args.baseline) else f"ℹ No baseline yet ({args.baseline}).")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
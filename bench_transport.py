@@ -0,0 +1,198 @@
+import os
+import sys
+import ssl
+import gzip
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httplib2
+
+import drive_transport
+from drive_transport import DriveHttp
+
+# Micro-benchmark of the Drive HTTP layer against a local stand-in for the API:
+# a threaded HTTP/1.1 server answering files.list-shaped pages (gzipped when the
+# client asks the way Google requires) and ranged alt=media reads. Each scenario
+# runs THREADS workers making REQUESTS calls each and reports latency, requests/s,
+# bytes on the wire and how many connections were opened or TLS-resumed.
+#
+#   python bench_transport.py                      # plain HTTP
+#   python bench_transport.py --tls --threads 8    # self-signed TLS (needs the openssl CLI)
+#
+#   fresh      a new httplib2.Http per request: new TCP (+ full TLS) every call. With
+#              --tls it only loads the one test certificate, not the CA bundle a real
+#              connection loads, so it understates the cost of a cold connection.
+#   resume     a new DriveHttp per request: new TCP, TLS session resumed
+#   keepalive  one DriveHttp per thread, identity encoding
+#   gzip       one DriveHttp per thread, as the agents use it
+
+THREADS = 4
+REQUESTS = 200
+PAGE_FILES = 1000
+MEDIA_BYTES = 256 * 1024
+RESULTS_PATH = "bench_transport_results.json"
+SCENARIOS = ("fresh", "resume", "keepalive", "gzip")
+
+def list_page(count):
+    files = [{"id": f"file{i:07d}", "name": f"IMG_{i:05d}.jpg", "mimeType": "image/jpeg", "size": str(1_000_000 + i),
+              "md5Checksum": f"{i:032x}", "parents": ["folder0001"]} for i in range(count)]
+    return json.dumps({"nextPageToken": "page2", "files": files}).encode()
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive unless the client closes
+    page = b""
+    page_gzip = b""
+    media = b""
+    lock = threading.Lock()
+    wire_bytes = 0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        with StandIn.lock:
+            StandIn.connections += 1
+
+    def do_GET(self):
+        if "alt=media" in self.path:
+            start, end = 0, len(self.media) - 1
+            if self.headers.get("range", "").startswith("bytes="):
+                first, _, last = self.headers["range"][6:].partition("-")
+                start, end = int(first), min(int(last or end), end)
+            self.reply(206 if self.headers.get("range") else 200, self.media[start:end + 1], "application/octet-stream")
+        elif "gzip" in self.headers.get("accept-encoding", "") and "gzip" in self.headers.get("user-agent", ""):
+            self.reply(200, self.page_gzip, "application/json", {"content-encoding": "gzip"})
+        else:
+            self.reply(200, self.page, "application/json")
+
+    def reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with StandIn.lock:
+            StandIn.wire_bytes += len(body)
+
+    def log_message(self, *args):
+        pass
+
+def self_signed_cert(folder):
+    if not shutil.which("openssl"):
+        raise SystemExit("❌ --tls needs the openssl command line tool")
+    cert, key = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=DNS:localhost", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+def start_server(tls_files=None):
+    server = ThreadingHTTPServer(("localhost", 0), StandIn)
+    server.daemon_threads = True
+    # Inherited by accepted sockets. Headers and body (and a TLS 1.3 handshake and its
+    # session tickets) go out as separate writes; with Nagle on, the second waits for
+    # the client's delayed ACK, ~40 ms that a real API server does not add
+    server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if tls_files:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*tls_files)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, name="stand-in", daemon=True).start()
+    return server
+
+def run_scenario(name, base, args, ca_certs=None):
+    make_http = {"fresh": lambda: httplib2.Http(ca_certs=ca_certs), "resume": DriveHttp}.get(name)
+    headers = {"accept-encoding": "identity"} if name == "keepalive" else {}
+    uris = [f"{base}/drive/v3/files?pageSize={args.page_files}",
+            f"{base}/drive/v3/files/file0000001?alt=media"]
+    latencies = [[] for _ in range(args.threads)]
+    failures = []
+
+    def worker(index):
+        http = None if make_http else DriveHttp()
+        try:
+            for i in range(args.requests):
+                uri = uris[1] if args.media_every and i % args.media_every == 0 else uris[0]
+                start = time.perf_counter()
+                resp, content = (make_http() if make_http else http).request(uri, headers=dict(headers))
+                latencies[index].append(time.perf_counter() - start)
+                if resp.status not in (200, 206) or not content:
+                    raise RuntimeError(f"{uri}: HTTP {resp.status}")
+        except Exception as e:
+            failures.append(e)
+
+    StandIn.wire_bytes = StandIn.connections = 0
+    drive_transport.reset_stats()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - start
+    if failures:
+        raise failures[0]
+
+    samples = sorted(s for per_thread in latencies for s in per_thread)
+    transport = drive_transport.stats()
+    return {"requests": len(samples), "seconds": round(seconds, 4),
+            "requests_per_s": round(len(samples) / seconds, 1),
+            "p50_ms": round(statistics.median(samples) * 1000, 3),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+            "wire_bytes_per_request": round(StandIn.wire_bytes / len(samples)),
+            "connections": StandIn.connections, "tls_resumed": transport["resumed"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Drive HTTP transport against a local stand-in.")
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="per thread")
+    parser.add_argument("--page-files", type=int, default=PAGE_FILES, help="files in each list page")
+    parser.add_argument("--media-every", type=int, default=0, help="make every Nth request a ranged media read")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a throwaway self-signed certificate")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    StandIn.page = list_page(args.page_files)
+    StandIn.page_gzip = gzip.compress(StandIn.page, 6)
+    StandIn.media = os.urandom(MEDIA_BYTES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tls_files = self_signed_cert(tmp) if args.tls else None
+        if tls_files:
+            drive_transport.use_ca_certs(tls_files[0])
+        server = start_server(tls_files)
+        base = f"{'https' if tls_files else 'http'}://localhost:{server.server_address[1]}"
+        results = {}
+        try:
+            for name in args.scenarios:
+                results[name] = m = run_scenario(name, base, args, tls_files and tls_files[0])
+                resumed = f", {m['tls_resumed']} TLS resumed" if tls_files else ""
+                print(f"{name:<10} {m['requests_per_s']:>9.1f} req/s · p50 {m['p50_ms']:.2f} ms · "
+                      f"p95 {m['p95_ms']:.2f} ms · {m['wire_bytes_per_request'] / 1024:.1f} KiB/request · "
+                      f"{m['connections']} connections{resumed}")
+        finally:
+            server.shutdown()
+            if tls_files:
+                drive_transport.use_ca_certs()
+
+    report = {"created": time.time(), "python": platform.python_version(), "machine": platform.node(),
+              "settings": {"threads": args.threads, "requests": args.requests, "page_files": args.page_files,
+                           "media_every": args.media_every, "tls": args.tls},
+              "results": results}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
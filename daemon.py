@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+
+from job_journal import atomic_write
+from drive_executor import execute
+from adb_devices import list_devices, list_remote_tree, listing_signature
+
+# Headless runner: no window, no clicks. Polls every few seconds and starts
+#   agent1 on its schedule,
+#   agent2 when the USB folder appears (or on its schedule while it is mounted),
+#   agent3 when a known phone is plugged in (or on its schedule while connected).
+# Runs are incremental: Drive agents first ask the Drive changes feed whether
+# anything relevant happened since their last successful run, and a phone is only
+# backed up again when its WhatsApp file listing changed. A poll with nothing
+# new costs one changes.list call or one adb shell listing.
+#
+#   python daemon.py --usb-root E:\ --serial R58M12ABCDE --agent1-hours 24
+#   python daemon.py --once --serial R58M12ABCDE   # for cron / Task Scheduler: backs up the phone only
+
+STATE_PATH = "daemon_state.json"
+POLL_SECONDS = 15
+DB_PATH = "/sdcard/Android/media/com.whatsapp/WhatsApp/Backups/Databases"
+MEDIA_PATH = "/sdcard/Android/media/com.whatsapp/WhatsApp/Media"
+CHANGE_FIELDS = "nextPageToken,newStartPageToken,changes(removed,file(mimeType,size,trashed,parents))"
+
+def default_adb_path():
+    bundled = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'adb', 'adb.exe')
+    return bundled if os.path.exists(bundled) else (shutil.which("adb") or "adb")
+
+def load_state(path=STATE_PATH):
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except ValueError:
+            pass
+    return {"drive": {}, "devices": {}}
+
+def save_state(state, path=STATE_PATH):
+    atomic_write(path, json.dumps(state, indent=2), mode="w")
+
+def start_page_token(service):
+    return execute(service.changes().getStartPageToken())["startPageToken"]
+
+def drive_has_changes(service, page_token, relevant):
+    # Walks the changes feed from page_token; stops at the first change that matters
+    while page_token:
+        response = execute(service.changes().list(pageToken=page_token, spaces="drive", pageSize=1000,
+                                                  fields=CHANGE_FIELDS))
+        for change in response.get("changes", []):
+            f = change.get("file") or {}
+            if not change.get("removed") and not f.get("trashed") and relevant(f):
+                return True
+        if "newStartPageToken" in response:
+            return False
+        page_token = response.get("nextPageToken")
+    return False
+
+def is_image(f):
+    return f.get("mimeType", "").startswith("image/")
+
+def is_image_or_large(f):
+    # agent2's own uploads (compressed images into UPLOAD_FOLDER_ID) are not news to
+    # it; counting them would make every run trigger the next one
+    from agent2_heavy_files import LARGE_FILE_BYTES, UPLOAD_FOLDER_ID
+    if UPLOAD_FOLDER_ID in f.get("parents", []):
+        return False
+    return is_image(f) or int(f.get("size", 0)) > LARGE_FILE_BYTES
+
+RELEVANT_CHANGES = {"agent1": is_image, "agent2": is_image_or_large}
+
+class Daemon:
+    def __init__(self, args, state):
+        self.args = args
+        self.state = state
+        self.connected = set()
+        self.usb_present = False
+
+    def save(self):
+        save_state(self.state, self.args.state)
+
+    def due(self, entry, hours):
+        return hours is not None and time.time() - entry.get("last_check", 0) >= hours * 3600
+
+    def on_event(self, event):
+        if event["type"] == "log":
+            prefix = f"[{event['agent']}:{event['device']}]" if event.get("device") else f"[{event['agent']}]"
+            print(f"{time.strftime('%H:%M:%S')} {prefix} {event['message']}", flush=True)
+        elif event["type"] == "run_end":
+            self.last_ok = event["ok"]
+
+    def run(self, agent_function, *args, **kwargs):
+        self.last_ok = False
+        agent_function(*args, on_event=self.on_event, profile_dir=self.args.profile, **kwargs)
+        return self.last_ok
+
+    def run_drive_agent(self, agent):
+        from drive_auth import get_drive_service
+        entry = self.state["drive"].setdefault(agent, {})
+        service = get_drive_service()
+        token = entry.get("page_token")
+        entry["last_check"] = time.time()
+        if token and not self.args.force and not drive_has_changes(service, token, RELEVANT_CHANGES[agent]):
+            print(f"💤 {agent}: nothing new on Drive since the last run.", flush=True)
+            self.save()
+            return
+
+        # Taken before the run: anything changing while it runs is seen next time
+        new_token = start_page_token(service)
+        if agent == "agent1":
+            from agent1_duplicates import run_agent1
+            ok = self.run(run_agent1)
+        else:
+            from agent2_heavy_files import run_agent2
+            ok = self.run(run_agent2, self.args.usb_root, video_mode=self.args.video_mode)
+        if ok:
+            entry["page_token"] = new_token
+            entry["last_run"] = time.time()
+        self.save()
+
+    def run_device(self, serial):
+        entry = self.state["devices"].setdefault(serial, {})
+        entry["last_check"] = time.time()
+        files = []
+        for remote_dir in (self.args.db_path, self.args.media_path):
+            files.extend(list_remote_tree(self.args.adb, remote_dir, serial))
+        signature = listing_signature(files) if files else None
+        if signature and signature == entry.get("signature") and not self.args.force:
+            print(f"💤 agent3: {serial} has no new WhatsApp files since the last backup.", flush=True)
+            self.save()
+            return
+
+        from agent3_whatsapp_backup import pull_whatsapp_backup
+        ok = self.run(pull_whatsapp_backup, self.args.adb, self.args.db_path, self.args.media_path,
+                      deadline_minutes=self.args.video_deadline, serial=serial)
+        if ok:
+            entry["signature"] = signature
+            entry["last_run"] = time.time()
+        self.save()
+
+    def tick(self, once=False):
+        args = self.args
+        # Each agent only runs when configured: agent1 by --agent1-hours, agent2 by
+        # --usb-root, agent3 by --serial; --once runs the configured ones right away
+        if args.agent1_hours is not None:
+            if once or self.due(self.state["drive"].get("agent1", {}), args.agent1_hours):
+                self.run_drive_agent("agent1")
+
+        if args.usb_root:
+            present = os.path.isdir(args.usb_root)
+            appeared = present and not self.usb_present
+            self.usb_present = present
+            if present and (once or appeared or self.due(self.state["drive"].get("agent2", {}), args.agent2_hours)):
+                self.run_drive_agent("agent2")
+
+        if args.serial:
+            connected = set(list_devices(args.adb))
+            appeared = connected - self.connected
+            self.connected = connected
+            for serial in args.serial:
+                if serial not in connected:
+                    continue
+                entry = self.state["devices"].get(serial, {})
+                if once or serial in appeared or self.due(entry, args.agent3_hours):
+                    self.run_device(serial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the cleanup agents without the UI.")
+    parser.add_argument("--usb-root", help="run agent2 into this folder whenever it is mounted")
+    parser.add_argument("--serial", action="append", default=[], help="back up this phone when connected (repeatable)")
+    parser.add_argument("--agent1-hours", type=float, help="run agent1 every N hours (and on --once)")
+    parser.add_argument("--agent2-hours", type=float, help="re-run agent2 every N hours while the USB folder is mounted")
+    parser.add_argument("--agent3-hours", type=float, help="re-run agent3 every N hours while a phone is connected")
+    parser.add_argument("--adb", default=default_adb_path())
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--media-path", default=MEDIA_PATH)
+    parser.add_argument("--video-deadline", type=int, help="minutes allowed for video encoding")
+    parser.add_argument("--video-mode", choices=["copy", "shrink", "replace"], default="copy",
+                        help="agent2: keep wide Drive videos as they are, transcode them to USB, "
+                             "or also replace the originals with the transcodes")
+    parser.add_argument("--profile", metavar="DIR", help="profile every run: flamegraph and allocation reports per stage")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS)
+    parser.add_argument("--once", action="store_true", help="check every configured trigger once and exit")
+    parser.add_argument("--force", action="store_true", help="ignore incremental state and run anyway")
+    args = parser.parse_args()
+
+    daemon = Daemon(args, load_state(args.state))
+    if args.once:
+        daemon.tick(once=True)
+        return 0
+
+    print(f"👀 Watching (poll every {args.poll:g}s). Ctrl+C to stop.", flush=True)
+    try:
+        while True:
+            try:
+                daemon.tick()
+            except Exception as e:
+                print(f"❌ Error: {e}", flush=True)
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
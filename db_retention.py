@@ -0,0 +1,133 @@
+import os
+import re
+import subprocess
+from datetime import datetime, timedelta
+
+from adb_devices import adb_command
+from agent_events import log
+
+BACKUP_PATTERN = re.compile(r"\.crypt\d+$")
+
+class RetentionPolicy:
+    # Each rule keeps files on its own; a file is pulled if any rule keeps it.
+    # With no rules set every backup is kept.
+    def __init__(self, keep_last=None, max_age_days=None, daily=0, weekly=0, monthly=0, extensions=None):
+        self.keep_last = keep_last
+        self.max_age_days = max_age_days
+        self.daily = daily
+        self.weekly = weekly
+        self.monthly = monthly
+        self.extensions = tuple(e.lower() for e in extensions) if extensions else None
+
+    def is_backup(self, name):
+        if self.extensions:
+            return name.lower().endswith(self.extensions)
+        return bool(BACKUP_PATTERN.search(name))
+
+    def has_rules(self):
+        return bool(self.keep_last or self.max_age_days or self.daily or self.weekly or self.monthly)
+
+    def select(self, files, now=None):
+        # files: [{"name", "size", "mtime"}] → names to keep
+        now = now or datetime.now()
+        backups = sorted((f for f in files if self.is_backup(f["name"])), key=lambda f: -f["mtime"])
+        if not self.has_rules():
+            return {f["name"] for f in backups}
+
+        keep = set()
+        if self.keep_last:
+            keep.update(f["name"] for f in backups[:self.keep_last])
+        if self.max_age_days:
+            cutoff = (now - timedelta(days=self.max_age_days)).timestamp()
+            keep.update(f["name"] for f in backups if f["mtime"] >= cutoff)
+
+        rotations = [
+            (self.daily, lambda d: d.strftime("%Y-%m-%d")),
+            (self.weekly, lambda d: "%d-W%02d" % d.isocalendar()[:2]),
+            (self.monthly, lambda d: d.strftime("%Y-%m")),
+        ]
+        for count, bucket_of in rotations:
+            if not count:
+                continue
+            seen = set()
+            for f in backups:  # newest first → newest file per bucket wins
+                bucket = bucket_of(datetime.fromtimestamp(f["mtime"]))
+                if bucket in seen:
+                    continue
+                seen.add(bucket)
+                keep.add(f["name"])
+                if len(seen) >= count:
+                    break
+        return keep
+
+DEFAULT_POLICY = RetentionPolicy(max_age_days=60)
+
+def list_device_files(adb_path, remote_dir, serial=None):
+    result = subprocess.run(
+        adb_command(adb_path, serial, "shell", f"stat -c '%n|%s|%Y' '{remote_dir}'/*"),
+        capture_output=True, text=True
+    )
+    files = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().rsplit("|", 2)
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            continue
+        files.append({"path": parts[0], "name": parts[0].rsplit("/", 1)[-1],
+                      "size": int(parts[1]), "mtime": int(parts[2])})
+    return files
+
+def prune_local(folder, policy):
+    files = [
+        {"name": f, "size": os.path.getsize(os.path.join(folder, f)), "mtime": os.path.getmtime(os.path.join(folder, f))}
+        for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))
+    ]
+    keep = policy.select(files)
+    for f in files:
+        if policy.is_backup(f["name"]) and f["name"] not in keep:
+            os.remove(os.path.join(folder, f["name"]))
+            log(f"❌ Removed old DB: {f['name']}")
+
+def pull_failed(name, result):
+    reason = (result.stderr or b"").decode(errors="replace").strip().splitlines()
+    log(f"⚠ Failed to pull DB {name}: {reason[-1] if reason else f'adb exit code {result.returncode}'}")
+
+def pull_databases(adb_path, db_path, backups_folder, policy=DEFAULT_POLICY, journal=None, serial=None):
+    # → {"pulled": files pulled now or before, "failed": [names], "skipped_bytes": old backups left on the device}
+    # Callers must not treat the backup as complete (or prune around it) while anything failed
+    files = list_device_files(adb_path, db_path, serial)
+    if not files:
+        # stat listing unavailable → fall back to pulling everything and pruning locally
+        if journal and journal.state("pull:Databases") == "pulled":
+            return {"pulled": 1, "failed": [], "skipped_bytes": 0}
+        result = subprocess.run(adb_command(adb_path, serial, "pull", db_path, os.path.dirname(backups_folder)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            # A partial pull is not pruned: what is missing is unknown
+            pull_failed(os.path.basename(db_path.rstrip("/")), result)
+            return {"pulled": 0, "failed": [os.path.basename(db_path.rstrip("/"))], "skipped_bytes": 0}
+        prune_local(backups_folder, policy)
+        if journal: journal.record("pull:Databases", "pulled")
+        return {"pulled": 1, "failed": [], "skipped_bytes": 0}
+
+    keep = policy.select(files)
+    pulled, skipped_bytes, failed = 0, 0, []
+    for f in files:
+        if policy.is_backup(f["name"]) and f["name"] not in keep:
+            skipped_bytes += f["size"]
+            log(f"⏭ Skipped old DB on device: {f['name']}")
+            continue
+        key = f"db:{f['name']}"
+        if journal and journal.state(key) == "pulled":
+            pulled += 1
+            continue
+        result = subprocess.run(adb_command(adb_path, serial, "pull", "-a", f["path"], os.path.join(backups_folder, f["name"])),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            pull_failed(f["name"], result)
+            failed.append(f["name"])
+            continue
+        pulled += 1
+        if journal: journal.record(key, "pulled", size=f["size"])
+    log(f"📦 Pulled {pulled} DB files, skipped {skipped_bytes / (1024 * 1024):.1f} MB of old backups."
+        + (f" ❌ {len(failed)} failed." if failed else ""))
+    return {"pulled": pulled, "failed": failed, "skipped_bytes": skipped_bytes}
@@ -0,0 +1,80 @@
+import os
+import threading
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+
+from job_journal import atomic_write
+from drive_transport import authorized_http
+from agent_events import log
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+CLIENT_SECRETS_PATH = "credentials.json"
+TOKEN_PATH = "token.json"
+
+_creds = None
+_creds_lock = threading.Lock()
+_local = threading.local()
+
+def save_credentials(creds, path=TOKEN_PATH):
+    atomic_write(path, creds.to_json(), mode="w")
+
+def load_credentials(path=TOKEN_PATH):
+    creds = None
+    if os.path.exists(path):
+        try:
+            creds = Credentials.from_authorized_user_file(path, SCOPES)
+        except ValueError:
+            creds = None
+
+    if creds and creds.valid:
+        return creds
+    if creds and creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            save_credentials(creds, path)
+            return creds
+        except Exception as e:
+            log(f"⚠ Saved Google login expired ({e}), signing in again...")
+
+    flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_PATH, SCOPES)
+    creds = flow.run_local_server(port=0, open_browser=True)
+    save_credentials(creds, path)
+    return creds
+
+def get_credentials():
+    global _creds
+    with _creds_lock:
+        if _creds is None or not _creds.valid:
+            _creds = load_credentials()
+        return _creds
+
+def build_drive_service(creds):
+    # Bundled (static) discovery document: no network round trip to build the client.
+    # The client talks through its own keep-alive DriveHttp (see drive_transport).
+    http = authorized_http(creds)
+    try:
+        return build("drive", "v3", http=http, static_discovery=True, cache_discovery=False)
+    except TypeError:  # google-api-python-client < 2.0
+        return build("drive", "v3", http=http, cache_discovery=False)
+
+def get_drive_service():
+    # Credentials are shared process-wide; each thread gets its own client because
+    # the underlying httplib2 connection must not be used from two threads at once.
+    creds = get_credentials()
+    service = getattr(_local, "service", None)
+    if service is None or getattr(_local, "creds", None) is not creds:
+        service = build_drive_service(creds)
+        _local.service = service
+        _local.creds = creds
+    return service
+
+def sign_out(path=TOKEN_PATH):
+    global _creds
+    with _creds_lock:
+        _creds = None
+    _local.__dict__.clear()
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,197 @@
+import ssl
+import json
+import time
+import random
+import socket
+import weakref
+import threading
+import http.client
+
+from agent_events import log
+
+# Every Drive API call from the agents goes through one DriveExecutor, which
+#   - retries rate-limit (429, 403 *RateLimitExceeded) and transient (5xx, 408,
+#     dropped connections) errors with exponential backoff and full jitter,
+#     honouring Retry-After, and gives up at once on anything else (404, 403 forbidden);
+#   - caps how many calls are in flight, AIMD-style: +1/limit per success, halved
+#     (at most once per cooldown) on a rate-limit error. Bulk list/delete/upload
+#     stages can then run many workers and settle just under the quota.
+#
+#   execute(service.files().delete(fileId=file_id))     # a googleapiclient request
+#   call(downloader.next_chunk)                          # any callable making one API call
+#
+# The executor is shared by every run in the process, so a run reports its own
+# share of the counters through a window rather than by resetting them:
+#
+#   window = DRIVE_EXECUTOR.start_window()
+#   ...
+#   DRIVE_EXECUTOR.log_stats(window)
+
+DRIVE_WORKERS = 8          # most calls in flight; Drive stages use this many workers
+INITIAL_CONCURRENCY = 2
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 64.0
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0    # seconds; a burst of 429s from one overload only halves once
+
+RATE_LIMIT, RETRY, FATAL = "rate_limit", "retry", "fatal"
+RATE_LIMIT_REASONS = {"userRateLimitExceeded", "rateLimitExceeded", "sharingRateLimitExceeded",
+                      "dailyLimitExceeded", "quotaExceeded"}
+RETRY_STATUSES = {408, 500, 502, 503, 504}
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, socket.timeout, ssl.SSLError, http.client.HTTPException)
+try:
+    import httplib2
+    TRANSIENT_ERRORS += (httplib2.HttpLib2Error,)
+except ImportError:
+    pass
+
+def error_status(error):
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    return int(status) if status is not None else None
+
+def error_reasons(error):
+    content = getattr(error, "content", b"") or b""
+    try:
+        body = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)
+    except (ValueError, UnicodeDecodeError):
+        return set()
+    details = body.get("error", {}) if isinstance(body, dict) else {}
+    return {e.get("reason") for e in details.get("errors", []) if isinstance(e, dict)}
+
+def classify_error(error):
+    status = error_status(error)
+    if status is None:
+        # No HTTP response: a dropped or timed-out connection is worth another try
+        return RETRY if isinstance(error, TRANSIENT_ERRORS) else FATAL
+    if status == 429:
+        return RATE_LIMIT
+    if status == 403:
+        return RATE_LIMIT if error_reasons(error) & RATE_LIMIT_REASONS else FATAL
+    return RETRY if status in RETRY_STATUSES else FATAL
+
+def retry_after(error):
+    resp = getattr(error, "resp", None)
+    try:
+        return float(resp.get("retry-after")) if resp is not None and resp.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+COUNTERS = ("calls", "retries", "throttled", "failed")
+
+class StatsWindow:
+    # The counters when a run started, and the concurrency range seen since
+    def __init__(self, counters, limit):
+        self.counters = counters
+        self.min_limit = self.max_limit = limit
+
+class DriveExecutor:
+    def __init__(self, max_concurrency=DRIVE_WORKERS, min_concurrency=1, initial=INITIAL_CONCURRENCY,
+                 max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY, sleep=time.sleep):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(min(max(initial, min_concurrency), max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._rand = random.Random()
+        self._windows = weakref.WeakSet()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failed = 0
+        self.min_limit_seen = self.max_limit_seen = self.limit
+
+    def _acquire(self):
+        with self._cond:
+            while self.in_flight >= max(int(self.limit), self.min_concurrency):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def _release(self, outcome):
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome == RATE_LIMIT:
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.limit = max(self.min_concurrency, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+            self.min_limit_seen = min(self.min_limit_seen, self.limit)
+            self.max_limit_seen = max(self.max_limit_seen, self.limit)
+            for window in self._windows:
+                window.min_limit = min(window.min_limit, self.limit)
+                window.max_limit = max(window.max_limit, self.limit)
+            self._cond.notify_all()
+
+    def backoff(self, attempt, error=None):
+        # Full jitter: uniform in [0, base * 2^attempt], capped; a server-sent Retry-After wins
+        delay = retry_after(error)
+        if delay is not None:
+            return min(delay, self.max_delay)
+        return self._rand.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                self._release(kind)
+                with self._cond:
+                    self.calls += 1
+                    self.throttled += kind == RATE_LIMIT
+                    if kind == FATAL or attempt >= self.max_retries:
+                        self.failed += 1
+                        raise
+                    self.retries += 1
+                self.sleep(self.backoff(attempt, e))
+                attempt += 1
+                continue
+            self._release("ok")
+            with self._cond:
+                self.calls += 1
+            return result
+
+    def execute(self, request, **kwargs):
+        return self.call(request.execute, **kwargs)
+
+    def start_window(self):
+        with self._cond:
+            window = StatsWindow({name: getattr(self, name) for name in COUNTERS}, self.limit)
+            self._windows.add(window)
+            return window
+
+    def stats(self, since=None):
+        # since: a StatsWindow, to count only what happened after it started
+        with self._cond:
+            s = {name: getattr(self, name) - (since.counters[name] if since else 0) for name in COUNTERS}
+            low, high = (since.min_limit, since.max_limit) if since else (self.min_limit_seen, self.max_limit_seen)
+            s.update(concurrency=round(self.limit, 2), min_concurrency=round(low, 2), max_concurrency=round(high, 2))
+            return s
+
+    def log_stats(self, since=None):
+        s = self.stats(since)
+        log(f"🚦 Drive calls: {s['calls']} · retried {s['retries']} · rate-limited {s['throttled']} · "
+            f"failed {s['failed']} · concurrency {s['min_concurrency']:g}–{s['max_concurrency']:g}")
+
+
+# One executor per process: the quota is per user, whichever agent is calling
+DRIVE_EXECUTOR = DriveExecutor()
+
+def execute(request, **kwargs):
+    return DRIVE_EXECUTOR.execute(request, **kwargs)
+
+def call(func, *args, **kwargs):
+    return DRIVE_EXECUTOR.call(func, *args, **kwargs)
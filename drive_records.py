@@ -0,0 +1,56 @@
+import sys
+
+from drive_executor import execute
+
+# Compact form of the file resources Drive returns. Each API dict is parsed once:
+# size becomes an int, the mime type is interned (a corpus has only a handful),
+# and md5Checksum is kept as 16 raw bytes instead of a 32-char hex string.
+# At a million files this is a fraction of the memory of the raw dicts
+# (bench_drive.py's "memory" scenario measures it).
+
+RECORD_FIELDS = "id, name, mimeType, size, md5Checksum, imageMediaMetadata(width)"
+PAGE_SIZE = 1000
+
+class FileRecord:
+    __slots__ = ("id", "name", "mime_type", "size", "md5", "width")
+
+    def __init__(self, file_id, name, mime_type, size=0, md5=None, width=0):
+        self.id = file_id
+        self.name = name
+        self.mime_type = sys.intern(mime_type)
+        self.size = size
+        self.md5 = md5
+        self.width = width
+
+    @classmethod
+    def from_api(cls, resource):
+        md5 = resource.get("md5Checksum")
+        return cls(
+            resource["id"], resource.get("name", ""), resource.get("mimeType", ""),
+            int(resource.get("size", 0)),
+            bytes.fromhex(md5) if md5 else None,
+            (resource.get("imageMediaMetadata") or resource.get("videoMediaMetadata") or {}).get("width") or 0,
+        )
+
+    @property
+    def md5_hex(self):
+        return self.md5.hex() if self.md5 else None
+
+    @property
+    def is_image(self):
+        return self.mime_type.startswith("image/")
+
+    def __repr__(self):
+        return f"FileRecord({self.id!r}, {self.name!r}, {self.mime_type!r}, size={self.size})"
+
+def list_records(service, query, fields=RECORD_FIELDS, page_size=PAGE_SIZE):
+    # Yields every matching file across all pages; each page is parsed as it arrives
+    page_token = None
+    while True:
+        response = execute(service.files().list(q=query, pageSize=page_size, pageToken=page_token,
+                                                fields=f"nextPageToken, files({fields})"))
+        for resource in response.get("files", []):
+            yield FileRecord.from_api(resource)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
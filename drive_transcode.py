@@ -0,0 +1,155 @@
+import os
+import struct
+import hashlib
+import ffmpeg
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+
+from drive_executor import call, execute
+from video_encoding import encode_output, DEFAULT_PRESET, DEFAULT_CRF
+
+# Shrinks Drive videos without a full-size copy on disk: the media is read in
+# ranges and piped into ffmpeg's stdin while ffmpeg writes the smaller file to
+# USB, so download and encode overlap. An MP4/MOV whose index (moov box) comes
+# after the media data cannot be demuxed from a pipe as it is; for those the moov
+# is fetched first and sent ahead of the data with its chunk offsets shifted,
+# as qt-faststart would rewrite the file.
+
+TRANSCODE_WIDTH = 1280      # only videos wider than this are transcoded
+STREAM_CHUNK_BYTES = 16 * 1024 * 1024
+MOV_MIME_TYPES = {"video/mp4", "video/quicktime", "video/3gpp", "video/x-m4v"}
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+class TranscodeError(Exception):
+    pass
+
+def should_transcode(f, width=TRANSCODE_WIDTH):
+    return f.mime_type.startswith("video/") and f.width > width
+
+def transcoded_name(f):
+    return os.path.splitext(f.name)[0] + ".mp4"
+
+def read_range(service, file_id, start, end):
+    # Bytes start..end (inclusive) of a Drive file, over the same http the media downloads use
+    request = service.files().get_media(fileId=file_id)
+    def fetch():
+        resp, content = request.http.request(request.uri, headers={**request.headers, "range": f"bytes={start}-{end}"})
+        if resp.status not in (200, 206):
+            raise HttpError(resp, content, uri=request.uri)
+        return content
+    return call(fetch)
+
+def box_header(data, pos):
+    length, kind = struct.unpack_from(">I4s", data, pos)
+    if length == 1:
+        return kind, struct.unpack_from(">Q", data, pos + 8)[0], 16
+    return kind, length, 8
+
+def top_level_boxes(service, f):
+    # [(type, offset, length)], one 16-byte ranged read per box
+    boxes, offset = [], 0
+    while offset + 8 <= f.size:
+        kind, length, _ = box_header(read_range(service, f.id, offset, min(offset + 15, f.size - 1)), 0)
+        length = length or f.size - offset  # 0 means "to the end of the file"
+        if length < 8:
+            raise TranscodeError(f"{f.name}: not an MP4/MOV file")
+        boxes.append((kind, offset, length))
+        offset += length
+    return boxes
+
+def shift_chunk_offsets(moov, delta):
+    # Adds delta to every stco/co64 entry of a moov box
+    data = bytearray(moov)
+    def walk(start, end):
+        pos = start
+        while pos + 8 <= end:
+            kind, length, header = box_header(data, pos)
+            length = length or end - pos
+            if length < header:
+                raise TranscodeError("corrupt moov box")
+            if kind in CONTAINER_BOXES:
+                walk(pos + header, pos + length)
+            elif kind in (b"stco", b"co64"):
+                fmt, size = (">I", 4) if kind == b"stco" else (">Q", 8)
+                count = struct.unpack_from(">I", data, pos + header + 4)[0]
+                for i in range(count):
+                    at = pos + header + 8 + i * size
+                    value = struct.unpack_from(fmt, data, at)[0] + delta
+                    if size == 4 and value >= 1 << 32:
+                        raise TranscodeError("chunk offsets no longer fit in 32 bits")
+                    struct.pack_into(fmt, data, at, value)
+            pos += length
+    walk(0, len(data))
+    return bytes(data)
+
+def faststart_plan(service, f):
+    # (mdat offset, moov offset, moov bytes) when the moov has to be moved, else None
+    if f.mime_type not in MOV_MIME_TYPES:
+        return None
+    boxes = top_level_boxes(service, f)
+    kinds = [kind for kind, _, _ in boxes]
+    if b"moov" not in kinds:
+        raise TranscodeError(f"{f.name}: no moov box")
+    if b"mdat" not in kinds or kinds.index(b"moov") < kinds.index(b"mdat"):
+        return None
+    _, mdat_offset, _ = boxes[kinds.index(b"mdat")]
+    _, moov_offset, moov_length = boxes[kinds.index(b"moov")]
+    return mdat_offset, moov_offset, read_range(service, f.id, moov_offset, moov_offset + moov_length - 1)
+
+def stream_to(service, f, sink, plan=None):
+    # Writes the file to sink, with the moov moved ahead of the mdat when planned.
+    # Returns the MD5 of the original byte order either way, for the checksum check.
+    md5 = hashlib.md5()
+    mdat_offset, moov_offset, moov = plan or (None, None, None)
+    position = 0
+    while position < f.size:
+        if moov is not None and position == mdat_offset:
+            sink.write(shift_chunk_offsets(moov, len(moov)))
+            mdat_offset = None
+        if moov is not None and position == moov_offset:
+            md5.update(moov)
+            position += len(moov)
+            continue
+        end = min(position + STREAM_CHUNK_BYTES, f.size)
+        for boundary in (mdat_offset, moov_offset if moov is not None else None):
+            if boundary is not None and position < boundary < end:
+                end = boundary
+        data = read_range(service, f.id, position, end - 1)
+        if not data:
+            raise TranscodeError(f"{f.name}: Drive returned no data at byte {position}")
+        md5.update(data)
+        sink.write(data)
+        position += len(data)
+    return md5.hexdigest()
+
+def transcode_from_drive(service, f, dst, width=TRANSCODE_WIDTH, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, threads=None):
+    # Returns the MD5 of the source as read; dst is removed if anything fails
+    plan = faststart_plan(service, f)
+    process = (encode_output(ffmpeg.input("pipe:0"), dst, width, preset, crf, threads)
+               .global_args("-loglevel", "error")
+               .run_async(pipe_stdin=True, quiet=True))
+    digest = None
+    try:
+        digest = stream_to(service, f, process.stdin, plan)
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # ffmpeg stopped reading; its stderr says why
+    except BaseException:
+        process.kill()
+        process.wait()
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+    _, stderr = process.communicate()
+    if process.returncode != 0 or digest is None:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise TranscodeError(f"{f.name}: ffmpeg failed: {stderr.decode(errors='replace').strip()[-300:]}")
+    return digest
+
+def replace_in_drive(service, f, path):
+    # A new revision of the same file, so its links and sharing stay as they were
+    media = MediaFileUpload(path, mimetype="video/mp4", resumable=True)
+    return execute(service.files().update(fileId=f.id, body={"name": transcoded_name(f), "mimeType": "video/mp4"},
+                                          media_body=media))
@@ -0,0 +1,109 @@
+import ssl
+import threading
+import http.client
+
+import httplib2
+import google_auth_httplib2
+
+# HTTP under the Drive clients. drive_auth builds one service per thread, each on
+# its own DriveHttp, and httplib2 keeps that thread's connection to every host
+# open between calls: a worker pays for TCP and TLS once, not per request, and
+# no connection is ever used by two threads. On top of plain httplib2:
+#   - all connections share one SSLContext and offer the host's last TLS session,
+#     so a reconnect (idle timeout, a new worker thread) resumes instead of doing
+#     a full handshake;
+#   - API calls ask for gzip (Google compresses only when the User-Agent says
+#     "gzip"); media asks for identity, as it is compressed already and Range
+#     offsets have to refer to the stored bytes.
+#
+#   service = build("drive", "v3", http=authorized_http(creds))
+
+HTTP_TIMEOUT = 60
+GZIP_AGENT = "(gzip)"
+
+_tls_lock = threading.Lock()
+_tls_context = None
+_tls_sessions = {}            # host → the last SSLSession it gave us
+_stats = {"connections": 0, "resumed": 0}
+
+def use_ca_certs(path=None):
+    # CA bundle for Drive connections (default: httplib2's); drops cached sessions
+    global _tls_context
+    with _tls_lock:
+        _tls_context = ssl.create_default_context(cafile=path or httplib2.CA_CERTS)
+        _tls_sessions.clear()
+    return _tls_context
+
+def tls_context():
+    return _tls_context or use_ca_certs()
+
+def stats():
+    with _tls_lock:
+        return dict(_stats)
+
+def reset_stats():
+    with _tls_lock:
+        _stats.update(connections=0, resumed=0)
+
+class ResumingContext:
+    # Stands in for a connection's own SSLContext: the shared one, offering the
+    # last session for the host (a session only resumes on the context that made it)
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        return tls_context().wrap_socket(sock, server_hostname=server_hostname,
+                                         session=_tls_sessions.get(server_hostname), **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(tls_context(), name)
+
+class ResumingHTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+    # httplib2's own __init__ builds a new SSLContext per connection and loads the
+    # whole CA bundle into it (~20 ms of CPU); these all share tls_context() instead
+    def __init__(self, host, port=None, key_file=None, cert_file=None, timeout=None, proxy_info=None, **kwargs):
+        http.client.HTTPSConnection.__init__(self, host, port=port, timeout=timeout, context=tls_context())
+        self._context = ResumingContext()
+        if proxy_info and not isinstance(proxy_info, httplib2.ProxyInfo):
+            proxy_info = proxy_info("https")
+        self.proxy_info = proxy_info
+        self.ca_certs = kwargs.get("ca_certs") or httplib2.CA_CERTS
+        self.disable_ssl_certificate_validation = False
+        self.key_file = key_file
+        self.cert_file = cert_file
+        self.key_password = None
+
+    def connect(self):
+        super().connect()
+        with _tls_lock:
+            _stats["connections"] += 1
+            _stats["resumed"] += bool(self.sock.session_reused)
+
+    def getresponse(self):
+        response = super().getresponse()
+        # TLS 1.3 tickets come after the handshake; by the first response they have been read
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            _tls_sessions[self.host] = session
+        return response
+
+class DriveHttp(httplib2.Http):
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        super().__init__(timeout=timeout)
+        # As googleapiclient's build_http: 308 is a resumable upload's "continue", not a redirect
+        self.redirect_codes = self.redirect_codes - {308}
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if "alt=media" in uri:
+            headers["accept-encoding"] = "identity"
+        else:
+            headers.setdefault("accept-encoding", "gzip")
+            agent = headers.get("user-agent", "")
+            if "gzip" not in agent:
+                headers["user-agent"] = f"{agent} {GZIP_AGENT}".strip()
+        if connection_type is None and uri.startswith("https:"):
+            connection_type = ResumingHTTPSConnection
+        return super().request(uri, method, body, headers, redirections, connection_type)
+
+def authorized_http(creds, timeout=HTTP_TIMEOUT):
+    # Token refreshes go over the same DriveHttp, so they reuse its connections too
+    return google_auth_httplib2.AuthorizedHttp(creds, http=DriveHttp(timeout))
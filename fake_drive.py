@@ -0,0 +1,521 @@
+import re
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from collections import Counter
+
+# In-process stand-in for the Drive v3 client returned by build("drive", "v3"),
+# for benchmarks and offline runs of agent1/agent2. Covers what the agents use:
+#
+#   files().list (q subset, fields, paging, list_next)   files().get_media
+#   files().create / update with media_body              files().delete
+#   new_batch_http_request()                             changes().getStartPageToken / list
+#
+# get_media requests work with googleapiclient's MediaIoBaseDownload (ranged
+# GETs through request.http). Every call can be slowed down (latency, bandwidth)
+# and made to fail with 429 / 403 rate-limit / 5xx errors, at random or on demand.
+#
+#   drive = FakeDrive(latency=0.02, error_rate=0.01)
+#   drive.populate(100_000, duplicate_ratio=0.1)
+#   duplicates = find_duplicates(list_image_files(drive, folder_id))
+
+try:
+    from googleapiclient.errors import HttpError
+except ImportError:  # the emulator also runs where the Google client is not installed
+    class HttpError(Exception):
+        def __init__(self, resp, content, uri=None):
+            super().__init__(f"<HttpError {resp.status} when requesting {uri}>")
+            self.resp = resp
+            self.content = content
+            self.uri = uri
+            self.status_code = resp.status
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 100
+DEFAULT_FIELDS = "nextPageToken, files(kind, id, name, mimeType)"
+DEFAULT_FILE_FIELDS = "kind, id, name, mimeType"
+ERROR_REASONS = {429: "rateLimitExceeded", 403: "userRateLimitExceeded", 500: "backendError",
+                 502: "backendError", 503: "backendError", 504: "backendError"}
+PATTERN_BYTES = 64 * 1024
+LARGE_VARIANTS = 8
+VIDEO_WIDTHS = (1280, 1920, 3840)   # videoMediaMetadata width of the large videos
+
+class FakeResponse(dict):
+    # Shaped like httplib2.Response: a header dict with a .status
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self["status"] = str(status)
+        self.reason = "OK" if status < 400 else "Error"
+
+def http_error(status, uri, reason=None):
+    reason = reason or ERROR_REASONS.get(status, "error")
+    content = json.dumps({"error": {"code": status, "message": reason,
+                                    "errors": [{"domain": "usageLimits", "reason": reason, "message": reason}]}})
+    return HttpError(FakeResponse(status, {"content-type": "application/json"}), content.encode("utf-8"), uri=uri)
+
+class FakeFile:
+    __slots__ = ("id", "name", "mime_type", "size", "parents", "trashed", "content", "seed", "width",
+                 "created", "modified")
+
+    def __init__(self, file_id, name, mime_type, size=0, parents=(), content=None, seed=None, width=None):
+        self.id = file_id
+        self.name = name
+        self.mime_type = mime_type
+        self.size = len(content) if content is not None else size
+        self.parents = list(parents)
+        self.trashed = False
+        self.content = content
+        self.seed = file_id if seed is None else seed
+        self.width = width
+        self.created = self.modified = time.time()
+
+def rfc3339(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + f".{int(ts * 1000) % 1000:03d}Z"
+
+def parse_fields(spec):
+    # "nextPageToken, files(id, imageMediaMetadata(width))" → {"nextPageToken": None, "files": {...}}
+    root, stack, name = {}, [], ""
+    current = root
+    for ch in spec + ",":
+        if ch == "(":
+            child = current[name.strip()] = {}
+            stack.append(current)
+            current, name = child, ""
+        elif ch in ",)":
+            if name.strip():
+                current[name.strip()] = None
+            name = ""
+            if ch == ")":
+                current = stack.pop()
+        else:
+            name += ch
+    return root
+
+def project(resource, selector):
+    if selector is None:
+        return resource
+    out = {}
+    for key, sub in selector.items():
+        if key in resource:
+            value = resource[key]
+            out[key] = project(value, sub) if sub is not None and isinstance(value, dict) else value
+    return out
+
+QUERY_CLAUSES = [
+    (re.compile(r"^mimeType\s+contains\s+'([^']*)'$"), lambda v: lambda f: v in f.mime_type),
+    (re.compile(r"^mimeType\s*!=\s*'([^']*)'$"), lambda v: lambda f: f.mime_type != v),
+    (re.compile(r"^mimeType\s*=\s*'([^']*)'$"), lambda v: lambda f: f.mime_type == v),
+    (re.compile(r"^name\s*=\s*'([^']*)'$"), lambda v: lambda f: f.name == v),
+    (re.compile(r"^name\s+contains\s+'([^']*)'$"), lambda v: lambda f: v in f.name),
+    (re.compile(r"^'([^']*)'\s+in\s+parents$"), lambda v: lambda f: v in f.parents),
+    (re.compile(r"^trashed\s*=\s*(true|false)$"), lambda v: lambda f: f.trashed == (v == "true")),
+]
+
+def compile_query(q):
+    # The subset of the Drive query language the agents use: clauses joined by "and"
+    tests = []
+    for clause in filter(None, (c.strip() for c in (q or "").split(" and "))):
+        for pattern, build in QUERY_CLAUSES:
+            match = pattern.match(clause)
+            if match:
+                tests.append(build(match.group(1)))
+                break
+        else:
+            raise ValueError(f"FakeDrive does not understand query clause: {clause}")
+    has_trashed = "trashed" in (q or "")
+    return lambda f: (has_trashed or not f.trashed) and all(test(f) for test in tests)
+
+
+class FakeRequest:
+    def __init__(self, drive, method, func, uri, **params):
+        self.drive = drive
+        self.method = method
+        self.func = func
+        self.uri = uri
+        self.params = params
+        self.headers = {}
+        self.http = FakeHttp(drive)
+
+    def execute(self, num_retries=0, http=None):
+        for attempt in range(num_retries + 1):
+            try:
+                return self.drive._call(self.method, self.uri, self.func)
+            except HttpError as e:
+                if attempt == num_retries or not (e.resp.status == 429 or e.resp.status >= 500):
+                    raise
+                time.sleep(random.random() * 2 ** attempt)
+
+class FakeHttp:
+    # What MediaIoBaseDownload talks to: request(uri, method, headers) → (response, content)
+    def __init__(self, drive):
+        self.drive = drive
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        drive = self.drive
+        file_id = uri.rsplit("/", 1)[-1].split("?")[0]
+        try:
+            drive._before_call("files.get_media", uri)
+        except HttpError as e:
+            return e.resp, e.content
+        f = drive._files.get(file_id)
+        if f is None:
+            return FakeResponse(404), b'{"error": {"code": 404, "message": "File not found"}}'
+        start, end = 0, f.size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", (headers or {}).get("range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else f.size - 1, f.size - 1)
+        if f.size and start >= f.size:
+            return FakeResponse(416, {"content-range": f"bytes */{f.size}"}), b""
+        content = drive.read(f, start, end + 1)
+        drive._transfer(len(content), "bytes_down")
+        drive._wire_wait()
+        if match:
+            return FakeResponse(206, {"content-range": f"bytes {start}-{end}/{f.size}",
+                                      "content-length": str(len(content))}), content
+        return FakeResponse(200, {"content-length": str(len(content))}), content
+
+class FakeBatch:
+    def __init__(self, drive, callback=None):
+        self.drive = drive
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) >= MAX_BATCH_SIZE:
+            raise ValueError(f"Exceeded maximum calls ({MAX_BATCH_SIZE}) in a single batch request.")
+        request_id = request_id or str(len(self.requests) + 1)
+        self.requests.append((request_id, request, callback))
+
+    def execute(self, http=None):
+        # One round trip for the whole batch; each part can still fail on its own
+        self.drive._before_call("batch", "batch")
+        for request_id, request, callback in self.requests:
+            response, exception = None, None
+            try:
+                response = self.drive._call(request.method, request.uri, request.func, latency=False)
+            except HttpError as e:
+                exception = e
+            for cb in (callback, self.callback):
+                if cb:
+                    cb(request_id, response, exception)
+
+class FilesResource:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q=None, pageSize=DEFAULT_PAGE_SIZE, pageToken=None, fields=None, orderBy=None,
+             spaces="drive", **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "files.list", lambda: drive._list(q, pageSize, pageToken, fields),
+                           "files", q=q, pageSize=pageSize, pageToken=pageToken, fields=fields)
+
+    def list_next(self, previous_request, previous_response):
+        token = previous_response.get("nextPageToken")
+        if not token:
+            return None
+        return self.list(**{**previous_request.params, "pageToken": token})
+
+    def get(self, fileId, fields=None, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "files.get", lambda: drive._get(fileId, fields), f"files/{fileId}")
+
+    def get_media(self, fileId, **kwargs):
+        drive = self.drive
+        def read_all():
+            f = drive._require(fileId)
+            drive._transfer(f.size, "bytes_down")
+            return drive.read(f, 0, f.size)
+        return FakeRequest(drive, "files.get_media", read_all, f"https://fake.drive/files/{fileId}")
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "files.create", lambda: drive._create(body or {}, media_body, fields), "files")
+
+    def update(self, fileId, body=None, media_body=None, fields=None, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "files.update", lambda: drive._update(fileId, body or {}, media_body, fields),
+                           f"files/{fileId}")
+
+    def delete(self, fileId, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "files.delete", lambda: drive._delete(fileId), f"files/{fileId}")
+
+class ChangesResource:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "changes.getStartPageToken",
+                           lambda: {"startPageToken": str(len(drive._changes) + 1)}, "changes/startPageToken")
+
+    def list(self, pageToken, pageSize=DEFAULT_PAGE_SIZE, fields=None, includeRemoved=True, **kwargs):
+        drive = self.drive
+        return FakeRequest(drive, "changes.list",
+                           lambda: drive._list_changes(pageToken, pageSize, fields, includeRemoved), "changes")
+
+
+class FakeDrive:
+    def __init__(self, latency=0.0, bandwidth=None, error_rate=0.0, error_codes=(429, 403, 500, 503), seed=0):
+        # latency: seconds per round trip; bandwidth: bytes/s per media transfer (concurrent
+        # transfers each get it); error_rate: chance a call fails
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self._files = {}
+        self._changes = []
+        self._cursors = {}
+        self._md5 = {}
+        self._forced = []
+        self._ids = itertools.count(1)
+        self._rand = random.Random(seed)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.root_id = self.add_folder("My Drive", parents=())
+
+    # Resources, as on the real client
+    def files(self):
+        return FilesResource(self)
+
+    def changes(self):
+        return ChangesResource(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    # Corpus
+    def _new_id(self):
+        return f"fake{next(self._ids):09d}"
+
+    def add_file(self, name, mime_type="application/octet-stream", size=0, parents=None, content=None,
+                 seed=None, width=None):
+        with self._lock:
+            f = FakeFile(self._new_id(), name, mime_type, size, [self.root_id] if parents is None else parents,
+                         content, seed, width)
+            self._files[f.id] = f
+            self._changes.append((f.id, False, time.time()))
+            return f.id
+
+    def add_folder(self, name, parents=None):
+        return self.add_file(name, FOLDER_MIME, parents=[] if parents == () else parents)
+
+    def populate(self, count, parent=None, image_ratio=0.6, duplicate_ratio=0.1, large_ratio=0.02,
+                 mean_size=4096, large_size=20 * 1024 * 1024, seed=0):
+        # Synthetic corpus. Duplicates reuse an earlier file's content seed, so md5Checksum matches;
+        # contents are generated on read, so large declared sizes cost no memory. Large files
+        # are videos/PDFs drawn from a few contents, so their checksums are hashed only once each.
+        rand = random.Random(seed)
+        parents = [parent] if parent else None
+        mimes = ["image/jpeg", "image/png", "video/mp4", "application/pdf"]
+        exts = {"image/jpeg": "jpg", "image/png": "png", "video/mp4": "mp4", "application/pdf": "pdf"}
+        created = []
+        for i in range(count):
+            if created and rand.random() < duplicate_ratio:
+                original = self._files[rand.choice(created)]
+                fid = self.add_file(f"copy_of_{original.name}", original.mime_type, original.size, parents,
+                                    seed=original.seed, width=original.width)
+            elif rand.random() < large_ratio:
+                variant = rand.randrange(LARGE_VARIANTS)
+                mime = rand.choice(mimes[2:])
+                # From the variant, not rand, so seeded corpora stay the same
+                width = VIDEO_WIDTHS[variant % len(VIDEO_WIDTHS)] if mime.startswith("video/") else None
+                fid = self.add_file(f"file_{i:07d}.{exts[mime]}", mime, large_size + variant * 1024 * 1024, parents,
+                                    seed=f"large-{variant}", width=width)
+            else:
+                is_image = rand.random() < image_ratio
+                mime = rand.choice(mimes[:2]) if is_image else rand.choice(mimes[2:])
+                fid = self.add_file(f"file_{i:07d}.{exts[mime]}", mime, max(1, int(rand.expovariate(1 / mean_size))),
+                                    parents, width=rand.choice([1080, 1600, 3024, 4032]) if is_image else None)
+            created.append(fid)
+        return created
+
+    # Contents
+    def _pattern(self, seed):
+        block = hashlib.blake2b(str(seed).encode(), digest_size=64).digest()
+        return block * (PATTERN_BYTES // len(block))
+
+    def read(self, f, start, end):
+        if f.content is not None:
+            return f.content[start:end]
+        pattern = self._pattern(f.seed)
+        offset = start % len(pattern)
+        length = max(0, end - start)
+        return (pattern * ((offset + length) // len(pattern) + 1))[offset:offset + length]
+
+    def md5(self, f):
+        if f.content is not None:
+            return hashlib.md5(f.content).hexdigest()
+        key = (f.seed, f.size)
+        if key not in self._md5:
+            h, pattern = hashlib.md5(), self._pattern(f.seed)
+            full, tail = divmod(f.size, len(pattern))
+            for _ in range(full):
+                h.update(pattern)
+            h.update(pattern[:tail])
+            self._md5[key] = h.hexdigest()
+        return self._md5[key]
+
+    def precompute_checksums(self):
+        for f in list(self._files.values()):
+            if f.mime_type != FOLDER_MIME:
+                self.md5(f)
+
+    def resource(self, f):
+        resource = {"kind": "drive#file", "id": f.id, "name": f.name, "mimeType": f.mime_type,
+                    "parents": list(f.parents), "trashed": f.trashed,
+                    "createdTime": rfc3339(f.created), "modifiedTime": rfc3339(f.modified)}
+        if f.mime_type != FOLDER_MIME:
+            resource["size"] = str(f.size)
+        if f.width:
+            metadata = "videoMediaMetadata" if f.mime_type.startswith("video/") else "imageMediaMetadata"
+            resource[metadata] = {"width": f.width}
+        return resource
+
+    def _resource(self, f, selector):
+        resource = self.resource(f)
+        if f.mime_type != FOLDER_MIME and "md5Checksum" in selector:
+            resource["md5Checksum"] = self.md5(f)
+        return project(resource, selector)
+
+    # Failure injection
+    def fail_next(self, status, count=1, reason=None, methods=None):
+        # The next `count` calls (optionally only to these methods) fail with `status`
+        with self._lock:
+            self._forced.extend([(status, reason, methods)] * count)
+
+    def _before_call(self, method, uri, latency=True):
+        if latency and self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests[method] += 1
+            failure = None
+            for i, (status, reason, methods) in enumerate(self._forced):
+                if methods is None or method in methods:
+                    failure = (status, reason)
+                    del self._forced[i]
+                    break
+            if failure is None and self.error_rate and self._rand.random() < self.error_rate:
+                failure = (self._rand.choice(self.error_codes), None)
+            if failure:
+                self.errors[failure[0]] += 1
+        if failure:
+            raise http_error(failure[0], uri, failure[1])
+
+    def _transfer(self, size, counter):
+        # Handlers run under the lock; the wire time is only slept in _wire_wait, after
+        # it is released, so transfers in different threads overlap as on a real link
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + size)
+        if self.bandwidth:
+            self._local.wire_time = getattr(self._local, "wire_time", 0.0) + size / self.bandwidth
+
+    def _wire_wait(self):
+        delay, self._local.wire_time = getattr(self._local, "wire_time", 0.0), 0.0
+        if delay:
+            time.sleep(delay)
+
+    def _call(self, method, uri, func, latency=True):
+        self._before_call(method, uri, latency)
+        try:
+            with self._lock:
+                return func()
+        finally:
+            self._wire_wait()
+
+    # Handlers
+    def _require(self, file_id):
+        f = self._files.get(file_id)
+        if f is None:
+            raise http_error(404, f"files/{file_id}", "notFound")
+        return f
+
+    def _list(self, q, page_size, page_token, fields):
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        selector = parse_fields(fields or DEFAULT_FIELDS)
+        if page_token:
+            if page_token not in self._cursors:
+                raise http_error(400, "files", "invalidPageToken")
+            matches, offset = self._cursors.pop(page_token)
+        else:
+            test = compile_query(q)
+            matches, offset = [f for f in self._files.values() if test(f)], 0
+        page = matches[offset:offset + page_size]
+        response = {"kind": "drive#fileList", "incompleteSearch": False,
+                    "files": [self._resource(f, selector.get("files")) for f in page if f.id in self._files]}
+        if offset + page_size < len(matches):
+            token = f"page{next(self._ids)}"
+            self._cursors[token] = (matches, offset + page_size)
+            response["nextPageToken"] = token
+        return project(response, selector)
+
+    def _get(self, file_id, fields):
+        return self._resource(self._require(file_id), parse_fields(fields or DEFAULT_FILE_FIELDS))
+
+    def _media_bytes(self, media_body):
+        if media_body is None:
+            return None
+        size = media_body.size()
+        data = media_body.getbytes(0, size) if size else b""
+        self._transfer(len(data), "bytes_up")
+        return data
+
+    def _create(self, body, media_body, fields):
+        content = self._media_bytes(media_body)
+        mime = body.get("mimeType") or (media_body.mimetype() if media_body else None) or "application/octet-stream"
+        file_id = self.add_file(body.get("name", "Untitled"), mime, parents=body.get("parents"),
+                                content=content if content is not None else b"")
+        return self._resource(self._files[file_id], parse_fields(fields) if fields else {"id": None, "name": None})
+
+    def _update(self, file_id, body, media_body, fields):
+        f = self._require(file_id)
+        content = self._media_bytes(media_body)
+        if content is not None:
+            f.content, f.size = content, len(content)
+        if "name" in body:
+            f.name = body["name"]
+        if "trashed" in body:
+            f.trashed = bool(body["trashed"])
+        f.modified = time.time()
+        self._changes.append((f.id, False, f.modified))
+        return self._resource(f, parse_fields(fields) if fields else {"id": None, "name": None})
+
+    def _delete(self, file_id):
+        self._require(file_id)
+        del self._files[file_id]
+        self._changes.append((file_id, True, time.time()))
+        return ""
+
+    def _list_changes(self, page_token, page_size, fields, include_removed):
+        start = int(page_token) - 1
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        selector = parse_fields(fields or f"nextPageToken, newStartPageToken, changes(fileId, removed, time, file({DEFAULT_FILE_FIELDS}))")
+        file_selector = selector.get("changes", {}).get("file") or parse_fields(DEFAULT_FILE_FIELDS)
+        changes = []
+        for file_id, removed, ts in self._changes[start:start + page_size]:
+            f = self._files.get(file_id)
+            removed = removed or f is None
+            if removed and not include_removed:
+                continue
+            change = {"kind": "drive#change", "changeType": "file", "fileId": file_id,
+                      "removed": removed, "time": rfc3339(ts)}
+            if not removed:
+                change["file"] = self._resource(f, file_selector)
+            changes.append(change)
+        response = {"kind": "drive#changeList", "changes": changes}
+        if start + page_size < len(self._changes):
+            response["nextPageToken"] = str(start + page_size + 1)
+        else:
+            response["newStartPageToken"] = str(len(self._changes) + 1)
+        return project(response, {"kind": None, **selector})
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import threading
+
+# Append-only journal of per-item states. One JSON record per line; the last
+# record for a key wins. A crash can only ever tear the final line, which is
+# dropped (and the file compacted) on the next open.
+
+class JobJournal:
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self._lock = threading.Lock()
+        torn = self._load()
+        if torn:
+            self.compact()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        torn = False
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True
+                    continue
+                self.entries[record["key"]] = record
+        return torn
+
+    def key_for(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def state(self, key):
+        record = self.entries.get(key)
+        return record["state"] if record else None
+
+    def record(self, key, state, **info):
+        record = {"key": key, "state": state, "ts": time.time(), **info}
+        with self._lock:
+            self._fh.write(json.dumps(record) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.entries[key] = record
+        return record
+
+    def compact(self):
+        fh = getattr(self, "_fh", None)
+        if fh:
+            fh.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        if fh:
+            self._fh = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+def atomic_write(path, data, mode="wb"):
+    temp_path = path + ".tmp"
+    with open(temp_path, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
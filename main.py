@@ -1,43 +1,107 @@
 import streamlit as st
 import os
 from agent1_duplicates import run_agent1
-from agent2_heavy_files import run_agent2
+from agent2_heavy_files import run_agent2, resume_agent2, VIDEO_MODES
 from agent3_whatsapp_backup import run_agent3
+from agent_jobs import JobManager
+from daemon import DB_PATH, MEDIA_PATH, default_adb_path
+
+# Agents run as background jobs (agent_jobs.py): a click starts one and returns,
+# reruns of the script never start it again, and the jobs panel below is a
+# fragment that redraws itself every POLL_SECONDS with each job's progress and
+# log tail while the rest of the page stays put.
+
+POLL_SECONDS = 1.0
+LOG_LINES_SHOWN = 200
+PROFILE_DIR = "profiles"
+
+@st.cache_resource
+def job_manager():
+    # One per server process: jobs outlive reruns and browser sessions
+    return JobManager()
+
+@st.cache_resource(show_spinner="🔐 Signing into Google Drive...")
+def drive_credentials():
+    # Signs in once, here on the script thread. Agents build their own per-thread
+    # clients from these credentials (see drive_auth.get_drive_service), so no
+    # client is shared between jobs.
+    from drive_auth import get_credentials
+    return get_credentials()
+
+jobs = job_manager()
+
+def start_job(key, title, function, *args, **kwargs):
+    # One job per agent at a time: Run and Resume of agent2 share its download
+    # folder, hashes and resume pointer, so they share the "agent2" key too
+    running = jobs.running_job(key)
+    if running:
+        st.warning(f"⏳ {running.title} is still running; wait for it to finish first.")
+        return None
+    return jobs.start(key, title, function, *args, **kwargs)
 
 st.set_page_config(page_title="📦 GDrive Space Fixer", layout="centered")
 st.title("📦 Google Drive Space Fixer")
 st.markdown("Solve 'Google Drive Full' with AI-powered agents")
 
+profile = st.checkbox("🔬 Profile runs (flamegraph and allocation reports per stage)", key="profile")
+profile_dir = PROFILE_DIR if profile else None
+
 # 1️⃣ Agent 1: Remove Duplicates
 if st.button("🧹 Remove Duplicate Images from Drive"):
-    with st.spinner("Running Agent 1..."):
-        logs = run_agent1()
-    st.success("✅ Agent 1 Done")
-    st.code(logs)
+    drive_credentials()
+    start_job("agent1", "🧹 Agent 1: duplicate images", run_agent1, profile_dir=profile_dir)
 
-# 2️⃣ Agent 2: Move & Compress Heavy Files (with File Picker as Folder Selector)
+# 2️⃣ Agent 2: Move & Compress Heavy Files
 st.subheader("📤 Move & Compress Heavy Files to USB")
 
-folder_file = st.file_uploader("📂 Upload any file from the target USB/external drive folder", type=None)
-
-if folder_file:
-    folder_path = os.path.dirname(folder_file.name)
-    st.info(f"📁 Detected folder: {folder_path}")
-else:
-    folder_path = None
+folder_path = st.text_input("📂 USB/external drive folder", key="usb_folder", placeholder="E:/")
+video_mode = st.selectbox("🎞 Wide Drive videos", VIDEO_MODES, key="video_mode",
+                          format_func={"copy": "Move as they are", "shrink": "Shrink onto USB",
+                                       "replace": "Shrink and replace in Drive"}.get)
 
-if st.button("📤 Run Agent 2"):
+col1, col2 = st.columns(2)
+if col1.button("📤 Run Agent 2"):
     if folder_path and os.path.isdir(folder_path):
-        with st.spinner(f"Running Agent 2 on: {folder_path}"):
-            logs = run_agent2(folder_path)
-        st.success("✅ Agent 2 Completed")
-        st.code(logs)
+        drive_credentials()
+        start_job("agent2", f"📤 Agent 2 → {folder_path}", run_agent2, folder_path, video_mode=video_mode,
+                  profile_dir=profile_dir)
     else:
-        st.error("❌ Please upload a file from the target folder to select it.")
+        st.error("❌ Enter an existing folder on the target drive.")
+if col2.button("⏯ Resume Agent 2"):
+    drive_credentials()
+    start_job("agent2", "⏯ Agent 2 (resumed)", resume_agent2, profile_dir=profile_dir)
 
 # 3️⃣ Agent 3: WhatsApp Backup Shrinker
+st.subheader("📱 WhatsApp Backup Shrinker")
+
+with st.expander("Phone paths"):
+    adb_path = st.text_input("adb", default_adb_path(), key="adb_path")
+    db_path = st.text_input("WhatsApp DB path", DB_PATH, key="db_path")
+    media_path = st.text_input("WhatsApp media path", MEDIA_PATH, key="media_path")
+
 if st.button("📱 WhatsApp Backup Shrinker"):
-    with st.spinner("Running Agent 3..."):
-        logs = run_agent3()
-    st.success("✅ Agent 3 Done")
-    st.code(logs)
+    start_job("agent3", "📱 Agent 3: WhatsApp backup", run_agent3, adb_path, db_path, media_path,
+              profile_dir=profile_dir)
+
+@st.fragment(run_every=POLL_SECONDS)
+def jobs_panel():
+    st.subheader("🗂 Jobs")
+    all_jobs = jobs.jobs()
+    if not all_jobs:
+        st.caption("No jobs yet.")
+        return
+    if any(not job.running for job in all_jobs) and st.button("🧽 Clear finished jobs"):
+        jobs.clear_finished()
+        all_jobs = jobs.jobs()
+    icons = {"running": "⏳", "done": "✅", "failed": "❌"}
+    for job in all_jobs:
+        with st.expander(f"{icons[job.state]} {job.title} · {job.elapsed():.0f}s", expanded=job.running):
+            st.progress(job.progress, text=job.status)
+            for (pipeline, stage), m in job.stages.items():
+                if stage != "list":
+                    st.caption(f"{pipeline}/{stage}: {m['items_per_s']:.1f} items/s · "
+                               f"{m['bytes_per_s'] / 1e6:.1f} MB/s · queue {m['queue_depth']} · failed {m['failed']}"
+                               + (" 🐢" if m.get("bottleneck") else ""))
+            st.code(job.log_text(LOG_LINES_SHOWN) or "…")
+
+jobs_panel()
@@ -1,13 +1,52 @@
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QPushButton, QLabel, QVBoxLayout, QFileDialog, QFrame, QTextEdit, QProgressBar, QInputDialog
+    QApplication, QWidget, QPushButton, QLabel, QVBoxLayout, QFileDialog, QFrame, QPlainTextEdit, QProgressBar, QInputDialog
 )
-from PySide6.QtCore import QThread, Signal, QObject, Qt
+from PySide6.QtCore import QThread, Signal, QObject, Qt, QTimer
+from collections import deque
+import importlib
+import threading
+import html
 import sys
 import os
 
-from agent1_duplicates import run_agent1
-from agent2_heavy_files import run_agent2
-from agent3_whatsapp_backup import run_agent3
+# Agents are plugins: each module (with Pillow, googleapiclient, ffmpeg, ...) is
+# imported the first time its button is used, on the worker thread, so the
+# window comes up without them. bench_startup.py keeps it that way.
+# PyInstaller cannot see these imports: pass --hidden-import for each module
+# (and for review_view, the duplicate review screen, loaded the same way).
+AGENT_PLUGINS = {
+    "agent1": ("agent1_duplicates", "run_agent1"),
+    "agent1_scan": ("agent1_duplicates", "scan_duplicates"),
+    "agent1_delete": ("agent1_duplicates", "delete_reviewed"),
+    "agent1_thumbnail": ("agent1_duplicates", "fetch_thumbnail"),
+    "agent2": ("agent2_heavy_files", "run_agent2"),
+    "agent2_resume": ("agent2_heavy_files", "resume_agent2"),
+    "agent3": ("agent3_whatsapp_backup", "run_agent3"),
+    "agent3_all": ("agent3_whatsapp_backup", "run_agent3_all_devices"),
+}
+_loaded_agents = {}
+_agents_lock = threading.Lock()
+
+# agent2's video modes (agent2_heavy_files.VIDEO_MODES); the button cycles through them
+VIDEO_MODE_LABELS = {
+    "copy": "🎞 Drive videos: move as they are",
+    "shrink": "🎞 Drive videos: shrink onto USB",
+    "replace": "🎞 Drive videos: shrink and replace in Drive",
+}
+
+PROFILE_DIR = "profiles"   # per-run flamegraph and allocation reports while profiling is on
+
+LOG_BUFFER_LINES = 20000   # pending lines between UI flushes; oldest are dropped past this
+LOG_MAX_BLOCKS = 5000      # lines kept in the log view
+LOG_FLUSH_MS = 50
+LOG_BATCH_LINES = 2000     # most lines rendered per flush
+
+def load_agent(name):
+    with _agents_lock:
+        if name not in _loaded_agents:
+            module_name, function_name = AGENT_PLUGINS[name]
+            _loaded_agents[name] = getattr(importlib.import_module(module_name), function_name)
+        return _loaded_agents[name]
 
 def get_adb_path():
     if hasattr(sys, '_MEIPASS'):
@@ -15,27 +54,91 @@ def get_adb_path():
     else:
         return os.path.join(os.path.dirname(__file__), 'adb', 'adb.exe')
 
+class LogStreamer(QObject):
+    # Agents append lines from their own threads; a UI-thread timer drains the
+    # ring buffer and emits them as one batch, so the view updates at a fixed rate.
+    batch = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buffer = deque(maxlen=LOG_BUFFER_LINES)
+        self.dropped = 0
+        self.timer = QTimer(self)
+        self.timer.setInterval(LOG_FLUSH_MS)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def push(self, line):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(line)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        lines = []
+        if self.dropped:
+            lines.append(f"… {self.dropped} log lines skipped …")
+            self.dropped = 0
+        while self.buffer and len(lines) < LOG_BATCH_LINES:
+            lines.append(self.buffer.popleft())
+        self.batch.emit("\n".join(lines))
+
+    def drain(self):
+        while self.buffer or self.dropped:
+            self.flush()
+
 class AgentWorker(QObject):
     finished = Signal(str)
     progress = Signal(int)
     status = Signal(str)
+    event = Signal(dict)
 
-    def __init__(self, agent_function):
+    def __init__(self, agent_function, log_streamer):
         super().__init__()
         self.agent_function = agent_function
+        self.log_streamer = log_streamer
+
+    def on_event(self, event):
+        if event["type"] == "log":
+            device = event.get("device")
+            self.log_streamer.push(f"[{device}] {event['message']}" if device else event["message"])
+        elif event["type"] == "stage":
+            self.event.emit(event)
 
     def run(self):
-        logs = self.agent_function(self.progress.emit, self.status.emit)
+        try:
+            logs = self.agent_function(self.progress.emit, self.status.emit, self.on_event)
+        except ImportError as e:
+            # A plugin whose dependencies are missing fails here, not at startup
+            self.log_streamer.push(f"❌ Could not load agent: {e}")
+            logs = ""
         self.finished.emit(logs)
 
+class DeviceRelay(QObject):
+    progress = Signal(str, int, str)
+
+class ReviewRelay(QObject):
+    found = Signal(object)
+
 class GDriveCleanerApp(QWidget):
     def __init__(self):
         super().__init__()
         self.threads = []
+        self.stage_metrics = {}
+        self.device_rows = {}
+        self.device_relay = DeviceRelay()
+        self.device_relay.progress.connect(self.update_device_progress)
+        self.review_relay = ReviewRelay()
+        self.review_relay.found.connect(self.open_review)
+        self.review_window = None
 
         self.adb_path = get_adb_path()
         self.db_path = "/sdcard/Android/media/com.whatsapp/WhatsApp/Backups/Databases"
         self.media_path = "/sdcard/Android/media/com.whatsapp/WhatsApp/Media"
+        self.video_deadline = None
+        self.video_mode = "copy"
+        self.profile_dir = None
 
         self.setWindowTitle("📦 GDrive Space Fixer")
         self.setGeometry(100, 100, 700, 600)
@@ -64,7 +167,7 @@ class GDriveCleanerApp(QWidget):
                 font-size: 15px;
                 color: #FBF3F2;
             }
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #FBF3F2;
                 color: #032539;
                 border-radius: 10px;
@@ -84,10 +187,22 @@ class GDriveCleanerApp(QWidget):
         self.button1.clicked.connect(self.run_agent1)
         layout.addWidget(self.button1)
 
+        self.review_button = QPushButton("🔎 Review Duplicates Before Deleting")
+        self.review_button.clicked.connect(self.scan_for_review)
+        layout.addWidget(self.review_button)
+
         self.button2 = QPushButton("📤 Move & Compress Heavy Files to USB")
         self.button2.clicked.connect(self.pick_folder_and_run_agent2)
         layout.addWidget(self.button2)
 
+        self.video_mode_button = QPushButton(VIDEO_MODE_LABELS[self.video_mode])
+        self.video_mode_button.clicked.connect(self.cycle_video_mode)
+        layout.addWidget(self.video_mode_button)
+
+        self.button2_resume = QPushButton("⏯ Resume Agent 2")
+        self.button2_resume.clicked.connect(self.resume_agent2)
+        layout.addWidget(self.button2_resume)
+
         # Hidden by default → Shown only when Agent 3 is triggered
         self.db_button = QPushButton("📄 Set WhatsApp DB Path")
         self.db_button.clicked.connect(self.set_db_path)
@@ -99,10 +214,23 @@ class GDriveCleanerApp(QWidget):
         self.media_button.hide()
         layout.addWidget(self.media_button)
 
+        self.deadline_button = QPushButton("⏱ Set Video Time Budget")
+        self.deadline_button.clicked.connect(self.set_video_deadline)
+        self.deadline_button.hide()
+        layout.addWidget(self.deadline_button)
+
         self.button3 = QPushButton("📱 WhatsApp Backup Shrinker")
         self.button3.clicked.connect(self.prepare_and_run_agent3)
         layout.addWidget(self.button3)
 
+        self.button3_all = QPushButton("📱📱 Back Up All Connected Phones")
+        self.button3_all.clicked.connect(self.run_agent3_all_devices)
+        layout.addWidget(self.button3_all)
+
+        self.profile_button = QPushButton("🔬 Profiling: off")
+        self.profile_button.clicked.connect(self.toggle_profiling)
+        layout.addWidget(self.profile_button)
+
         separator = QFrame()
         separator.setFrameShape(QFrame.HLine)
         separator.setStyleSheet("color: #1C768F;")
@@ -117,14 +245,28 @@ class GDriveCleanerApp(QWidget):
         self.progress.setValue(0)
         layout.addWidget(self.progress)
 
-        self.log_output = QTextEdit()
+        self.device_layout = QVBoxLayout()
+        layout.addLayout(self.device_layout)
+
+        self.metrics_label = QLabel("")
+        self.metrics_label.setObjectName("statusLabel")
+        layout.addWidget(self.metrics_label)
+
+        self.log_output = QPlainTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.setMaximumBlockCount(LOG_MAX_BLOCKS)
         layout.addWidget(self.log_output)
 
+        self.log_streamer = LogStreamer(self)
+        self.log_streamer.batch.connect(self.append_log_batch)
+
         self.setLayout(layout)
 
     def append_log(self, text, color="#032539"):
-        self.log_output.append(f'<span style="color:{color};">{text}</span>')
+        self.log_output.appendHtml(f'<span style="color:{color};">{html.escape(text)}</span>')
+
+    def append_log_batch(self, text):
+        self.log_output.appendPlainText(text)
 
     def update_status(self, text):
         self.status_label.setText(text)
@@ -132,17 +274,70 @@ class GDriveCleanerApp(QWidget):
     def update_progress(self, value):
         self.progress.setValue(value)
 
+    def handle_agent_event(self, event):
+        if event["type"] != "stage":
+            return
+        self.stage_metrics[(event["pipeline"], event["stage"])] = event
+        lines = []
+        for (pipeline, stage), m in self.stage_metrics.items():
+            if stage == "list":
+                continue
+            # The pipeline marks the stage that held it up most (Pipeline.bottleneck)
+            marker = " 🐢" if m.get("bottleneck") else ""
+            lines.append(f"{pipeline}/{stage}: {m['items_per_s']:.1f} items/s · {m['bytes_per_s'] / 1e6:.1f} MB/s · "
+                         f"queue {m['queue_depth']} · failed {m['failed']}{marker}")
+        self.metrics_label.setText("\n".join(lines[-6:]))
+
     def run_agent1(self):
         self.append_log("🔍 Starting Agent 1...", "#1C768F")
         self.update_status("🧹 Running Agent 1...")
-        self.start_thread(lambda p, s: run_agent1(), self.handle_agent1_result)
+        self.start_thread(lambda p, s, e: load_agent("agent1")(p, s, e, profile_dir=self.profile_dir), self.handle_agent1_result)
+
+    def scan_for_review(self):
+        self.append_log("🔎 Scanning duplicates for review...", "#1C768F")
+        self.update_status("🔎 Scanning for duplicates...")
+        self.start_thread(lambda p, s, e: load_agent("agent1_scan")(p, s, e, on_result=self.review_relay.found.emit,
+                                                                      profile_dir=self.profile_dir),
+                          self.handle_scan_result)
+
+    def open_review(self, pairs):
+        if not pairs:
+            self.append_log("✅ No duplicates to review.", "#FA991C")
+            return
+        review_view = importlib.import_module("review_view")
+        self.review_window = review_view.DuplicateReviewWindow(pairs, load_agent("agent1_thumbnail"), self)
+        self.review_window.delete_requested.connect(self.delete_reviewed)
+        self.review_window.show()
+
+    def delete_reviewed(self, files):
+        self.append_log(f"🗑 Deleting {len(files)} reviewed duplicates...", "#1C768F")
+        self.update_status("🧹 Deleting selected duplicates...")
+        self.start_thread(lambda p, s, e: load_agent("agent1_delete")(files, p, s, e, profile_dir=self.profile_dir), self.handle_agent1_result)
 
     def pick_folder_and_run_agent2(self):
         folder = QFileDialog.getExistingDirectory(self, "Select USB Folder")
         if folder:
             self.append_log(f"📂 Selected Folder: {folder}", "#1C768F")
             self.update_status("📤 Running Agent 2...")
-            self.start_thread(lambda p, s: run_agent2(folder, p, s), self.handle_agent2_result)
+            video_mode = self.video_mode
+            self.start_thread(lambda p, s, e: load_agent("agent2")(folder, p, s, e, video_mode, profile_dir=self.profile_dir),
+                              self.handle_agent2_result)
+
+    def cycle_video_mode(self):
+        modes = list(VIDEO_MODE_LABELS)
+        self.video_mode = modes[(modes.index(self.video_mode) + 1) % len(modes)]
+        self.video_mode_button.setText(VIDEO_MODE_LABELS[self.video_mode])
+
+    def toggle_profiling(self):
+        self.profile_dir = None if self.profile_dir else PROFILE_DIR
+        self.profile_button.setText(f"🔬 Profiling: {'on' if self.profile_dir else 'off'}")
+        if self.profile_dir:
+            self.append_log(f"🔬 Runs started now are profiled into {os.path.abspath(self.profile_dir)}", "#1C768F")
+
+    def resume_agent2(self):
+        self.append_log("⏯ Resuming Agent 2...", "#1C768F")
+        self.update_status("📤 Resuming Agent 2...")
+        self.start_thread(lambda p, s, e: load_agent("agent2_resume")(p, s, e, profile_dir=self.profile_dir), self.handle_agent2_result)
 
     def set_db_path(self):
         text, ok = QInputDialog.getText(self, "Enter WhatsApp DB Path", "Example: /sdcard/Android/media/com.whatsapp/WhatsApp/Backups/Databases", text=self.db_path)
@@ -156,20 +351,55 @@ class GDriveCleanerApp(QWidget):
             self.media_path = text
             self.append_log(f"🖼 Media Path set: {self.media_path}", "#1C768F")
 
+    def set_video_deadline(self):
+        minutes, ok = QInputDialog.getInt(self, "Video Time Budget", "Finish video encoding within N minutes (0 = no limit):",
+                                          value=self.video_deadline or 0, minValue=0, maxValue=24 * 60)
+        if ok:
+            self.video_deadline = minutes or None
+            self.append_log(f"⏱ Video time budget: {f'{minutes} min' if minutes else 'none'}", "#1C768F")
+
     def prepare_and_run_agent3(self):
         self.db_button.show()
         self.media_button.show()
+        self.deadline_button.show()
         self.append_log("🔄 Starting Agent 3...", "#1C768F")
         self.update_status("📱 Running Agent 3...")
-        self.start_thread(lambda p, s: run_agent3(self.adb_path, self.db_path, self.media_path, p, s), self.handle_agent3_result)
+        self.start_thread(lambda p, s, e: load_agent("agent3")(self.adb_path, self.db_path, self.media_path, p, s, self.video_deadline, on_event=e, profile_dir=self.profile_dir), self.handle_agent3_result)
+
+    def run_agent3_all_devices(self):
+        for label, bar in self.device_rows.values():
+            label.deleteLater()
+            bar.deleteLater()
+        self.device_rows = {}
+        self.append_log("🔄 Starting Agent 3 on all connected devices...", "#1C768F")
+        self.update_status("📱 Running Agent 3 on all devices...")
+        self.start_thread(
+            lambda p, s, e: load_agent("agent3_all")(self.adb_path, self.db_path, self.media_path, p, s,
+                                                        self.device_relay.progress.emit, self.video_deadline, on_event=e,
+                                                        profile_dir=self.profile_dir),
+            self.handle_agent3_result)
+
+    def update_device_progress(self, serial, value, text):
+        if serial not in self.device_rows:
+            label = QLabel(f"📱 {serial}")
+            bar = QProgressBar()
+            bar.setMaximum(100)
+            self.device_layout.addWidget(label)
+            self.device_layout.addWidget(bar)
+            self.device_rows[serial] = (label, bar)
+        label, bar = self.device_rows[serial]
+        bar.setValue(value)
+        if text:
+            label.setText(f"📱 {serial}: {text}")
 
     def start_thread(self, function, callback):
         thread = QThread(self)
-        worker = AgentWorker(function)
+        worker = AgentWorker(function, self.log_streamer)
         worker.moveToThread(thread)
 
         worker.progress.connect(self.update_progress)
         worker.status.connect(self.update_status)
+        worker.event.connect(self.handle_agent_event)
 
         thread.started.connect(worker.run)
         worker.finished.connect(callback)
@@ -183,27 +413,36 @@ class GDriveCleanerApp(QWidget):
         thread.start()
 
     def handle_agent1_result(self, logs):
+        self.log_streamer.drain()
         self.append_log("✅ Agent 1 Completed.", "#FA991C")
-        self.append_log(logs, "#032539")
         self.update_status("✅ Done.")
         self.progress.setValue(100)
 
+    def handle_scan_result(self, logs):
+        self.log_streamer.drain()
+        self.update_status("🔎 Review the duplicates, then delete the ones you chose.")
+        self.progress.setValue(100)
+
     def handle_agent2_result(self, logs):
+        self.log_streamer.drain()
         self.append_log("✅ Agent 2 Completed.", "#FA991C")
-        self.append_log(logs, "#032539")
         self.update_status("✅ Done.")
         self.progress.setValue(100)
 
     def handle_agent3_result(self, logs):
+        self.log_streamer.drain()
         self.append_log("✅ Agent 3 Completed.", "#FA991C")
-        self.append_log(logs, "#032539")
         self.update_status("✅ Done.")
         self.progress.setValue(100)
         self.db_button.hide()
         self.media_button.hide()
+        self.deadline_button.hide()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = GDriveCleanerApp()
     window.show()
+    if "--startup-check" in sys.argv:
+        # Used by bench_startup.py: quit as soon as the event loop has shown the window
+        QTimer.singleShot(0, app.quit)
     sys.exit(app.exec())
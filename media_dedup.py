@@ -0,0 +1,81 @@
+import os
+import mmap
+import hashlib
+from collections import defaultdict
+
+from agent_events import log
+
+EDGE_BYTES = 64 * 1024
+
+def edge_hash(path, size):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(EDGE_BYTES))
+        if size > 2 * EDGE_BYTES:
+            f.seek(-EDGE_BYTES, os.SEEK_END)
+            h.update(f.read(EDGE_BYTES))
+    return h.digest()
+
+def full_hash(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.blake2b(mm, digest_size=32).digest()
+
+def refine(groups, key_func):
+    refined = []
+    for paths in groups:
+        buckets = defaultdict(list)
+        for path in paths:
+            try:
+                buckets[key_func(path)].append(path)
+            except OSError:
+                continue
+        refined.extend(b for b in buckets.values() if len(b) > 1)
+    return refined
+
+def find_exact_duplicates(paths):
+    # Stage 1: size. Files already hardlinked together are collapsed up front.
+    by_size = defaultdict(dict)
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if st.st_size:
+            by_size[st.st_size].setdefault((st.st_dev, st.st_ino), path)
+    groups = [list(inodes.values()) for inodes in by_size.values() if len(inodes) > 1]
+
+    # Stage 2: first + last 64 KB. Stage 3: full content through mmap.
+    groups = refine(groups, lambda p: edge_hash(p, os.path.getsize(p)))
+    groups = refine(groups, full_hash)
+    return [sorted(g) for g in groups]
+
+def link_duplicate(primary, duplicate):
+    temp_path = duplicate + ".tmp-link"
+    os.link(primary, temp_path)
+    os.replace(temp_path, duplicate)
+
+def dedupe_media(media_root, folders=("WhatsApp Images", "WhatsApp Video"), journal=None):
+    paths = []
+    for folder in folders:
+        for root, _, files in os.walk(os.path.join(media_root, folder)):
+            paths.extend(os.path.join(root, f) for f in files if not f.endswith(".tmp-link"))
+
+    groups = find_exact_duplicates(paths)
+    linked = saved = 0
+    for group in groups:
+        primary = group[0]
+        size = os.path.getsize(primary)
+        for duplicate in group[1:]:
+            try:
+                link_duplicate(primary, duplicate)
+            except OSError as e:
+                log(f"⚠ Could not hardlink {os.path.basename(duplicate)}: {e}")
+                continue
+            if journal:
+                journal.record(journal.key_for(duplicate), "linked", primary=journal.key_for(primary))
+            linked += 1
+            saved += size
+
+    log(f"♻️ Hardlinked {linked} duplicate media files in {len(groups)} groups ({saved / (1024 * 1024):.1f} MB).")
+    return groups
@@ -0,0 +1,364 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+from agent_events import log, current_run
+
+# Small task-graph runtime shared by the agents. A pipeline is a source stage
+# followed by stages connected with bounded asyncio queues:
+#
+#   Pipeline("agent1", [
+#       Stage("list", lambda: list_files(service), source=True),
+#       Stage("hash", find_duplicates, collect=True),
+#       Stage("delete", lambda f: delete_file(service, f)),
+#   ]).run_sync(progress_callback)
+#
+# A stage function returns the item to pass on, or None to drop it. Source and
+# collect stages return an iterable; collect stages get every upstream item at once.
+# Batch stages (batch=N) get a list of up to N items, the next one plus whatever is
+# already waiting, and return a list with one result (or None) per item.
+# Per-item failures are counted and logged; a failing source or collect stage
+# drains the pipeline and its exception is re-raised from run().
+# When the current run has a profiler (RunRecorder(profile_dir=...)), thread
+# stages are tagged for it and each stage is bracketed by allocation snapshots;
+# otherwise none of that code runs.
+
+_DONE = object()
+PROGRESS_INTERVAL = 0.2
+METRICS_INTERVAL = 1.0
+
+class ItemFailed(Exception):
+    # Raised by a stage that has already reported the failure; counted, not logged again
+    pass
+
+class _Interrupted(BaseException):
+    # Carries a SystemExit/KeyboardInterrupt out of a stage task: raised as-is inside a
+    # task it stops the event loop at once, before run() can clean up the other tasks
+    def __init__(self, exc):
+        super().__init__(exc)
+        self.exc = exc
+
+async def _guarded(coro):
+    try:
+        return await coro
+    except (SystemExit, KeyboardInterrupt) as e:
+        raise _Interrupted(e) from None
+
+class StageStats:
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.received = 0
+        self.completed = 0
+        self.failed = 0
+        self.emitted = 0
+        self.in_flight = 0
+        self.bytes = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.busy = 0.0            # seconds spent in the stage function, summed over workers
+        self.started = None
+        self.ended = None
+        self.finished = False
+
+    def start(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def as_dict(self):
+        return {k: v for k, v in self.__dict__.items()}
+
+    def metrics(self):
+        # wall_s runs from the stage's first item to its end, waits on upstream included;
+        # busy_s is only the time its workers spent working, so capacity_* is what the
+        # stage could do if it never waited, and the largest busy_s is the bottleneck
+        wall = ((self.ended or time.perf_counter()) - self.started) if self.started else 0.0
+        busy = self.busy / self.workers
+        rate = lambda n: n / wall if wall > 0 else 0.0
+        capacity = lambda n: n / busy if busy > 0 else 0.0
+        return {
+            "stage": self.name, "wall_s": round(wall, 3), "busy_s": round(busy, 3),
+            "items": self.completed, "items_per_s": round(rate(self.completed), 3),
+            "bytes": self.bytes, "bytes_per_s": round(rate(self.bytes), 1),
+            "capacity_items_per_s": round(capacity(self.completed), 3),
+            "capacity_bytes_per_s": round(capacity(self.bytes), 1),
+            "queue_depth": self.queue_depth, "max_queue_depth": self.max_queue_depth,
+            "in_flight": self.in_flight, "failed": self.failed, "finished": self.finished,
+        }
+
+class Stage:
+    def __init__(self, name, func, executor="thread", concurrency=1, queue_size=64,
+                 source=False, collect=False, weight=1.0, measure=None, batch=None):
+        # executor: "thread", "process", "async" (func is a coroutine) or an Executor to share
+        # measure: item → bytes, for the stage's bytes/sec
+        # batch: call func with lists of up to this many items instead of one at a time
+        self.name = name
+        self.func = func
+        self.executor = executor
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.source = source
+        self.collect = collect
+        self.weight = weight
+        self.measure = measure
+        self.batch = batch
+        self.stats = StageStats(name, 1 if source or collect else max(1, concurrency))
+
+class Pipeline:
+    def __init__(self, name, stages):
+        if not stages or not stages[0].source:
+            raise ValueError("A pipeline must start with a source stage.")
+        self.name = name
+        self.stages = stages
+        self.results = []
+        self.errors = []
+        self._queues = []
+        self._thread_pool = None
+        self._process_pool = None
+        self._profiler = None
+
+    def _executor_for(self, stage):
+        if isinstance(stage.executor, Executor):
+            return stage.executor
+        if stage.executor == "process":
+            if self._process_pool is None:
+                workers = sum(s.concurrency for s in self.stages if s.executor == "process")
+                self._process_pool = ProcessPoolExecutor(max_workers=max(1, workers))
+            return self._process_pool
+        if self._thread_pool is None:
+            workers = sum(s.concurrency for s in self.stages if s.executor == "thread")
+            self._thread_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=self.name)
+        return self._thread_pool
+
+    def _profiled(self, stage, func):
+        return self._profiler.wrap(f"{self.name}.{stage.name}", func)
+
+    async def _call(self, stage, *args):
+        start = time.perf_counter()
+        try:
+            if stage.executor == "async":
+                return await stage.func(*args)
+            loop = asyncio.get_running_loop()
+            executor = self._executor_for(stage)
+            if isinstance(executor, ProcessPoolExecutor):
+                call = functools.partial(stage.func, *args)
+            else:
+                # Threads inherit the caller's context (current run, log sinks, ...)
+                func = self._profiled(stage, stage.func) if self._profiler else stage.func
+                call = functools.partial(contextvars.copy_context().run, func, *args)
+            return await loop.run_in_executor(executor, call)
+        finally:
+            stage.stats.busy += time.perf_counter() - start
+
+    async def _emit(self, stage, outbox, item):
+        stage.stats.emitted += 1
+        if outbox is None:
+            self.results.append(item)
+        else:
+            await outbox.put(item)
+
+    async def _run_source(self, stage, outbox):
+        stats = stage.stats
+        stats.start()
+        stats.in_flight = 1
+        try:
+            items = await self._call(stage)
+            if isinstance(items, (list, tuple, set)) or items is None:
+                for item in items or []:
+                    await self._emit(stage, outbox, item)
+            else:
+                # Lazy sources (e.g. paged listings) are advanced off the event loop, in the
+                # caller's context so their log lines still reach the current run
+                iterator = iter(items)
+                loop = asyncio.get_running_loop()
+                pool = self._executor_for(stage)
+                step = self._profiled(stage, next) if self._profiler else next
+                advance = functools.partial(contextvars.copy_context().run, step, iterator, _DONE)
+                while True:
+                    start = time.perf_counter()
+                    item = await loop.run_in_executor(pool, advance)
+                    stats.busy += time.perf_counter() - start
+                    if item is _DONE:
+                        break
+                    await self._emit(stage, outbox, item)
+            stats.completed = 1
+        except Exception as e:
+            stats.failed = 1
+            self.errors.append(e)
+        stats.in_flight = 0
+
+    async def _run_collect(self, stage, inbox, outbox):
+        stats = stage.stats
+        items = []
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                break
+            stats.start()
+            stats.received += 1
+            items.append(item)
+        stats.start()
+        stats.in_flight = len(items)
+        try:
+            results = await self._call(stage, items)
+            stats.completed = len(items)
+            for item in results or []:
+                await self._emit(stage, outbox, item)
+        except Exception as e:
+            stats.failed = len(items)
+            self.errors.append(e)
+        stats.in_flight = 0
+
+    async def _next_items(self, stage, inbox):
+        # The next item, plus for batch stages whatever is already queued behind it;
+        # [] once upstream is done
+        items = []
+        while True:
+            item = await inbox.get() if not items else inbox.get_nowait()
+            if item is _DONE:
+                await inbox.put(_DONE)  # let sibling workers see it too
+                return items
+            items.append(item)
+            if not stage.batch or len(items) >= stage.batch or inbox.empty():
+                return items
+
+    async def _run_worker(self, stage, inbox, outbox):
+        stats = stage.stats
+        while items := await self._next_items(stage, inbox):
+            stats.start()
+            stats.received += len(items)
+            stats.in_flight += len(items)
+            try:
+                if stage.batch:
+                    results = await self._call(stage, items)
+                else:
+                    results = [await self._call(stage, items[0])]
+                stats.completed += len(items)
+                if stage.measure:
+                    stats.bytes += sum(stage.measure(item) or 0 for item in items)
+                for result in results:
+                    if result is not None:
+                        await self._emit(stage, outbox, result)
+            except ItemFailed:
+                stats.failed += len(items)
+            except Exception as e:
+                stats.failed += len(items)
+                log(f"⚠ {stage.name} failed: {e}")
+            finally:
+                stats.in_flight -= len(items)
+
+    async def _run_stage(self, index, queues):
+        stage = self.stages[index]
+        inbox = queues[index - 1] if index else None
+        outbox = queues[index] if index < len(self.stages) - 1 else None
+        if self._profiler:
+            self._profiler.stage_started(f"{self.name}.{stage.name}")
+        if stage.source:
+            await self._run_source(stage, outbox)
+        elif stage.collect:
+            await self._run_collect(stage, inbox, outbox)
+        else:
+            workers = [asyncio.ensure_future(_guarded(self._run_worker(stage, inbox, outbox)))
+                       for _ in range(max(1, stage.concurrency))]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                # gather() leaves the siblings of a failed worker running
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        stage.stats.ended = time.perf_counter()
+        stage.stats.finished = True
+        if self._profiler:
+            self._profiler.stage_ended(f"{self.name}.{stage.name}")
+        if outbox is not None:
+            await outbox.put(_DONE)
+
+    def progress(self):
+        # Each stage's share is done / items it will see; that total is only
+        # known once the upstream stage has finished, until then it grows.
+        total_weight = sum(s.weight for s in self.stages)
+        done = 0.0
+        upstream = None
+        for stage in self.stages:
+            stats = stage.stats
+            if stats.finished:
+                fraction = 1.0
+            elif stage.source:
+                fraction = 0.0
+            else:
+                expected = max(upstream.emitted, stats.received, 1)
+                fraction = (stats.completed + stats.failed) / expected
+            done += stage.weight * min(fraction, 1.0)
+            upstream = stats
+        return done / total_weight
+
+    def stats(self):
+        return {stage.name: stage.stats.as_dict() for stage in self.stages}
+
+    def publish_metrics(self, final=False):
+        run = current_run()
+        slowest = self.bottleneck()
+        for index, stage in enumerate(self.stages):
+            stats = stage.stats
+            if index and self._queues:
+                stats.queue_depth = self._queues[index - 1].qsize()
+                stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+            if run:
+                run.stage({"pipeline": self.name, **stats.metrics(), "bottleneck": stage.name == slowest}, final=final)
+
+    def bottleneck(self):
+        # The stage whose workers were busy longest: every item passes through all of
+        # them, so the pipeline can go no faster than it. Waiting on upstream is not counted.
+        busy = [s.stats for s in self.stages[1:] if s.stats.completed]
+        return max(busy, key=lambda st: st.busy / st.workers).name if busy else None
+
+    async def run(self, progress_callback=None):
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages[1:]]
+        self._queues = queues
+        self._profiler = getattr(current_run(), "profiler", None)
+        tasks = [asyncio.ensure_future(_guarded(self._run_stage(i, queues))) for i in range(len(self.stages))]
+
+        async def report():
+            last_metrics = time.perf_counter()
+            while True:
+                if progress_callback:
+                    progress_callback(self.progress())
+                if time.perf_counter() - last_metrics >= METRICS_INTERVAL:
+                    self.publish_metrics()
+                    last_metrics = time.perf_counter()
+                await asyncio.sleep(PROGRESS_INTERVAL)
+
+        reporter = asyncio.ensure_future(report())
+        try:
+            await asyncio.gather(*tasks)
+        except _Interrupted as interrupted:
+            raise interrupted.exc
+        finally:
+            for task in tasks:
+                task.cancel()
+            reporter.cancel()
+            # Wait for the cancellations to land, so no task is left pending behind us
+            await asyncio.gather(*tasks, reporter, return_exceptions=True)
+            self.publish_metrics(final=True)
+            if self._thread_pool:
+                self._thread_pool.shutdown(wait=False)
+            if self._process_pool:
+                self._process_pool.shutdown(wait=False)
+        if self.errors:
+            raise self.errors[0]
+        if progress_callback:
+            progress_callback(1.0)
+        return self.results
+
+    def run_sync(self, progress_callback=None):
+        return asyncio.run(self.run(progress_callback))
+
+
+def progress_range(progress_callback, start, end):
+    # Maps a pipeline's 0..1 progress onto a slice of an agent's 0..100 bar
+    if not progress_callback:
+        return None
+    return lambda fraction: progress_callback(start + int((end - start) * fraction))
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import statistics
+import argparse
+from collections import defaultdict
+
+from job_journal import atomic_write
+from agent_events import log, read_stage_summaries, METRICS_LOG
+from adb_devices import list_devices, list_remote_tree
+from drive_records import list_records
+
+# Dry-run plans built from metadata only: Drive file listings for agent1/agent2,
+# adb shell listings for agent3. Nothing is downloaded, written or deleted.
+# Runtimes come from the throughput the agents actually measured (agent_metrics.jsonl)
+# and the video encode cost model; the defaults below are used until those exist.
+# Each step belongs to a pipeline stage; the stages of one phase (one pipeline, or
+# the part of it before a collect stage) run at the same time, so a phase takes as
+# long as its busiest stage, and phases run one after another.
+#
+#   python planner.py agent2 --out plan.json
+#   python planner.py agent3 --serial R58M12ABCDE --run-if-worth-it
+
+MB = 1024 * 1024
+MIN_SAVINGS_BYTES = 200 * MB         # below this a run is not worth it
+MIN_SAVINGS_PER_MINUTE = 20 * MB     # ... nor if it frees less than this per minute of runtime
+
+# Fallback throughput until agent_metrics.jsonl has measurements
+DEFAULT_RATES = {
+    "drive_download_bps": 4 * MB,
+    "drive_upload_bps": 2 * MB,
+    "drive_deletes_per_s": 4.0,
+    "images_per_s": 10.0,
+    "adb_pull_bps": 25 * MB,
+    "media_transform_bps": 6 * MB,
+}
+# Size after compression, relative to the original
+JPEG_QUALITY_RATIO = 0.7                # agent2: re-save at quality 85
+WHATSAPP_IMAGE_RATIO = 0.35             # agent3: 720 px wide
+WHATSAPP_VIDEO_RATIO = 0.5              # agent3: 720 px wide when there is no cost model
+WHATSAPP_VIDEO_BYTES_PER_FRAME = 6500   # ~1.5 Mbit/s at 30 fps, to turn bytes into frames
+
+def measured_rate(summaries, pipeline, stage, key, default):
+    # The stage's capacity (per second its workers were busy) when it was recorded;
+    # older summaries only have the wall-clock rate, which counts waits on upstream too
+    ours = [s for s in summaries if s.get("pipeline") == pipeline and s.get("stage") == stage]
+    for field in (f"capacity_{key}", key):
+        values = [s[field] for s in ours if s.get(field)]
+        if values:
+            return statistics.median(values)
+    return default
+
+def step(name, items, size, seconds, phase, stage):
+    return {"step": name, "items": items, "bytes": size, "seconds": round(seconds, 1), "phase": phase, "stage": stage}
+
+def estimate_seconds(steps):
+    # Steps in one stage share its workers and add up; a phase lasts as long as its
+    # busiest stage; phases add up
+    stages = defaultdict(float)
+    for s in steps:
+        stages[(s["phase"], s["stage"])] += s["seconds"]
+    phases = defaultdict(float)
+    for (phase, _), seconds in stages.items():
+        phases[phase] = max(phases[phase], seconds)
+    return sum(phases.values())
+
+def is_worth_it(plan, min_savings=MIN_SAVINGS_BYTES, min_per_minute=MIN_SAVINGS_PER_MINUTE):
+    return plan["savings_bytes"] >= min_savings and plan["savings_per_minute"] >= min_per_minute
+
+def finish_plan(agent, steps, download_bytes, delete_bytes, compression_savings, savings, notes=()):
+    seconds = estimate_seconds(steps)
+    plan = {
+        "agent": agent, "created": time.time(),
+        "download_bytes": download_bytes, "delete_bytes": delete_bytes,
+        "compression_savings_bytes": int(compression_savings), "savings_bytes": int(savings),
+        "estimated_seconds": round(seconds, 1), "savings_per_minute": int(savings / max(seconds / 60, 1 / 60)),
+        "steps": steps, "notes": list(notes),
+    }
+    plan["worth_it"] = is_worth_it(plan)
+    return plan
+
+def plan_agent1(service, metrics_path=METRICS_LOG):
+    from agent1_duplicates import find_duplicates, DUPLICATES_FOLDER_ID
+    summaries = read_stage_summaries(metrics_path, "agent1")
+    files = list_records(service, f"'{DUPLICATES_FOLDER_ID}' in parents and mimeType contains 'image/' and trashed = false",
+                         "id, name, mimeType, size, md5Checksum")
+    duplicates = find_duplicates(files)
+    delete_bytes = sum(f.size for f in duplicates)
+    rate = measured_rate(summaries, "agent1", "delete", "items_per_s", DEFAULT_RATES["drive_deletes_per_s"])
+    steps = [step("delete duplicates", len(duplicates), delete_bytes, len(duplicates) / rate, "agent1", "delete")]
+    return finish_plan("agent1", steps, 0, delete_bytes, 0, delete_bytes)
+
+def plan_agent2(service, metrics_path=METRICS_LOG):
+    from agent2_heavy_files import LARGE_FILE_BYTES
+    summaries = read_stage_summaries(metrics_path, "agent2")
+    images = list(list_records(service, "mimeType contains 'image/' and trashed = false",
+                               "id, name, mimeType, size, imageMediaMetadata(width)"))
+    large = [f for f in list_records(service, "mimeType != 'application/vnd.google-apps.folder' and trashed = false",
+                                     "id, name, mimeType, size") if f.size > LARGE_FILE_BYTES]
+
+    image_bytes = sum(f.size for f in images)
+    compressed = 0.0
+    for f in images:
+        scale = min(1.0, 1920 / f.width) ** 2 if f.width else 1.0
+        compressed += f.size * scale * JPEG_QUALITY_RATIO
+    large_bytes = sum(f.size for f in large)
+
+    rate = lambda pipeline, stage, key, default: measured_rate(summaries, pipeline, stage, key, DEFAULT_RATES[default])
+    steps = [
+        step("download images", len(images), image_bytes,
+             image_bytes / rate("agent2-images", "download", "bytes_per_s", "drive_download_bps"),
+             "agent2-images", "download"),
+        step("compress images", len(images), image_bytes,
+             len(images) / rate("agent2-images", "transform", "items_per_s", "images_per_s"),
+             "agent2-images", "transform"),
+        step("download large files", len(large), large_bytes,
+             large_bytes / rate("agent2-large", "download", "bytes_per_s", "drive_download_bps"),
+             "agent2-large", "download"),
+        step("delete large files", len(large), large_bytes,
+             len(large) / rate("agent2-large", "delete", "items_per_s", "drive_deletes_per_s"),
+             "agent2-large", "delete"),
+        step("upload compressed images", len(images), int(compressed),
+             compressed / rate("agent2-upload", "upload", "bytes_per_s", "drive_upload_bps"),
+             "agent2-upload", "upload"),
+    ]
+    # Drive only gets space back from deleted large files; compressed copies are uploaded on top
+    savings = large_bytes - compressed
+    notes = [f"Compressed images re-uploaded to Drive: {compressed / MB:.0f} MB (counted against the savings)."]
+    return finish_plan("agent2", steps, image_bytes + large_bytes, large_bytes, image_bytes - compressed, savings, notes)
+
+def plan_agent3(adb_path, db_path, media_path, serial=None, retention_policy=None, metrics_path=METRICS_LOG):
+    from agent3_whatsapp_backup import MEDIA_FOLDERS, KEEP_FOLDERS, IMAGE_EXTS, VIDEO_EXTS, RESIZE_WIDTH
+    from db_retention import DEFAULT_POLICY
+    from video_encoding import load_cost_model, encoder_speed, DEFAULT_PRESET, DEFAULT_CRF
+    summaries = read_stage_summaries(metrics_path, "agent3")
+    policy = retention_policy or DEFAULT_POLICY
+
+    databases = list_remote_tree(adb_path, db_path, serial)
+    keep = policy.select(databases)
+    kept_dbs = [f for f in databases if not policy.is_backup(f["name"]) or f["name"] in keep]
+    skipped_db_bytes = sum(f["size"] for f in databases) - sum(f["size"] for f in kept_dbs)
+
+    folders = {name: list_remote_tree(adb_path, f"{media_path}/{name}", serial) for name in MEDIA_FOLDERS}
+    media_bytes = sum(f["size"] for files in folders.values() for f in files)
+    deleted_bytes = sum(f["size"] for name, files in folders.items() if name not in KEEP_FOLDERS for f in files)
+    kept = [f for name, files in folders.items() if name in KEEP_FOLDERS for f in files]
+    ext = lambda f: os.path.splitext(f["name"])[1].lower()
+    images = [f for f in kept if ext(f) in IMAGE_EXTS]
+    videos = [f for f in kept if ext(f) in VIDEO_EXTS]
+    image_bytes = sum(f["size"] for f in images)
+    video_bytes = sum(f["size"] for f in videos)
+
+    model = load_cost_model()
+    option = model and model.get("width") == RESIZE_WIDTH and model["entries"].get(f"{DEFAULT_PRESET}:{DEFAULT_CRF}")
+    video_ratio = option["size_ratio"] if option else WHATSAPP_VIDEO_RATIO
+    compression = image_bytes * (1 - WHATSAPP_IMAGE_RATIO) + video_bytes * (1 - video_ratio)
+
+    download_bytes = media_bytes + sum(f["size"] for f in kept_dbs)
+    transform_bps = measured_rate(summaries, "agent3", "transform", "bytes_per_s", DEFAULT_RATES["media_transform_bps"])
+    if option:
+        from agent3_whatsapp_backup import TRANSCODE_WORKERS, FFMPEG_THREADS
+        speed = encoder_speed(model, FFMPEG_THREADS)
+        video_seconds = video_bytes / WHATSAPP_VIDEO_BYTES_PER_FRAME / (option["fps"] * speed) / TRANSCODE_WORKERS
+    else:
+        video_seconds = video_bytes / transform_bps
+    # The collect "hash" stage waits for every pull, so pulling and encoding do not overlap
+    steps = [
+        step("pull from phone", len(kept_dbs) + sum(len(f) for f in folders.values()), download_bytes,
+             download_bytes / measured_rate(summaries, "agent3", "download", "bytes_per_s", DEFAULT_RATES["adb_pull_bps"]),
+             "agent3-pull", "download"),
+        step("resize images", len(images), image_bytes, image_bytes / transform_bps, "agent3-transform", "transform"),
+        step("encode videos", len(videos), video_bytes, video_seconds, "agent3-transform", "transform"),
+    ]
+    notes = [f"Old database backups left on the phone: {skipped_db_bytes / MB:.0f} MB."]
+    if deleted_bytes:
+        notes.append(f"{deleted_bytes / MB:.0f} MB is pulled only to be deleted again "
+                     f"(folders other than {', '.join(sorted(KEEP_FOLDERS))}).")
+    if not databases and not media_bytes:
+        notes.append("The adb listing came back empty: is the phone connected and authorised?")
+    # Savings are measured against a plain copy of the phone's WhatsApp folders
+    savings = skipped_db_bytes + deleted_bytes + compression
+    plan = finish_plan("agent3", steps, download_bytes, deleted_bytes, compression, savings, notes)
+    plan["serial"] = serial
+    return plan
+
+def describe_plan(plan):
+    log(f"📋 Plan for {plan['agent']}{' on ' + plan['serial'] if plan.get('serial') else ''}:")
+    for s in plan["steps"]:
+        log(f"   {s['step']}: {s['items']} items, {s['bytes'] / MB:.1f} MB, ~{s['seconds'] / 60:.1f} min")
+    log(f"   ⬇ Download {plan['download_bytes'] / MB:.1f} MB · 🗑 Delete {plan['delete_bytes'] / MB:.1f} MB · "
+        f"🗜 Compression saves {plan['compression_savings_bytes'] / MB:.1f} MB")
+    log(f"   💾 Expected savings {plan['savings_bytes'] / MB:.1f} MB in ~{plan['estimated_seconds'] / 60:.1f} min")
+    for note in plan["notes"]:
+        log(f"   ℹ {note}")
+    log("   ✅ Worth running." if plan["worth_it"] else "   💤 Not worth running right now.")
+
+def save_plan(plans, path):
+    atomic_write(path, json.dumps(plans, indent=2), mode="w")
+
+def print_log_event(event):
+    if event["type"] == "log":
+        print(event["message"], flush=True)
+
+
+def main():
+    from daemon import DB_PATH, MEDIA_PATH, default_adb_path
+    parser = argparse.ArgumentParser(description="Show what an agent would do, from metadata only.")
+    parser.add_argument("agent", choices=["agent1", "agent2", "agent3"])
+    parser.add_argument("--usb-root", help="agent2 target folder (for --run-if-worth-it)")
+    parser.add_argument("--serial", action="append", default=[], help="agent3 phone(s); default all connected")
+    parser.add_argument("--adb", default=default_adb_path())
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--media-path", default=MEDIA_PATH)
+    parser.add_argument("--min-savings-mb", type=float, default=MIN_SAVINGS_BYTES / MB)
+    parser.add_argument("--min-mb-per-minute", type=float, default=MIN_SAVINGS_PER_MINUTE / MB)
+    parser.add_argument("--out", help="write the plan(s) as JSON")
+    parser.add_argument("--run-if-worth-it", action="store_true", help="run the agent when the plan clears the thresholds")
+    parser.add_argument("--profile", metavar="DIR", help="profile that run: flamegraph and allocation reports per stage")
+    args = parser.parse_args()
+
+    if args.agent == "agent3":
+        serials = args.serial or list_devices(args.adb)
+        plans = [plan_agent3(args.adb, args.db_path, args.media_path, serial) for serial in serials]
+    else:
+        from drive_auth import get_drive_service
+        service = get_drive_service()
+        plans = [plan_agent1(service) if args.agent == "agent1" else plan_agent2(service)]
+
+    for plan in plans:
+        plan["worth_it"] = is_worth_it(plan, args.min_savings_mb * MB, args.min_mb_per_minute * MB)
+        describe_plan(plan)
+    if args.out:
+        save_plan(plans, args.out)
+        log(f"💾 Plan written to {args.out}")
+
+    if args.run_if_worth_it:
+        for plan in plans:
+            if not plan["worth_it"]:
+                continue
+            if plan["agent"] == "agent1":
+                from agent1_duplicates import run_agent1
+                run_agent1(on_event=print_log_event, profile_dir=args.profile)
+            elif plan["agent"] == "agent2":
+                if not args.usb_root:
+                    log("❌ --usb-root is needed to run agent2.")
+                    return 1
+                from agent2_heavy_files import run_agent2
+                run_agent2(args.usb_root, on_event=print_log_event, profile_dir=args.profile)
+            else:
+                from agent3_whatsapp_backup import pull_whatsapp_backup
+                pull_whatsapp_backup(args.adb, args.db_path, args.media_path, serial=plan["serial"],
+                                     on_event=print_log_event, profile_dir=args.profile)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
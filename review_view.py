@@ -0,0 +1,247 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from PySide6.QtWidgets import (
+    QWidget, QListView, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QMessageBox, QAbstractItemView
+)
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QSize, Signal, QBuffer, QByteArray
+from PySide6.QtGui import QImage, QImageReader, QPixmap, QColor
+
+from job_journal import atomic_write
+
+# Review screen for agent1: every duplicate is a row of a QListView over a list
+# model, so only the visible rows are ever drawn or asked for thumbnails, and
+# 100k rows scroll like 100. Thumbnails come from a small pool of threads that
+# take the newest request first (what is on screen now), decode at reduced size,
+# and fill a bounded in-memory LRU backed by a disk cache keyed by MD5, which
+# duplicates share.
+
+THUMB_SIZE = 96
+THUMB_WORKERS = 4
+THUMB_MEMORY_ITEMS = 1500      # pixmaps kept in memory
+THUMB_MAX_PENDING = 256        # older requests are dropped: they have scrolled away
+THUMB_CACHE_DIR = "thumb_cache"
+THUMB_CACHE_MB = 200
+
+def trim_disk_cache(folder, max_bytes):
+    try:
+        entries = [e for e in os.scandir(folder) if e.is_file()]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    total = sum(e.stat().st_size for e in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        total -= entry.stat().st_size
+        os.remove(entry.path)
+
+def decode_thumbnail(data, size):
+    # Decodes straight to the target size (JPEG decoders skip most of the work)
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    reader = QImageReader(buffer)
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(size, size, Qt.KeepAspectRatio))
+    return reader.read()
+
+class ThumbnailLoader(QObject):
+    # fetch(file_id) → image bytes or None; runs on the loader's threads
+    loaded = Signal(str, QImage)
+
+    def __init__(self, fetch, parent=None, workers=THUMB_WORKERS, cache_dir=THUMB_CACHE_DIR):
+        super().__init__(parent)
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.memory = OrderedDict()
+        self.failed = set()
+        self._pending = deque()
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        os.makedirs(cache_dir, exist_ok=True)
+        trim_disk_cache(cache_dir, THUMB_CACHE_MB * 1024 * 1024)
+        self.loaded.connect(self._store)
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"thumbnails-{i}", daemon=True).start()
+
+    def cached(self, key):
+        pixmap = self.memory.get(key)
+        if pixmap is not None:
+            self.memory.move_to_end(key)
+        return pixmap
+
+    def request(self, key, file_id):
+        with self._cond:
+            if key in self._queued or key in self.failed:
+                return
+            self._queued.add(key)
+            self._pending.append((key, file_id))
+            while len(self._pending) > THUMB_MAX_PENDING:
+                dropped, _ = self._pending.popleft()
+                self._queued.discard(dropped)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                key, file_id = self._pending.pop()
+            try:
+                image = self._load(key, file_id)
+            except Exception:
+                image = QImage()
+            self.loaded.emit(key, image)
+
+    def _load(self, key, file_id):
+        path = os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".img")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+        else:
+            data = self.fetch(file_id)
+            if not data:
+                return QImage()
+            atomic_write(path, data)
+        return decode_thumbnail(data, THUMB_SIZE)
+
+    def _store(self, key, image):
+        # Back on the UI thread: pixmaps may only be made here
+        with self._cond:
+            self._queued.discard(key)
+        if image.isNull():
+            self.failed.add(key)
+            return
+        self.memory[key] = QPixmap.fromImage(image)
+        while len(self.memory) > THUMB_MEMORY_ITEMS:
+            self.memory.popitem(last=False)
+
+class DuplicateListModel(QAbstractListModel):
+    # Rows are (duplicate, original) FileRecord pairs; checked rows get deleted
+    def __init__(self, pairs, loader, parent=None):
+        super().__init__(parent)
+        self.pairs = pairs
+        self.loader = loader
+        self.checked = bytearray(b"\x01") * len(pairs)
+        self.rows_by_key = {}
+        for row, (duplicate, _) in enumerate(pairs):
+            self.rows_by_key.setdefault(self.thumb_key(duplicate), []).append(row)
+        self.placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+        self.placeholder.fill(QColor("#1C768F"))
+        loader.loaded.connect(self.thumbnail_loaded)
+
+    @staticmethod
+    def thumb_key(f):
+        return f.md5_hex or f.id
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.pairs)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        duplicate, original = self.pairs[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{duplicate.name}  ·  {duplicate.size / 1e6:.1f} MB  ·  same as {original.name}"
+        if role == Qt.DecorationRole:
+            key = self.thumb_key(duplicate)
+            pixmap = self.loader.cached(key)
+            if pixmap is None:
+                self.loader.request(key, duplicate.id)
+                return self.placeholder
+            return pixmap
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checked[index.row()] else Qt.Unchecked
+        if role == Qt.ToolTipRole:
+            return f"Delete: {duplicate.name} ({duplicate.id})\nKeep: {original.name} ({original.id})"
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        self.checked[index.row()] = Qt.CheckState(value) == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def set_all(self, checked):
+        self.checked[:] = (b"\x01" if checked else b"\x00") * len(self.pairs)
+        if self.pairs:
+            self.dataChanged.emit(self.index(0), self.index(len(self.pairs) - 1), [Qt.CheckStateRole])
+
+    def chosen(self):
+        return [duplicate for (duplicate, _), checked in zip(self.pairs, self.checked) if checked]
+
+    def thumbnail_loaded(self, key, image):
+        for row in self.rows_by_key.get(key, ()):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+class DuplicateReviewWindow(QWidget):
+    delete_requested = Signal(object)
+
+    def __init__(self, pairs, fetch_thumbnail, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("🔎 Review Duplicates")
+        self.setGeometry(140, 140, 760, 640)
+
+        self.loader = ThumbnailLoader(fetch_thumbnail, self)
+        self.model = DuplicateListModel(pairs, self.loader, self)
+        self.model.dataChanged.connect(self.update_summary)
+
+        layout = QVBoxLayout()
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.Batched)
+        self.view.setBatchSize(200)
+        self.view.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        layout.addWidget(self.view)
+
+        buttons = QHBoxLayout()
+        for label, slot in (("☑ Select all", lambda: self.model.set_all(True)),
+                            ("☐ Select none", lambda: self.model.set_all(False)),
+                            ("🗑 Delete selected", self.delete_selected)):
+            button = QPushButton(label)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.update_summary()
+
+    def update_summary(self, *args):
+        chosen = self.model.checked.count(1)
+        self.summary.setText(f"♻️ {len(self.model.pairs)} duplicates · {chosen} selected for deletion")
+
+    def delete_selected(self):
+        files = self.model.chosen()
+        if not files:
+            return
+        answer = QMessageBox.question(self, "Delete duplicates",
+                                      f"Delete {len(files)} files from Google Drive? The originals are kept.")
+        if answer == QMessageBox.Yes:
+            self.delete_requested.emit(files)
+            self.close()
+
+    def closeEvent(self, event):
+        self.loader.stop()
+        super().closeEvent(event)
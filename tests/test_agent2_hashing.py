@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("googleapiclient")
+from PIL import Image
+
+import agent2_heavy_files as agent2
+
+
+def test_batch_and_single_image_hashes_agree(tmp_path, monkeypatch):
+    # A large JPEG is where draft-mode decoding would make the two paths differ
+    monkeypatch.setattr(agent2, "PROCESSED_DIR", str(tmp_path))
+    names = []
+    for seed in range(12):
+        pixels = (np.random.default_rng(seed).random((60, 80, 3)) * 255).astype(np.uint8)
+        name = f"photo_{seed}.jpg"
+        Image.fromarray(pixels).resize((3000, 2250)).save(tmp_path / name, "JPEG")
+        names.append(name)
+    batch = agent2.hash_images(names + ["missing.jpg"])
+    assert batch[-1] is None
+    assert batch[:-1] == [agent2.image_hash(os.path.join(tmp_path, name)) for name in names]
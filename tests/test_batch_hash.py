@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("imagehash")
+
+from batch_hash import INPUT_SIZE, hamming, hash_batch, imagehash_parity, synthetic_grays
+
+
+@pytest.fixture(scope="module")
+def grays():
+    return synthetic_grays(count=60)
+
+
+def test_hashes_match_imagehash(grays):
+    for kind, diffs in imagehash_parity(grays).items():
+        assert not diffs.any(), f"{kind}: {int((diffs != 0).sum())} hashes differ from imagehash"
+
+
+def test_noisy_thumbnails_match_imagehash():
+    rng = np.random.default_rng(1)
+    noisy = (rng.random((30, INPUT_SIZE, INPUT_SIZE)) * 255).astype(np.uint8)
+    for kind, diffs in imagehash_parity(noisy).items():
+        assert not diffs.any(), kind
+
+
+def test_batch_equals_one_at_a_time(grays):
+    together = hash_batch(grays)
+    for i in (0, 17, len(grays) - 1):
+        alone = hash_batch(grays[i:i + 1])
+        assert all(alone[kind][0] == together[kind][i] for kind in together)
+
+
+def test_empty_and_misshapen_stacks():
+    assert all(len(h) == 0 for h in hash_batch(np.zeros((0, INPUT_SIZE, INPUT_SIZE))).values())
+    with pytest.raises(ValueError):
+        hash_batch(np.zeros((2, 16, 16)))
+
+
+def test_hamming(grays):
+    hashes = hash_batch(grays[:4])["phash"]
+    assert hamming(hashes, hashes[0])[0] == 0
+    assert list(hamming(np.array([0, 1, 3, 2 ** 64 - 1], dtype=np.uint64), 0)) == [0, 1, 2, 64]
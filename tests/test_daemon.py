@@ -0,0 +1,27 @@
+import argparse
+
+import daemon
+
+
+def make_daemon(monkeypatch, **overrides):
+    args = argparse.Namespace(usb_root=None, serial=[], agent1_hours=None, agent2_hours=None, agent3_hours=None,
+                              adb="adb", force=False, profile=None)
+    vars(args).update(overrides)
+    d = daemon.Daemon(args, {"drive": {}, "devices": {}})
+    ran = []
+    monkeypatch.setattr(d, "run_drive_agent", ran.append)
+    monkeypatch.setattr(d, "run_device", ran.append)
+    monkeypatch.setattr(daemon, "list_devices", lambda adb: ["R58M12ABCDE"])
+    return d, ran
+
+
+def test_once_with_only_a_phone_does_not_touch_drive(monkeypatch):
+    d, ran = make_daemon(monkeypatch, serial=["R58M12ABCDE"])
+    d.tick(once=True)
+    assert ran == ["R58M12ABCDE"]
+
+
+def test_once_runs_agent1_when_it_is_scheduled(monkeypatch):
+    d, ran = make_daemon(monkeypatch, agent1_hours=24.0)
+    d.tick(once=True)
+    assert ran == ["agent1"]
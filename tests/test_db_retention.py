@@ -0,0 +1,46 @@
+import subprocess
+import time
+
+import db_retention
+from db_retention import RetentionPolicy, pull_databases
+from job_journal import JobJournal
+
+
+def fake_adb(monkeypatch, files, failing):
+    now = int(time.time())
+    listing = "".join(f"/sdcard/WhatsApp/Databases/{name}|100|{now}\n" for name in files)
+
+    def run(cmd, **kwargs):
+        if "shell" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, stdout=listing, stderr="")
+        failed = any(cmd[-2].endswith(name) for name in failing)
+        return subprocess.CompletedProcess(cmd, 1 if failed else 0, stdout=None,
+                                           stderr=b"adb: error: failed to copy\n" if failed else b"")
+    monkeypatch.setattr(db_retention.subprocess, "run", run)
+
+
+def test_failed_pulls_are_reported_and_not_journaled(monkeypatch, tmp_path):
+    fake_adb(monkeypatch, ["msgstore.db.crypt14", "msgstore-2025-01-01.1.db.crypt14"], ["msgstore.db.crypt14"])
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    result = pull_databases("adb", "/sdcard/WhatsApp/Databases", str(tmp_path / "Databases"),
+                            RetentionPolicy(), journal)
+    assert result["failed"] == ["msgstore.db.crypt14"]
+    assert result["pulled"] == 1
+    assert journal.state("db:msgstore.db.crypt14") is None
+    assert journal.state("db:msgstore-2025-01-01.1.db.crypt14") == "pulled"
+
+    # The next run retries only what failed
+    fake_adb(monkeypatch, ["msgstore.db.crypt14", "msgstore-2025-01-01.1.db.crypt14"], [])
+    result = pull_databases("adb", "/sdcard/WhatsApp/Databases", str(tmp_path / "Databases"),
+                            RetentionPolicy(), journal)
+    assert result == {"pulled": 2, "failed": [], "skipped_bytes": 0}
+    journal.close()
+
+
+def test_failed_fallback_pull_is_not_pruned(monkeypatch, tmp_path):
+    fake_adb(monkeypatch, [], ["Databases"])
+    pruned = []
+    monkeypatch.setattr(db_retention, "prune_local", lambda folder, policy: pruned.append(folder))
+    result = pull_databases("adb", "/sdcard/WhatsApp/Databases", str(tmp_path / "Databases"), RetentionPolicy())
+    assert result["failed"] == ["Databases"]
+    assert pruned == []
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from drive_executor import DriveExecutor, classify_error, FATAL, RATE_LIMIT, RETRY
+
+
+class Response(dict):
+    # Shaped like httplib2.Response: the headers plus a status attribute
+    def __init__(self, status, **headers):
+        super().__init__(headers)
+        self.status = status
+
+
+class HttpError(Exception):
+    # Shaped like googleapiclient.errors.HttpError
+    def __init__(self, status, reason=None, **headers):
+        super().__init__(status)
+        self.resp = Response(status, **headers)
+        self.content = json.dumps({"error": {"errors": [{"reason": reason}]}}).encode() if reason else b""
+
+
+@pytest.mark.parametrize("error, kind", [
+    (HttpError(429), RATE_LIMIT),
+    (HttpError(403, "userRateLimitExceeded"), RATE_LIMIT),
+    (HttpError(403, "rateLimitExceeded"), RATE_LIMIT),
+    (HttpError(403, "insufficientFilePermissions"), FATAL),
+    (HttpError(403), FATAL),
+    (HttpError(404, "notFound"), FATAL),
+    (HttpError(400), FATAL),
+    (HttpError(408), RETRY),
+    (HttpError(500), RETRY),
+    (HttpError(503), RETRY),
+    (ConnectionResetError(), RETRY),
+    (TimeoutError(), RETRY),
+    (ValueError("bad argument"), FATAL),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+def test_classify_real_http_error():
+    errors = pytest.importorskip("googleapiclient.errors")
+    httplib2 = pytest.importorskip("httplib2")
+    body = json.dumps({"error": {"errors": [{"reason": "rateLimitExceeded"}]}}).encode()
+    assert classify_error(errors.HttpError(httplib2.Response({"status": 403}), body)) == RATE_LIMIT
+    assert classify_error(errors.HttpError(httplib2.Response({"status": 403}), b"{}")) == FATAL
+
+
+def failing(*errors):
+    errors = list(errors)
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    return func
+
+
+def test_transient_errors_are_retried_until_success():
+    delays = []
+    executor = DriveExecutor(sleep=delays.append)
+    window = executor.start_window()
+    assert executor.call(failing(HttpError(503), HttpError(429, **{"retry-after": "3"}), ConnectionError())) == "ok"
+    assert executor.stats(window)["retries"] == 3
+    assert executor.stats(window)["throttled"] == 1
+    assert delays[1] == 3.0  # Retry-After is honoured
+
+
+def test_fatal_errors_are_not_retried():
+    executor = DriveExecutor(sleep=lambda s: None)
+    with pytest.raises(HttpError):
+        executor.call(failing(HttpError(404, "notFound")))
+    assert executor.stats()["retries"] == 0
+    assert executor.stats()["failed"] == 1
+
+
+def test_gives_up_after_max_retries():
+    executor = DriveExecutor(max_retries=2, sleep=lambda s: None)
+    with pytest.raises(HttpError):
+        executor.call(failing(*[HttpError(500)] * 5))
+    s = executor.stats()
+    assert (s["calls"], s["retries"], s["failed"]) == (3, 2, 1)
+
+
+def test_rate_limits_halve_concurrency():
+    executor = DriveExecutor(initial=8, sleep=lambda s: None)
+    executor.call(failing(HttpError(429)))
+    assert executor.limit < 8
@@ -0,0 +1,46 @@
+import json
+
+from job_journal import JobJournal, atomic_write
+
+
+def test_torn_last_line_is_dropped_and_appends_stay_readable(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = JobJournal(path)
+    journal.record("a.jpg", "done", size=1)
+    journal.record("b.jpg", "compressing")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"key": "b.jpg", "state": "do')  # crash mid-write, no newline
+
+    journal = JobJournal(path)
+    assert journal.state("a.jpg") == "done"
+    assert journal.get("a.jpg")["size"] == 1
+    assert journal.state("b.jpg") == "compressing"
+    journal.record("b.jpg", "done")
+    journal.close()
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["state"] for line in lines] == ["done", "compressing", "done"]
+    journal = JobJournal(path)
+    assert journal.state("b.jpg") == "done"
+    journal.close()
+
+
+def test_last_record_for_a_key_wins(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = JobJournal(path)
+    journal.record("a.jpg", "pending")
+    journal.record("a.jpg", "done")
+    journal.close()
+    journal = JobJournal(path)
+    assert journal.state("a.jpg") == "done"
+    journal.close()
+
+
+def test_atomic_write_leaves_no_temp_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    atomic_write(path, b"{}")
+    atomic_write(path, "[]", mode="w")
+    assert open(path).read() == "[]"
+    assert list(tmp_path.iterdir()) == [tmp_path / "state.json"]
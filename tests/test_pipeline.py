@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline import Pipeline, Stage
+
+
+def exit_on_three(x):
+    if x == 3:
+        raise SystemExit(2)
+    time.sleep(0.01)
+    return x
+
+
+def slow(x):
+    time.sleep(0.02)
+    return x
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_system_exit_from_a_stage_leaves_no_pending_tasks(concurrency):
+    loop = asyncio.new_event_loop()
+    pipeline = Pipeline("test", [
+        Stage("source", lambda: range(50), source=True),
+        Stage("exit", exit_on_three, concurrency=concurrency),
+        Stage("slow", slow),
+    ])
+    try:
+        with pytest.raises(SystemExit) as exc:
+            loop.run_until_complete(pipeline.run())
+        assert exc.value.code == 2
+        assert not [task for task in asyncio.all_tasks(loop) if not task.done()]
+    finally:
+        loop.close()
+
+
+def test_failing_items_are_counted_and_the_rest_pass():
+    def odd_only(x):
+        if x % 2 == 0:
+            raise ValueError(x)
+        return x
+    pipeline = Pipeline("test", [Stage("source", lambda: range(10), source=True), Stage("odd", odd_only)])
+    assert sorted(pipeline.run_sync()) == [1, 3, 5, 7, 9]
+    assert pipeline.stages[1].stats.failed == 5
@@ -0,0 +1,78 @@
+import os
+import hashlib
+
+import pytest
+
+zstandard = pytest.importorskip("zstandard")
+
+from zstd_archive import Archive
+
+
+def compressible(size, seed):
+    line = f"line {seed} of a very compressible log file\n".encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_mixed_entries_in_one_volume_restore_exactly(tmp_path, threads):
+    files = {
+        "a.log": compressible(600_000, 1),
+        "b.mp4": os.urandom(300_000),
+        "c.log": compressible(250_000, 2),
+        "d.log": compressible(10, 3),           # smaller than the sample
+        "e.mp4": os.urandom(70_000),
+        "f.log": compressible(1_500_000, 4),     # last in the volume
+    }
+    archive = Archive(str(tmp_path / "heavy_files"), threads=threads)
+    for name, data in files.items():
+        entry = archive.open_entry(name)
+        entry.write(data[:100_000])
+        entry.write(data[100_000:])
+        entry.commit(md5=hashlib.md5(data).hexdigest())
+
+    records = {r["key"]: r for r in archive.entries()}
+    assert {r["volume"] for r in records.values()} == {0}
+    assert {r["method"] for r in records.values()} == {"zstd", "store"}
+
+    out = tmp_path / "restored"
+    out.mkdir()
+    for name, data in files.items():
+        assert b"".join(archive.read(name)) == data
+        with open(archive.extract(name, str(out)), "rb") as f:
+            assert f.read() == data
+    archive.close()
+
+
+def test_reopened_archive_restores_entries(tmp_path):
+    path = str(tmp_path / "heavy_files")
+    data = {"x.log": compressible(200_000, 5), "y.bin": os.urandom(50_000)}
+    archive = Archive(path, threads=1)
+    for name, content in data.items():
+        entry = archive.open_entry(name)
+        entry.write(content)
+        entry.commit()
+    archive.close()
+
+    archive = Archive(path, threads=1)
+    for name, content in data.items():
+        assert b"".join(archive.read(name)) == content
+    archive.close()
+
+
+def test_aborted_entry_leaves_neighbours_intact(tmp_path):
+    archive = Archive(str(tmp_path / "heavy_files"), threads=1)
+    first = archive.open_entry("first.log")
+    first.write(compressible(120_000, 6))
+    first.commit()
+    broken = archive.open_entry("broken.log")
+    broken.write(compressible(90_000, 7))
+    broken.abort()
+    last = archive.open_entry("last.bin")
+    payload = os.urandom(80_000)
+    last.write(payload)
+    last.commit()
+
+    assert "broken.log" not in archive
+    assert b"".join(archive.read("first.log")) == compressible(120_000, 6)
+    assert b"".join(archive.read("last.bin")) == payload
+    archive.close()
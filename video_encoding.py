@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import tempfile
+import statistics
+import ffmpeg
+
+from job_journal import atomic_write
+from agent_events import log
+
+# Ordered fastest → slowest; slower presets buy smaller files at the same CRF.
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow"]
+CRFS = [23, 26, 28]
+DEFAULT_PRESET = "medium"
+DEFAULT_CRF = 23
+COST_MODEL_PATH = "video_cost_model.json"
+BENCH_SAMPLE_FILES = 4
+BENCH_SAMPLE_SECONDS = 8
+DEADLINE_SAFETY = 0.9
+
+def encode_output(stream, dst, width, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, threads=None):
+    # The x264/aac settings every agent encodes with; stream is any ffmpeg input
+    extra = {"threads": threads} if threads else {}
+    return (
+        stream
+        .filter('scale', f'{width}:-2')
+        .output(dst, vcodec='libx264', acodec='aac', strict='experimental', preset=preset, crf=crf, **extra)
+        .overwrite_output()
+    )
+
+def encode_video(src, dst, width, preset=DEFAULT_PRESET, crf=DEFAULT_CRF, seconds=None, threads=None):
+    stream = ffmpeg.input(src, t=seconds) if seconds else ffmpeg.input(src)
+    encode_output(stream, dst, width, preset, crf, threads).run(quiet=True)
+
+def probe_video_info(path):
+    info = ffmpeg.probe(path)
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    duration = float(info.get("format", {}).get("duration") or video.get("duration") or 0)
+    num, _, den = video.get("avg_frame_rate", "0/1").partition("/")
+    fps = float(num) / float(den or 1) if float(den or 1) else 0.0
+    return {
+        "width": int(video.get("width", 0)),
+        "duration": duration,
+        "frames": int(video.get("nb_frames") or duration * fps),
+        "size": os.path.getsize(path),
+    }
+
+def benchmark_encoding(video_paths, width, presets=PRESETS, crfs=CRFS,
+                       sample_files=BENCH_SAMPLE_FILES, sample_seconds=BENCH_SAMPLE_SECONDS, seed=0, threads=None):
+    paths = list(video_paths)
+    random.Random(seed).shuffle(paths)
+    samples = []
+    for path in paths:
+        try:
+            info = probe_video_info(path)
+        except Exception:
+            continue
+        if info["frames"] and info["duration"]:
+            samples.append((path, info))
+        if len(samples) >= sample_files:
+            break
+    if not samples:
+        return None
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, "bench.mp4")
+        for preset in presets:
+            for crf in crfs:
+                fps_runs, ratio_runs = [], []
+                for path, info in samples:
+                    seconds = min(sample_seconds, info["duration"])
+                    start = time.perf_counter()
+                    try:
+                        encode_video(path, out_path, width, preset, crf, seconds, threads)
+                    except Exception:
+                        continue
+                    elapsed = max(time.perf_counter() - start, 1e-6)
+                    frames = info["frames"] * seconds / info["duration"]
+                    in_bytes = info["size"] * seconds / info["duration"]
+                    fps_runs.append(frames / elapsed)
+                    ratio_runs.append(os.path.getsize(out_path) / max(in_bytes, 1))
+                    log(f"⏱ {preset}/crf{crf} {os.path.basename(path)}: {fps_runs[-1]:.1f} fps, ratio {ratio_runs[-1]:.2f}")
+                if fps_runs:
+                    results[f"{preset}:{crf}"] = {
+                        "preset": preset, "crf": crf,
+                        "fps": statistics.median(fps_runs),
+                        "size_ratio": statistics.median(ratio_runs),
+                    }
+    return {"width": width, "created": time.time(), "samples": len(samples), "threads": threads or os.cpu_count() or 1,
+            "entries": results}
+
+def save_cost_model(model, path=COST_MODEL_PATH):
+    atomic_write(path, json.dumps(model, indent=2), mode="w")
+
+def load_cost_model(path=COST_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def preset_options(model, crf):
+    options = [e for e in model["entries"].values() if e["crf"] == crf]
+    options.sort(key=lambda e: -e["fps"])
+    # Drop presets that are slower without also being smaller
+    pareto = []
+    for option in options:
+        if not pareto or option["size_ratio"] < pareto[-1]["size_ratio"]:
+            pareto.append(option)
+    return pareto
+
+def encoder_speed(model, threads=None):
+    # One encode with `threads` threads relative to the model's benchmark encodes.
+    # x264 scales a little worse than linearly with threads, so this errs on the slow side.
+    if not threads:
+        return 1.0
+    return threads / (model.get("threads") or os.cpu_count() or 1)
+
+def plan_presets(videos, budget_seconds, model, crf=DEFAULT_CRF, workers=1, speed=1.0):
+    # videos: {path: {"frames": n, "size": bytes}} → {path: preset}
+    # workers encodes run at once, each at `speed` × the model's fps: together they have
+    # workers × budget_seconds, and no single encode may take longer than the budget
+    options = preset_options(model, crf)
+    if not options:
+        return {path: DEFAULT_PRESET for path in videos}
+
+    def cost(info, level):
+        option = options[level]
+        return info["frames"] / (option["fps"] * speed), info["size"] * option["size_ratio"]
+
+    levels = {path: 0 for path in videos}
+    spent = sum(cost(info, 0)[0] for info in videos.values())
+
+    heap = []
+    def push(path):
+        level = levels[path]
+        if level + 1 >= len(options):
+            return
+        t0, s0 = cost(videos[path], level)
+        t1, s1 = cost(videos[path], level + 1)
+        gain = (s0 - s1) / max(t1 - t0, 1e-6)
+        heapq.heappush(heap, (-gain, path, level, t1 - t0))
+
+    for path in videos:
+        push(path)
+    while heap:
+        _, path, level, extra = heapq.heappop(heap)
+        if levels[path] != level or spent + extra > budget_seconds * workers:
+            continue
+        if cost(videos[path], level + 1)[0] > budget_seconds:
+            continue
+        levels[path] = level + 1
+        spent += extra
+        push(path)
+
+    return {path: options[level]["preset"] for path, level in levels.items()}
+
+def plan_for_deadline(video_paths, deadline_seconds, width, crf=DEFAULT_CRF, model_path=COST_MODEL_PATH,
+                      workers=1, threads=None):
+    # workers: encodes running at once (may be a fraction when devices share a pool);
+    # threads: ffmpeg threads per encode, None for ffmpeg's default of every core
+    started = time.perf_counter()
+    model = load_cost_model(model_path)
+    if not model or model.get("width") != width:
+        log("📐 No encode cost model yet → benchmarking a sample of your videos...")
+        model = benchmark_encoding(video_paths, width, crfs=[crf], sample_files=2, sample_seconds=4, threads=threads)
+        if not model:
+            return {}, {}
+        save_cost_model(model, model_path)
+
+    videos = {}
+    for path in video_paths:
+        try:
+            videos[path] = probe_video_info(path)
+        except Exception:
+            continue
+    to_encode = {p: i for p, i in videos.items() if i["width"] > width}
+
+    remaining = (deadline_seconds - (time.perf_counter() - started)) * DEADLINE_SAFETY
+    presets = plan_presets(to_encode, remaining, model, crf, workers, encoder_speed(model, threads))
+    counts = {}
+    for preset in presets.values():
+        counts[preset] = counts.get(preset, 0) + 1
+    log(f"📐 Encode plan for {len(presets)} videos in {remaining / 60:.1f} min on {workers:g} encoders: {counts}")
+    return presets, videos
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "."
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 720
+    paths = [
+        os.path.join(root, f) for root, _, files in os.walk(folder) for f in files
+        if os.path.splitext(f)[1].lower() in {".mp4", ".3gp", ".avi"}
+    ]
+    model = benchmark_encoding(paths, width)
+    if model:
+        save_cost_model(model)
+        log(f"✅ Saved cost model with {len(model['entries'])} entries → {COST_MODEL_PATH}")
+    else:
+        log("❌ No usable videos found to benchmark.")
@@ -0,0 +1,150 @@
+import os
+import json
+import ffmpeg
+
+from job_journal import atomic_write
+from agent_events import log
+
+INDEX_NAME = ".video_fingerprints.json"
+MAX_KEYFRAMES = 120
+SIGNATURE_FRAMES = 16
+FRAME_MATCH_BITS = 10          # max Hamming distance for two frame hashes to match
+SIMILARITY_THRESHOLD = 0.8     # fraction of frames that must match both ways
+DURATION_TOLERANCE = 1.5       # seconds
+
+def dhash_gray_9x8(frame):
+    bits = 0
+    for y in range(8):
+        row = frame[y * 9:(y + 1) * 9]
+        for x in range(8):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+def keyframe_hashes(path):
+    # Only keyframes are decoded (-skip_frame nokey) and scaled to 9x8 gray
+    out, _ = (
+        ffmpeg
+        .input(path, skip_frame='nokey')
+        .filter('scale', 9, 8, flags='area')
+        .output('pipe:', format='rawvideo', pix_fmt='gray', vsync='vfr', vframes=MAX_KEYFRAMES, an=None)
+        .run(capture_stdout=True, quiet=True)
+    )
+    hashes = [dhash_gray_9x8(out[i:i + 72]) for i in range(0, len(out) - 71, 72)]
+    if len(hashes) > SIGNATURE_FRAMES:
+        step = len(hashes) / SIGNATURE_FRAMES
+        hashes = [hashes[int(i * step)] for i in range(SIGNATURE_FRAMES)]
+    return hashes
+
+def video_signature(path):
+    duration = float(ffmpeg.probe(path).get("format", {}).get("duration") or 0)
+    return {"duration": duration, "hashes": keyframe_hashes(path)}
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def frame_coverage(a, b):
+    if not a or not b:
+        return 0.0
+    matched = sum(1 for h in a if min(hamming(h, o) for o in b) <= FRAME_MATCH_BITS)
+    return matched / len(a)
+
+def similarity(sig_a, sig_b):
+    if abs(sig_a["duration"] - sig_b["duration"]) > DURATION_TOLERANCE:
+        return 0.0
+    return min(frame_coverage(sig_a["hashes"], sig_b["hashes"]),
+               frame_coverage(sig_b["hashes"], sig_a["hashes"]))
+
+class FingerprintIndex:
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self.dirty = False
+
+    def signature(self, video_path):
+        key = os.path.relpath(os.path.abspath(video_path), self.root).replace(os.sep, "/")
+        st = os.stat(video_path)
+        entry = self.entries.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == int(st.st_mtime):
+            return {"duration": entry["duration"], "hashes": [int(h, 16) for h in entry["hashes"]]}
+        sig = video_signature(video_path)
+        self.entries[key] = {
+            "size": st.st_size, "mtime": int(st.st_mtime), "duration": sig["duration"],
+            "hashes": [format(h, "016x") for h in sig["hashes"]],
+        }
+        self.dirty = True
+        return sig
+
+    def save(self):
+        if self.dirty:
+            atomic_write(self.path, json.dumps(self.entries), mode="w")
+            self.dirty = False
+
+def find_near_duplicates(paths, index, threshold=SIMILARITY_THRESHOLD):
+    sigs = []
+    for path in paths:
+        try:
+            sig = index.signature(path)
+        except Exception:
+            continue
+        if sig["hashes"]:
+            sigs.append((sig["duration"], path, sig))
+    index.save()
+    sigs.sort(key=lambda s: s[0])
+
+    parent = {path: path for _, path, _ in sigs}
+    def find(p):
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    # Sorted by duration, so only neighbours within the tolerance can match
+    for i, (duration, path, sig) in enumerate(sigs):
+        for other_duration, other_path, other_sig in sigs[i + 1:]:
+            if other_duration - duration > DURATION_TOLERANCE:
+                break
+            if similarity(sig, other_sig) >= threshold:
+                parent[find(other_path)] = find(path)
+
+    groups = {}
+    for _, path, _ in sigs:
+        groups.setdefault(find(path), []).append(path)
+    # Keep the largest (least re-compressed) copy of each clip
+    return [sorted(g, key=lambda p: -os.path.getsize(p)) for g in groups.values() if len(g) > 1]
+
+def dedupe_videos(video_folder, action="report", journal=None, index_path=None):
+    # Hardlinked exact copies are fingerprinted once and handled together
+    links = {}
+    for root, _, files in os.walk(video_folder):
+        for f in files:
+            name, ext = os.path.splitext(f)
+            if ext.lower() not in {".mp4", ".3gp", ".avi"} or name.lower().endswith(".tmp"):
+                continue
+            path = os.path.join(root, f)
+            st = os.stat(path)
+            links.setdefault((st.st_dev, st.st_ino), []).append(path)
+    paths = [group[0] for group in links.values()]
+    links = {group[0]: group for group in links.values()}
+
+    index = FingerprintIndex(index_path or os.path.join(os.path.dirname(video_folder), INDEX_NAME))
+    groups = find_near_duplicates(paths, index)
+    saved = 0
+    for keeper, *copies in groups:
+        for copy in copies:
+            size = os.path.getsize(copy)
+            if action == "remove":
+                for link in links[copy]:
+                    os.remove(link)
+                    if journal: journal.record(journal.key_for(link), "removed", near_duplicate_of=journal.key_for(keeper))
+                log(f"🗑 Removed near-duplicate video: {os.path.basename(copy)} (kept {os.path.basename(keeper)})")
+            else:
+                log(f"🎞 Near-duplicate video: {os.path.basename(copy)} ≈ {os.path.basename(keeper)}")
+            saved += size
+
+    verb = "Removed" if action == "remove" else "Found"
+    log(f"🎞 {verb} {sum(len(g) - 1 for g in groups)} near-duplicate videos ({saved / (1024 * 1024):.1f} MB).")
+    return groups
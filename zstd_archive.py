@@ -0,0 +1,219 @@
+import os
+import sys
+import math
+import hashlib
+import argparse
+import threading
+from collections import Counter
+
+from job_journal import JobJournal
+
+try:
+    import zstandard
+except ImportError:  # optional: without it agent2 copies heavy files uncompressed
+    zstandard = None
+
+# Archive that agent2 streams heavy files into while they download:
+#
+#   heavy_files/index.jsonl       one JobJournal record per stored file
+#   heavy_files/volume_00.zpack   entries back to back; one volume per concurrent writer
+#
+# Every entry is its own zstd frame (multi-threaded), or the raw bytes when the
+# first SAMPLE_BYTES look already compressed (mp4, zip, jpg, ...). A single file
+# is restored by seeking to its offset and decoding just that frame.
+#
+#   python zstd_archive.py list    E:/backup_2025-01-01/heavy_files
+#   python zstd_archive.py extract E:/backup_2025-01-01/heavy_files movie.mov -o restored
+
+INDEX_NAME = "index.jsonl"
+VOLUME_PATTERN = "volume_{:02d}.zpack"
+SAMPLE_BYTES = 64 * 1024
+STORE_ENTROPY = 7.5        # bits/byte; above this the sample is treated as already compressed
+ZSTD_LEVEL = 3
+ZSTD_THREADS = max(1, (os.cpu_count() or 2) // 2)
+READ_CHUNK = 1024 * 1024
+
+def available():
+    return zstandard is not None
+
+def entropy(data):
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+class EntryWriter:
+    # File-like sink for one file: buffers the first SAMPLE_BYTES to pick zstd or
+    # store, then streams into the volume it holds until commit() or abort()
+    def __init__(self, archive, name, owner=None):
+        self.archive = archive
+        self.name = archive.name_for(name, owner) if owner else name
+        self.owner = owner
+        self.volume = archive._take_volume()
+        self.fh = open(archive.volume_path(self.volume), "ab")
+        self.offset = self.fh.tell()
+        self.size = 0
+        self.method = None
+        self._sample = bytearray()
+        self._sink = None
+
+    def _start(self):
+        sample, self._sample = bytes(self._sample), None
+        if zstandard is not None and entropy(sample) < STORE_ENTROPY:
+            self.method = "zstd"
+            compressor = zstandard.ZstdCompressor(level=self.archive.level, threads=self.archive.threads)
+            self._sink = compressor.stream_writer(self.fh, closefd=False)
+        else:
+            self.method = "store"
+            self._sink = self.fh
+        self._sink.write(sample)
+
+    def write(self, data):
+        self.size += len(data)
+        if self._sink is None:
+            self._sample += data
+            if len(self._sample) >= SAMPLE_BYTES:
+                self._start()
+        else:
+            self._sink.write(data)
+        return len(data)
+
+    def commit(self, **info):
+        if self._sink is None:
+            self._start()
+        if self.method == "zstd":
+            self._sink.flush(zstandard.FLUSH_FRAME)
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        length = self.fh.tell() - self.offset
+        self._release()
+        return self.archive.index.record(self.name, "stored", volume=self.volume, offset=self.offset,
+                                         length=length, size=self.size, method=self.method,
+                                         owner=self.owner, **info)
+
+    def abort(self):
+        # The volume is ours until released, so the partial entry can simply be cut off
+        self.fh.truncate(self.offset)
+        self._release()
+
+    def _release(self):
+        self.fh.close()
+        self.archive._return_volume(self.volume)
+
+class Archive:
+    def __init__(self, path, level=ZSTD_LEVEL, threads=ZSTD_THREADS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.level = level
+        self.threads = threads
+        self.index = JobJournal(os.path.join(path, INDEX_NAME))
+        self._lock = threading.Lock()
+        self._free = []
+        self._volumes = 0
+        self._owners = {r["key"]: r.get("owner") for r in self.entries()}
+        while os.path.exists(self.volume_path(self._volumes)):
+            self._free.append(self._volumes)
+            self._volumes += 1
+
+    def volume_path(self, volume):
+        return os.path.join(self.path, VOLUME_PATTERN.format(volume))
+
+    def _take_volume(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self._volumes += 1
+            return self._volumes - 1
+
+    def _return_volume(self, volume):
+        with self._lock:
+            self._free.append(volume)
+
+    def name_for(self, name, owner):
+        # Sources may share a name (Drive allows it): the first owner keeps it,
+        # later ones get their id as a prefix
+        with self._lock:
+            claimed = self._owners.setdefault(name, owner)
+        return name if claimed in (owner, None) else f"{owner}_{name}"
+
+    def __contains__(self, name):
+        return self.index.state(name) == "stored"
+
+    def open_entry(self, name, owner=None):
+        return EntryWriter(self, name, owner)
+
+    def entries(self):
+        return [r for r in self.index.entries.values() if r["state"] == "stored"]
+
+    def totals(self):
+        entries = self.entries()
+        return {"files": len(entries), "compressed": sum(r["method"] == "zstd" for r in entries),
+                "size": sum(r["size"] for r in entries), "length": sum(r["length"] for r in entries)}
+
+    def read(self, name):
+        # Yields the original bytes of one entry
+        record = self.index.get(name)
+        if not record or record["state"] != "stored":
+            raise KeyError(name)
+        if record["method"] == "zstd" and zstandard is None:
+            raise RuntimeError("zstandard is not installed; cannot restore compressed entries")
+        # Only the entry's own length bytes are read: the next entry follows straight after
+        decoder = zstandard.ZstdDecompressor().decompressobj() if record["method"] == "zstd" else None
+        with open(self.volume_path(record["volume"]), "rb") as fh:
+            fh.seek(record["offset"])
+            remaining = record["length"]
+            while remaining:
+                chunk = fh.read(min(READ_CHUNK, remaining))
+                if not chunk:
+                    raise EOFError(f"{name}: volume ends before the entry does")
+                remaining -= len(chunk)
+                if decoder:
+                    chunk = decoder.decompress(chunk)
+                if chunk:
+                    yield chunk
+            if decoder and not decoder.eof:
+                raise EOFError(f"{name}: the entry's zstd frame is cut short")
+
+    def extract(self, name, target_dir):
+        if name not in self:
+            raise KeyError(name)
+        record = self.index.get(name)
+        path = os.path.join(target_dir, os.path.basename(name))
+        md5 = hashlib.md5()
+        with open(path, "wb") as f:
+            for chunk in self.read(name):
+                md5.update(chunk)
+                f.write(chunk)
+        if record.get("md5") and md5.hexdigest() != record["md5"]:
+            raise ValueError(f"{name}: restored copy does not match its MD5")
+        return path
+
+    def close(self):
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or restore files from an agent2 heavy-file archive.")
+    parser.add_argument("command", choices=["list", "extract"])
+    parser.add_argument("archive", help="the heavy_files folder inside a backup")
+    parser.add_argument("names", nargs="*", help="files to extract (default: all)")
+    parser.add_argument("-o", "--out", default=".")
+    args = parser.parse_args()
+
+    archive = Archive(args.archive)
+    try:
+        if args.command == "list":
+            for r in sorted(archive.entries(), key=lambda r: r["key"]):
+                print(f"{r['size'] / 1e6:>10.1f} MB  →  {r['length'] / 1e6:>10.1f} MB  {r['method']:<5} {r['key']}")
+            t = archive.totals()
+            print(f"{t['files']} files, {t['size'] / 1e6:.1f} MB → {t['length'] / 1e6:.1f} MB")
+            return 0
+        os.makedirs(args.out, exist_ok=True)
+        for name in args.names or [r["key"] for r in archive.entries()]:
+            print(f"📤 {archive.extract(name, args.out)}")
+        return 0
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    sys.exit(main())